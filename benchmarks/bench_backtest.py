@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest runtime benchmark on a synthetic Poloniex bundle
+
+Ingests a bundle of `--pairs` asset pairs over `--days` days with the real
+`create_bundle` while the API is served by `stub_server.StubServer` and
+then runs `zipline_poloniex.dummy_agent` and a few representative
+algorithms with `zipline.run_algorithm` in minute frequency, all with the
+default emission rate. Startup time, i.e. the time until the first bar is
+handled, bars per second and peak memory of every algorithm are measured
+in a process of its own and written as JSON together with the current
+commit. Pass the JSON of an earlier
+commit as `--baseline` to report changes and fail on regressions::
+
+    python benchmarks/bench_backtest.py --output before.json
+    git checkout my-branch
+    python benchmarks/bench_backtest.py --baseline before.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import pandas as pd
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+BUNDLE = 'bench-backtest'
+# asset pairs in the order they are added, ETH first for the dummy agent
+PAIRS = ['USDT_ETH', 'USDT_BTC', 'USDT_LTC', 'USDT_XMR', 'USDT_ZEC',
+         'USDT_DASH', 'USDT_ETC', 'USDT_XRP', 'USDT_REP', 'USDT_NXT',
+         'USDT_STR', 'USDT_BCH']
+ALGORITHMS = ('dummy', 'current', 'history', 'rebalance')
+# metrics compared with the baseline and if larger values are better
+METRICS = (('bars_per_sec', True), ('startup_time', False),
+           ('peak_rss_kib', False))
+
+
+def assets(pairs):
+    from zipline.api import symbol
+    return [symbol(pair.split('_')[1]) for pair in pairs]
+
+
+def make_algorithm(name, pairs):
+    """Initialize and handle_data functions of an algorithm
+
+    Args:
+        name (str): one of `ALGORITHMS`
+        pairs (list): asset pairs of the bundle
+
+    Returns:
+        tuple: initialize and handle_data function
+    """
+    from zipline.api import order_target_percent, record
+
+    if name == 'dummy':
+        from zipline_poloniex import dummy_agent
+
+        def dummy_initialize(context):
+            emission_rate = context.sim_params._emission_rate
+            dummy_agent.initialize(context)
+            # The agent switches to minutely emission in `initialize`, but
+            # `run_algorithm` has built the metrics tracker for the default
+            # daily emission already. Left switched, zipline fails at the
+            # end of the first bar with "'NamedExplodingObject' object is
+            # not subscriptable", so the default is restored.
+            context.sim_params._emission_rate = emission_rate
+        return dummy_initialize, dummy_agent.handle_data
+
+    def initialize(context):
+        context.assets = assets(pairs)
+        context.minute = 0
+
+    if name == 'current':
+        def handle_data(context, data):
+            # latest price and volume of all assets every minute
+            current = data.current(context.assets, ['price', 'volume'])
+            record(volume=current['volume'].sum())
+    elif name == 'history':
+        def handle_data(context, data):
+            # moving average crossover on an hour of minute bars
+            closes = data.history(context.assets, 'close', 60, '1m')
+            for asset in context.assets:
+                prices = closes[asset].dropna()
+                if prices.size < 2:
+                    continue
+                weight = 1. / len(context.assets)
+                above = prices.iloc[-1] > prices.mean()
+                order_target_percent(asset, weight if above else 0.)
+    elif name == 'rebalance':
+        def handle_data(context, data):
+            # equally weighted portfolio rebalanced every hour
+            context.minute += 1
+            if context.minute % 60:
+                return
+            weight = 1. / len(context.assets)
+            prices = data.current(context.assets, 'price')
+            for asset in context.assets:
+                if prices[asset] == prices[asset]:  # not NaN
+                    order_target_percent(asset, weight)
+    else:
+        raise ValueError("Unknown algorithm {}".format(name))
+    return initialize, handle_data
+
+
+def register_bundle(pairs, start, end):
+    from zipline.data.bundles import register
+    from zipline_poloniex.bundle import create_bundle
+
+    register(BUNDLE,
+             create_bundle(pairs, start, end + pd.Timedelta(days=1)),
+             calendar_name='POLONIEX',
+             minutes_per_day=24*60,
+             start_session=start,
+             end_session=end)
+
+
+def peak_rss_kib():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return peak_rss
+
+
+def ingest(root, pairs, start, end, trades_per_day):
+    """Ingest the synthetic bundle into a zipline root directory
+
+    Args:
+        root (str): zipline root directory
+        pairs (list): asset pairs
+        start (pandas.Timestamp): first session
+        end (pandas.Timestamp): last session
+        trades_per_day (int): number of synthetic trades per day and pair
+
+    Returns:
+        dict: measurements of the ingest
+    """
+    from zipline.data.bundles import ingest as zipline_ingest
+
+    from stub_server import StubServer
+    from zipline_poloniex import api
+    from zipline_poloniex.utils import TokenBucket
+
+    register_bundle(pairs, start, end)
+    with StubServer(trades_per_day) as server:
+        api.set_client(api.Client(server.url))
+        api.set_rate_limiter(TokenBucket(1000, 1000))
+        start_time = time.time()
+        zipline_ingest(BUNDLE, environ=dict(os.environ, ZIPLINE_ROOT=root))
+        wall_time = time.time() - start_time
+    return dict(wall_time=wall_time, api_calls=server.n_calls,
+                peak_rss_kib=peak_rss_kib())
+
+
+def backtest(root, algorithm, pairs, start, end):
+    """Run an algorithm on the ingested bundle and measure it
+
+    The backtest starts a session after the bundle, so that history
+    windows of the first minutes do not start before the data.
+
+    Args:
+        root (str): zipline root directory
+        algorithm (str): one of `ALGORITHMS`
+        pairs (list): asset pairs
+        start (pandas.Timestamp): first session of the bundle
+        end (pandas.Timestamp): last session
+
+    Returns:
+        dict: measurements of the backtest
+    """
+    start_time = time.time()
+    from zipline import run_algorithm
+    import zipline_poloniex  # noqa, registers the calendar
+    import_time = time.time() - start_time
+
+    register_bundle(pairs, start, end)
+    initialize, handle_data = make_algorithm(algorithm, pairs)
+    state = dict(first=None, minutes=0)
+
+    def timed_handle_data(context, data):
+        if state['first'] is None:
+            state['first'] = time.time()
+        state['minutes'] += 1
+        handle_data(context, data)
+
+    start_time = time.time()
+    run_algorithm(start + pd.Timedelta(days=1), end, initialize,
+                  capital_base=10**6, handle_data=timed_handle_data,
+                  data_frequency='minute',
+                  bundle=BUNDLE, default_extension=False,
+                  environ=dict(os.environ, ZIPLINE_ROOT=root))
+    end_time = time.time()
+    startup_time = state['first'] - start_time
+    bars = state['minutes'] * len(pairs)
+    return dict(algorithm=algorithm,
+                import_time=import_time,
+                startup_time=startup_time,
+                run_time=end_time - state['first'],
+                minutes=state['minutes'],
+                bars=bars,
+                bars_per_sec=bars / (end_time - state['first']),
+                peak_rss_kib=peak_rss_kib())
+
+
+def current_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return output.decode('utf-8').strip()
+
+
+def compare(results, baseline, threshold):
+    """Print changes against a baseline and find regressions
+
+    Args:
+        results (dict): results of this run
+        baseline (dict): results of an earlier run
+        threshold (float): relative change counted as regression
+
+    Returns:
+        list: descriptions of regressions
+    """
+    before = {run['algorithm']: run for run in baseline['runs']}
+    regressions = []
+    print("changes against {}:".format(baseline['commit']), file=sys.stderr)
+    for run in results['runs']:
+        if run['algorithm'] not in before:
+            continue
+        for metric, larger_is_better in METRICS:
+            old, new = before[run['algorithm']][metric], run[metric]
+            change = (new - old) / float(old) if old else 0.
+            worse = -change if larger_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = ' REGRESSION'
+                regressions.append("{} {}".format(run['algorithm'], metric))
+            print("{:>10} {:>13}: {:>12.2f} -> {:>12.2f} ({:+.1%}){}".format(
+                run['algorithm'], metric, old, new, change, flag),
+                file=sys.stderr)
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    # choices are checked here, since argparse of Python 3.6 checks an empty
+    # list of positional arguments against them as a whole
+    parser.add_argument('algorithms', nargs='*',
+                        help="algorithms to run out of {} (default "
+                        "all)".format(', '.join(ALGORITHMS)))
+    parser.add_argument('--pairs', type=int, default=2,
+                        help="number of asset pairs")
+    parser.add_argument('--days', type=int, default=5,
+                        help="number of days of the bundle, the backtest "
+                        "runs on all but the first")
+    parser.add_argument('--trades-per-day', type=int, default=20000)
+    parser.add_argument('--output', help="file to write the JSON results to")
+    parser.add_argument('--baseline', help="JSON results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative change counted as regression")
+    parser.add_argument('--root', help=argparse.SUPPRESS)
+    parser.add_argument('--single', choices=('ingest', 'backtest'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+    algorithms = args.algorithms or list(ALGORITHMS)
+    unknown = set(algorithms) - set(ALGORITHMS)
+    if unknown:
+        parser.error("unknown algorithms: {}".format(
+            ', '.join(sorted(unknown))))
+    pairs = PAIRS[:args.pairs]
+    start = pd.Timestamp('2017-01-02', tz='utc')
+    end = start + pd.Timedelta(days=args.days - 1)
+
+    if args.single == 'ingest':
+        result = ingest(args.root, pairs, start, end, args.trades_per_day)
+        print(json.dumps(result))
+        return
+    if args.single == 'backtest':
+        result = backtest(args.root, algorithms[0], pairs, start, end)
+        print(json.dumps(result))
+        return
+
+    def run_single(mode, *extra):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--single', mode, '--root', root,
+             '--pairs', str(args.pairs), '--days', str(args.days),
+             '--trades-per-day', str(args.trades_per_day)] + list(extra))
+        return json.loads(output.decode('utf-8').splitlines()[-1])
+
+    root = tempfile.mkdtemp()
+    try:
+        ingested = run_single('ingest')
+        print("ingest: {wall_time:.1f}s, {api_calls} calls".format(**ingested),
+              file=sys.stderr)
+        runs = []
+        for algorithm in algorithms:
+            runs.append(run_single('backtest', algorithm))
+            print("{algorithm:>10}: startup {startup_time:.2f}s, "
+                  "{bars_per_sec:,.0f} bars/s, {peak_rss_kib:,} KiB".format(
+                      **runs[-1]), file=sys.stderr)
+    finally:
+        shutil.rmtree(root)
+    results = dict(commit=current_commit(), pairs=args.pairs, days=args.days,
+                   trades_per_day=args.trades_per_day, ingest=ingested,
+                   runs=runs)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if (baseline['pairs'], baseline['days']) != (args.pairs, args.days):
+            print("baseline ran on {} pairs and {} days".format(
+                baseline['pairs'], baseline['days']), file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.exit("regressions: {}".format(', '.join(regressions)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
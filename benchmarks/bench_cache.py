@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of re-reading cached candle sticks
+
+Fills zipline's dataframe cache, which keeps one file per symbol id and
+day, and a `zipline_poloniex.cache.CandleCache` with the same synthetic
+daily candle sticks. It then measures checking all keys and reading all
+days back, like `prepare_data` does when a cached bundle is ingested again.
+Run with::
+
+    python benchmarks/bench_cache.py
+"""
+from __future__ import print_function
+
+import time
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from zipline.utils.cache import dataframe_cache
+
+from zipline_poloniex.bundle import CandleAccumulator
+from zipline_poloniex.cache import CandleCache
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def day_candles(day, rng, trades_per_day=5000):
+    """Candle sticks of a day from random trades
+
+    Args:
+        day (pandas.Timestamp): day
+        rng (numpy.random.RandomState): random number generator
+        trades_per_day (int): number of trades
+
+    Returns:
+        pandas.DataFrame: minute candle sticks of the day
+    """
+    candles = CandleAccumulator(day, day + pd.Timedelta(days=1, seconds=-1))
+    candles.update(dict(
+        date=day.value // 10**9 + np.sort(rng.randint(0, 86400,
+                                                      trades_per_day)),
+        rate=rng.lognormal(5, 0.01, trades_per_day).astype(np.float32),
+        amount=rng.exponential(1., trades_per_day).astype(np.float32)))
+    return candles.to_frame()
+
+
+def read_all(cache, keys):
+    start_time = time.time()
+    found = sum(key in cache for key in keys)
+    check = time.time() - start_time
+    start_time = time.time()
+    for key in keys:
+        cache[key]
+    return found, check, time.time() - start_time
+
+
+def main(n_sids=10, days=365):
+    rng = np.random.RandomState(42)
+    sessions = pd.date_range('2016-01-01', periods=days, freq='D', tz='utc')
+    frames = [day_candles(day, rng) for day in sessions[:31]]
+    keys = ["{}_{}".format(sid, day.strftime("%Y-%m-%d"))
+            for sid in range(n_sids) for day in sessions]
+    root = tempfile.mkdtemp()
+    try:
+        caches = [('zipline', dataframe_cache(root + '/zipline')),
+                  ('candle cache', CandleCache(root + '/candles'))]
+        for label, cache in caches:
+            start_time = time.time()
+            for i, key in enumerate(keys):
+                candles = frames[i % len(frames)].copy()
+                candles.index = pd.date_range(sessions[i % days],
+                                              periods=24*60, freq='1T',
+                                              name='date')
+                cache[key] = candles
+            if isinstance(cache, CandleCache):
+                cache.close()
+                cache = CandleCache(root + '/candles')
+            write = time.time() - start_time
+            found, check, read = read_all(cache, keys)
+            print("{:>12}: write {:.2f}s, check {:.3f}s, read {:.2f}s of {} "
+                  "days".format(label, write, check, read, found))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of building and querying the Poloniex calendar
+
+Compares the continuous `zipline_poloniex.calendar.PoloniexCalendar`, with
+an empty and a filled cache of minutes, against the former calendar based
+on a `CustomBusinessDay` with all weekdays. Each calendar is built in a
+fresh interpreter, like at the start of a backtest, and then maps random
+minutes to their sessions. Run with::
+
+    python benchmarks/bench_calendar.py
+"""
+from __future__ import print_function
+
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+CHILD = """
+import sys, json, time
+import numpy as np
+import pandas as pd
+start_time = time.time()
+from datetime import time as dtime
+from pytz import timezone
+from pandas.tseries.offsets import CustomBusinessDay
+from zipline.utils.calendars import TradingCalendar
+from zipline_poloniex.calendar import PoloniexCalendar
+
+
+class LegacyCalendar(TradingCalendar):
+    name = 'POLONIEX'
+    tz = timezone('UTC')
+    open_times = ((None, dtime(0, 0)),)
+    close_times = ((None, dtime(23, 59)),)
+    day = CustomBusinessDay(weekmask='Mon Tue Wed Thu Fri Sat Sun')
+
+
+kind, cache_dir, n_lookups = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = pd.Timestamp('2015-01-01', tz='utc')
+end = pd.Timestamp('2018-12-31', tz='utc')
+if kind == 'legacy':
+    calendar = LegacyCalendar(start, end)
+else:
+    calendar = PoloniexCalendar(start, end, cache_dir=cache_dir or None)
+build = time.time() - start_time
+minutes = calendar.all_minutes
+rng = np.random.RandomState(42)
+sample = [minutes[i] for i in rng.randint(0, len(minutes), n_lookups)]
+start_time = time.time()
+for minute in sample:
+    calendar.minute_to_session_label(minute)
+lookup = time.time() - start_time
+start_time = time.time()
+calendar.minute_index_to_session_labels(minutes)
+index = time.time() - start_time
+print(json.dumps(dict(build=build, lookup=lookup, index=index,
+                      minutes=len(minutes))))
+"""
+
+
+def run(kind, cache_dir='', n_lookups=100000):
+    """Build and query a calendar in a fresh interpreter
+
+    Args:
+        kind (str): `legacy` or `continuous`
+        cache_dir (str): cache directory of the continuous calendar
+        n_lookups (int): number of minutes mapped to their sessions
+
+    Returns:
+        dict: seconds of build, lookups and index mapping
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, kind, cache_dir, str(n_lookups)],
+        universal_newlines=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        runs = [('legacy', run('legacy')),
+                ('continuous', run('continuous')),
+                ('continuous, cold cache', run('continuous', cache_dir)),
+                ('continuous, warm cache', run('continuous', cache_dir))]
+    finally:
+        shutil.rmtree(cache_dir)
+    print("{} minutes".format(runs[0][1]['minutes']))
+    for label, result in runs:
+        print("{:>24}: build {:.3f}s, lookups {:.3f}s, index {:.3f}s".format(
+            label, result['build'], result['lookup'], result['index']))
+
+
+if __name__ == '__main__':
+    main()
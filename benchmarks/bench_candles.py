@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of candle stick aggregation on a synthetic 50k trades day
+
+Compares the former resample based aggregation with the single-pass
+`make_candle_stick` of `zipline_poloniex.bundle`. Run with::
+
+    python benchmarks/bench_candles.py
+"""
+from __future__ import print_function
+
+import timeit
+
+import numpy as np
+import pandas as pd
+try:
+    from pandas.testing import assert_frame_equal
+except ImportError:  # pandas < 0.20
+    from pandas.util.testing import assert_frame_equal
+
+from zipline_poloniex.bundle import make_candle_stick
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def resample_candle_stick(trades, freq='1T'):
+    """Former implementation with one resample per field"""
+    volume = trades['amount'].resample(freq).sum()
+    volume = volume.fillna(0)
+    high = trades['rate'].resample(freq).max()
+    low = trades['rate'].resample(freq).min()
+    open = trades['rate'].resample(freq).first()
+    close = trades['rate'].resample(freq).last()
+    return pd.DataFrame(
+        dict(open=open, high=high, low=low, close=close, volume=volume))
+
+
+def make_trades(n_trades=50000, seed=42):
+    """Synthetic trades of one day, newest first like Poloniex returns them
+
+    Args:
+        n_trades (int): number of trades
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: trades padded with the day's start and end
+    """
+    rng = np.random.RandomState(seed)
+    day = pd.Timestamp('2017-01-01', tz='utc')
+    seconds = np.sort(rng.randint(0, 24*60*60, n_trades))[::-1]
+    index = pd.DatetimeIndex(day + pd.to_timedelta(seconds, unit='s'),
+                             name='date')
+    trades = pd.DataFrame(
+        dict(rate=rng.lognormal(7, 0.01, n_trades).astype(np.float32),
+             amount=rng.exponential(0.5, n_trades).astype(np.float32)),
+        index=index)
+    trades.loc[day] = np.nan
+    trades.loc[day + pd.Timedelta(seconds=24*60*60 - 1)] = np.nan
+    return trades
+
+
+def main(repeat=10):
+    trades = make_trades()
+    expected = resample_candle_stick(trades)
+    result = make_candle_stick(trades)
+    assert_frame_equal(expected, result, check_dtype=False)
+    for name, func in (('resample', resample_candle_stick),
+                       ('single-pass', make_candle_stick)):
+        secs = min(timeit.repeat(lambda: func(trades), number=1,
+                                 repeat=repeat))
+        print("{:>12}: {:.2f}ms".format(name, secs * 1000))
+
+
+if __name__ == '__main__':
+    main()
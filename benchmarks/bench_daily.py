@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of a daily strategy on minute bars and on precomputed daily bars
+
+Runs the same strategy, which looks at the daily prices of an asset and
+orders once a day, twice on one bundle. The baseline runs in minute
+frequency, so zipline aggregates the daily history from the minute bars,
+while the other run uses the daily bars written during ingestion in daily
+frequency. The bundle must be registered, e.g. in
+``$HOME/.zipline/extension.py``, and ingested, and the backtest must start
+at least 20 sessions after the bundle. Run with::
+
+    python benchmarks/bench_daily.py poloniex 2016-02-01 2016-12-31 ETH
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+import pandas as pd
+from zipline import run_algorithm
+from zipline.api import (date_rules, order, record, schedule_function,
+                         symbol, time_rules)
+
+# registers the POLONIEX calendar
+import zipline_poloniex  # noqa
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+WINDOW = 20
+
+
+def run(bundle, start, end, asset, data_frequency):
+    """Run the daily strategy and measure it
+
+    Args:
+        bundle (str): name of the bundle
+        start (pandas.Timestamp): first session
+        end (pandas.Timestamp): last session
+        asset (str): symbol of the traded asset
+        data_frequency (str): 'minute' or 'daily'
+
+    Returns:
+        tuple: seconds of the run and number of days the strategy ran
+    """
+    days = []
+
+    def initialize(context):
+        context.asset = symbol(asset)
+        schedule_function(rebalance, date_rules.every_day(),
+                          time_rules.market_close())
+
+    def rebalance(context, data):
+        prices = data.history(context.asset, 'price', WINDOW, '1d')
+        if prices.iloc[-1] > prices.mean():
+            order(context.asset, 1)
+        record(price=prices.iloc[-1], mean=prices.mean())
+        days.append(data.current_dt)
+
+    start_time = time.time()
+    run_algorithm(start, end, initialize, capital_base=100000,
+                  data_frequency=data_frequency, bundle=bundle)
+    return time.time() - start_time, len(days)
+
+
+def main(bundle, start, end, asset):
+    start = pd.Timestamp(start, tz='utc')
+    end = pd.Timestamp(end, tz='utc')
+    for name, data_frequency in (('minute bars', 'minute'),
+                                 ('daily bars', 'daily')):
+        secs, days = run(bundle, start, end, asset, data_frequency)
+        print("{:>11}: {:.2f}s for {} days".format(name, secs, days))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:5])
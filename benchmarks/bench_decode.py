@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of decoding a returnTradeHistory payload
+
+Compares the former generic dataframe construction with per-row `strptime`,
+the columnar `decode_trades` of `zipline_poloniex.api` after JSON decoding
+and `parse_trades`, which scans the body itself, on the compact JSON body of
+50000 synthetic trades or of a recorded payload. Time and peak memory
+allocated while decoding as well as the size of the gzip compressed body
+are reported. Run with::
+
+    python benchmarks/bench_decode.py [recorded.json]
+"""
+from __future__ import print_function
+
+import sys
+import json
+import timeit
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pytz import timezone
+
+from stub_server import gzip_compress
+from zipline_poloniex.api import decode_trades, parse_trades, trades_to_frame
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def make_payload(n_trades=50000, seed=42):
+    """Synthetic payload of `n_trades` as returned by the API
+
+    Args:
+        n_trades (int): number of trades
+        seed (int): random seed
+
+    Returns:
+        list: trades as dictionaries of strings
+    """
+    rng = np.random.RandomState(seed)
+    start = pd.Timestamp('2017-01-01')
+    seconds = np.sort(rng.randint(0, 24*60*60, n_trades))[::-1]
+    dates = (start + pd.to_timedelta(seconds, unit='s')).strftime(
+        '%Y-%m-%d %H:%M:%S')
+    rates = rng.lognormal(7, 0.01, n_trades)
+    amounts = rng.exponential(0.5, n_trades)
+    return [dict(globalTradeID=n_trades - i,
+                 tradeID=n_trades - i,
+                 date=dates[i],
+                 type='buy' if rng.rand() < 0.5 else 'sell',
+                 rate='{:.8f}'.format(rates[i]),
+                 amount='{:.8f}'.format(amounts[i]),
+                 total='{:.8f}'.format(rates[i] * amounts[i]))
+            for i in range(n_trades)]
+
+
+def generic_decode(body):
+    """Former decoding with a generic dataframe and per-row date parsing"""
+    df = pd.DataFrame(json.loads(body.decode('utf-8')))
+    df['date'] = df['date'].apply(lambda x: datetime.strptime(
+        x, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone('UTC')))
+    for col in ('total', 'rate', 'amount'):
+        df[col] = df[col].astype(np.float32)
+    return df
+
+
+def columnar_decode(body):
+    return trades_to_frame(decode_trades(json.loads(body.decode('utf-8'))))
+
+
+def scan_decode(body):
+    return trades_to_frame(parse_trades(body))
+
+
+def peak_memory(func, *args):
+    """Peak memory in bytes allocated while calling a function"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(args, repeat=5):
+    if args:
+        with open(args[0]) as fh:
+            data = json.load(fh)
+    else:
+        data = make_payload()
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    compressed = gzip_compress(body)
+    print("{:,} trades, {:,} bytes, {:,} bytes gzip compressed".format(
+        len(data), len(body), len(compressed)))
+    for name, func in (('generic', generic_decode),
+                       ('columnar', columnar_decode),
+                       ('scan', scan_decode)):
+        secs = min(timeit.repeat(lambda: func(body), number=1,
+                                 repeat=repeat))
+        print("{:>10}: {:.2f}ms, {:,.0f} trades/s, {:.1f}MiB allocated".format(
+            name, secs * 1000, len(data) / secs,
+            peak_memory(func, body) / 2.**20))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of bulk loading trade dumps into the trade store
+
+Writes a synthetic gzip compressed CSV dump of several asset pairs and
+measures the rows per second of `zipline_poloniex.dump.load_dumps`. Run
+with::
+
+    python benchmarks/bench_dump.py
+"""
+from __future__ import print_function
+
+import os
+import time
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex.dump import load_dumps
+from zipline_poloniex.store import TradeStore
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def write_dump(path, n_rows=2000000, pairs=('USDT_BTC', 'USDT_ETH'), days=30,
+               seed=42):
+    """Write a synthetic dump of trades
+
+    Args:
+        path (str): path of the CSV file
+        n_rows (int): number of trades
+        pairs (tuple): asset pair names
+        days (int): number of days the trades span
+        seed (int): random seed
+    """
+    rng = np.random.RandomState(seed)
+    seconds = np.sort(rng.randint(0, days*24*60*60, n_rows))
+    dates = pd.to_datetime(seconds + 1483228800, unit='s')
+    rates = rng.lognormal(7, 0.01, n_rows)
+    amounts = rng.exponential(0.5, n_rows)
+    pd.DataFrame(dict(
+        pair=np.asarray(pairs)[rng.randint(0, len(pairs), n_rows)],
+        globalTradeID=np.arange(n_rows),
+        tradeID=np.arange(n_rows),
+        date=dates.strftime('%Y-%m-%d %H:%M:%S'),
+        type=np.where(rng.rand(n_rows) < 0.5, 'buy', 'sell'),
+        rate=rates.round(8),
+        amount=amounts.round(8),
+        total=(rates * amounts).round(8))).to_csv(path, index=False)
+
+
+def main(n_rows=2000000, chunksize=10**6):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'trades.csv.gz')
+        write_dump(path, n_rows)
+        store = TradeStore(os.path.join(tmp_dir, 'store'))
+        start_time = time.time()
+        written = load_dumps([path], store, chunksize=chunksize)
+        secs = time.time() - start_time
+        print("{:,} rows into {} days in {:.1f}s, {:,.0f} rows/s".format(
+            n_rows, len(written), secs, n_rows / secs))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
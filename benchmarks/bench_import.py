@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the import time of the package
+
+Measures `import zipline_poloniex` in fresh interpreters, once on its own
+and once after `zipline.data.bundles` is imported, like zipline does before
+loading `~/.zipline/extension.py`, for the working tree and for the
+package of a baseline commit, by default the first commit of the
+repository. With Python 3.7+ the most expensive modules imported by the
+working tree are listed from `python -X importtime`. Run with::
+
+    python benchmarks/bench_import.py [--baseline REV]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tarfile
+import argparse
+import tempfile
+import subprocess
+from io import BytesIO
+from contextlib import contextmanager
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STATEMENT = "import zipline_poloniex"
+PRELOADS = (
+    ('alone', "pass"),
+    ('after zipline', "import zipline.data.bundles"),
+)
+CHILD = """
+import time
+{}
+start_time = time.time()
+{}
+print(time.time() - start_time)
+"""
+
+
+def git(*args):
+    return subprocess.check_output(('git', '-C', ROOT) + args)
+
+
+@contextmanager
+def package_of(rev):
+    """Context manager extracting the package of a commit
+
+    Args:
+        rev (str): git revision
+
+    Returns:
+        str: directory to put on the Python path
+    """
+    path = tempfile.mkdtemp(prefix='bench_import_')
+    try:
+        archive = git('archive', '--format=tar', rev, 'zipline_poloniex')
+        with tarfile.open(fileobj=BytesIO(archive)) as tar:
+            tar.extractall(path)
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def import_seconds(path, preload, repeat=5):
+    """Fastest time of importing the package in a fresh interpreter
+
+    Args:
+        path (str): directory of the package
+        preload (str): statement run before, which is not measured
+        repeat (int): number of interpreters
+
+    Returns:
+        float: seconds
+    """
+    env = dict(os.environ, PYTHONPATH=path)
+    code = CHILD.format(preload, STATEMENT)
+    return min(float(subprocess.check_output(
+        [sys.executable, '-c', code], env=env, cwd=path,
+        universal_newlines=True).splitlines()[-1]) for _ in range(repeat))
+
+
+def import_times(path, preload):
+    """Import times of all modules newly imported by the package
+
+    Args:
+        path (str): directory of the package
+        preload (str): statement run before, whose imports are not measured
+
+    Returns:
+        list: tuples of module name, self and cumulative time in microseconds
+    """
+    code = "{}; import sys; sys.stderr.write('-- start\\n'); {}".format(
+        preload, STATEMENT)
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=dict(os.environ, PYTHONPATH=path), cwd=path,
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    times = []
+    for line in output.split('-- start\n', 1)[1].splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def main(args, top=10):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--baseline', help="git revision to compare with",
+                        default=None)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="interpreters per measurement")
+    args = parser.parse_args(args)
+    baseline = args.baseline
+    if baseline is None:
+        baseline = git('rev-list', '--max-parents=0',
+                       'HEAD').decode('utf-8').split()[-1]
+    print("{}, fastest of {} interpreters".format(STATEMENT, args.repeat))
+    print("{:>14}  {:>10}  {:>10}".format('', baseline[:10], 'current'))
+    with package_of(baseline) as path:
+        for label, preload in PRELOADS:
+            before = import_seconds(path, preload, args.repeat)
+            after = import_seconds(ROOT, preload, args.repeat)
+            print("{:>14}  {:>8.1f}ms  {:>8.1f}ms".format(
+                label, 1000 * before, 1000 * after))
+    if sys.version_info < (3, 7):  # no -X importtime
+        return
+    for label, preload in PRELOADS:
+        times = import_times(ROOT, preload)
+        print("current {}: {} modules".format(label, len(times)))
+        for name, self_us, cumulative_us in sorted(
+                times, key=lambda t: -t[1])[:top]:
+            print("    {:>8.1f}ms  {}".format(self_us / 1000., name))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
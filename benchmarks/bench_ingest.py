@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end ingest benchmark against a local Poloniex stand-in
+
+Each workload registers a bundle with `create_bundle`, ingests it with
+zipline into a temporary ZIPLINE_ROOT while the API is served by
+`stub_server.StubServer` and reports wall time, API calls, trades per
+second and peak memory as JSON. The stand-in and every ingest run in
+processes of their own, so that only the ingest is measured and peak
+memory is not shared. Run with::
+
+    python benchmarks/bench_ingest.py --output results.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from contextlib import contextmanager
+try:
+    from urllib.request import urlopen
+except ImportError:  # Python 2
+    from urllib2 import urlopen
+
+import pandas as pd
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+WORKLOADS = {
+    'small': dict(pairs=['USDT_ETH'], days=7, trades_per_day=2000),
+    'medium': dict(pairs=['USDT_ETH', 'USDT_LTC', 'USDT_XMR'], days=30,
+                   trades_per_day=20000),
+    'btc': dict(pairs=['USDT_BTC'], days=7, trades_per_day=300000),
+}
+
+
+def run_workload(name, url, calls=6, workers=1):
+    """Ingest a workload from a running stand-in and measure it
+
+    Args:
+        name (str): name of the workload
+        url (str): URL of the stand-in
+        calls (int): number of API calls per second
+        workers (int): number of threads fetching trades
+
+    Returns:
+        dict: wall time and peak memory of the ingest
+    """
+    from zipline.data.bundles import ingest, register
+
+    from zipline_poloniex import api
+    from zipline_poloniex.bundle import create_bundle
+    from zipline_poloniex.utils import TokenBucket
+
+    workload = WORKLOADS[name]
+    start = pd.Timestamp('2017-01-01', tz='utc')
+    end = start + pd.Timedelta(days=workload['days'])
+    bundle = 'bench-{}'.format(name)
+    register(bundle,
+             create_bundle(workload['pairs'], start, end, workers=workers),
+             calendar_name='POLONIEX',
+             minutes_per_day=24*60,
+             start_session=start,
+             end_session=end)
+    root = tempfile.mkdtemp()
+    try:
+        api.set_client(api.Client(url))
+        api.set_rate_limiter(TokenBucket(calls))
+        start_time = time.time()
+        ingest(bundle, environ=dict(ZIPLINE_ROOT=root))
+        wall_time = time.time() - start_time
+    finally:
+        shutil.rmtree(root)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return dict(wall_time=wall_time, peak_rss_kib=peak_rss)
+
+
+@contextmanager
+def stub_server(trades_per_day, latency):
+    """Context manager running the stand-in in a process of its own
+
+    Args:
+        trades_per_day (int): expected number of trades per day and pair
+        latency (float): seconds the stand-in waits before answering
+
+    Returns:
+        str: URL of the stand-in
+    """
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, 'stub_server.py'),
+         '--trades-per-day', str(trades_per_day), '--latency', str(latency)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        universal_newlines=True)
+    try:
+        yield server.stdout.readline().strip()
+    finally:
+        server.stdin.close()
+        server.wait()
+
+
+def stub_stats(url):
+    """Number of calls and trades served by the stand-in"""
+    stats_url = url.rsplit('/', 1)[0] + '/stats'
+    return json.loads(urlopen(stats_url).read().decode('utf-8'))
+
+
+def measure(name, latency=0., calls=6, workers=1):
+    """Ingest a workload in a fresh process and measure it
+
+    Args:
+        name (str): name of the workload
+        latency (float): seconds the stand-in waits before answering
+        calls (int): number of API calls per second
+        workers (int): number of threads fetching trades
+
+    Returns:
+        dict: measurements of the workload
+    """
+    workload = WORKLOADS[name]
+    with stub_server(workload['trades_per_day'], latency) as url:
+        output = subprocess.check_output(
+            [sys.executable, __file__, name, '--url', url,
+             '--calls', str(calls), '--workers', str(workers)])
+        stats = stub_stats(url)
+    result = json.loads(output.decode('utf-8').splitlines()[-1])
+    return dict(workload=name,
+                pairs=len(workload['pairs']),
+                days=workload['days'],
+                wall_time=result['wall_time'],
+                api_calls=stats['n_calls'],
+                trades=stats['n_trades'],
+                trades_per_sec=stats['n_trades'] / result['wall_time'],
+                peak_rss_kib=result['peak_rss_kib'])
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('workloads', nargs='*', default=sorted(WORKLOADS),
+                        choices=sorted(WORKLOADS))
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--calls', type=int, default=6,
+                        help="API calls per second")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', help="file to write the JSON results to")
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.url:
+        # a single workload ingested in this process from a running stand-in
+        result = run_workload(args.workloads[0], args.url, args.calls,
+                              args.workers)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for name in args.workloads:
+        results.append(measure(name, args.latency, args.calls, args.workers))
+        print("{workload:>8}: {wall_time:.1f}s, {api_calls} calls, "
+              "{trades_per_sec:,.0f} trades/s, {peak_rss_kib:,} KiB".format(
+                  **results[-1]), file=sys.stderr)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
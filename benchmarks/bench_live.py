@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the bar emission latency of the live feed
+
+Polls `stub_server.StubServer` with `zipline_poloniex.live.LiveBars` on a
+simulated clock that runs `speed` times faster than real time and reports
+the latency between the close of a minute and the emission of its bar in
+simulated seconds. Run with::
+
+    python benchmarks/bench_live.py
+"""
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from stub_server import StubServer
+from zipline_poloniex import api
+from zipline_poloniex.live import LiveBars
+from zipline_poloniex.utils import TokenBucket
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+class SimulatedClock(object):
+    """Clock starting at a given time and running faster than real time
+
+    Args:
+        start (pandas.Timestamp): start of the simulated time
+        speed (float): simulated seconds per real second
+    """
+    def __init__(self, start, speed=10.):
+        self.start = start.value / 10.**9
+        self.speed = speed
+        self._started = time.time()
+
+    def __call__(self):
+        return self.start + (time.time() - self._started) * self.speed
+
+
+def main(pairs=('USDT_BTC', 'USDT_ETH'), minutes=10, speed=10.,
+         interval=0.1, trades_per_day=200000):
+    with StubServer(trades_per_day) as server:
+        api.set_client(api.Client(server.url))
+        api.set_rate_limiter(TokenBucket(1000, 1000))
+        clock = SimulatedClock(pd.Timestamp('2017-01-01 12:00', tz='utc'),
+                               speed)
+        feed = LiveBars(pairs, clock=clock)
+        n_polls = int(minutes * 60 / speed / interval)
+        start_time = time.time()
+        n_bars = sum(1 for _ in feed.iter_bars(interval, n_polls))
+        elapsed = time.time() - start_time
+        latencies = np.array(feed.latencies)
+        print("{} bars of {} pairs from {} polls in {:.1f}s with {} API "
+              "calls".format(n_bars, len(pairs), n_polls, elapsed,
+                             server.n_calls))
+        print("latency in simulated seconds: median {:.2f}, p99 {:.2f}, "
+              "max {:.2f}".format(np.median(latencies),
+                                  np.percentile(latencies, 99),
+                                  latencies.max()))
+
+
+if __name__ == '__main__':
+    main()
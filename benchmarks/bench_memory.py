@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of peak memory when turning a busy day of trades into candles
+
+Compares fetching the whole day as one dataframe with the streaming
+pipeline of `zipline_poloniex.bundle.stream_candle_stick`. The API is
+replaced by synthetic payloads, so no network is needed. Each pipeline runs
+in a process of its own, which reports its peak resident set size, its
+growth over the size after imports and the peak of memory allocated by
+Python while the pipeline runs again traced. Run with::
+
+    python benchmarks/bench_memory.py [--n-trades 400000]
+"""
+from __future__ import print_function
+
+import sys
+import json
+import argparse
+import resource
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex import api
+from zipline_poloniex.bundle import (fetch_trades, make_candle_stick,
+                                     stream_candle_stick)
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def make_query_api(day, n_trades=400000, seed=42):
+    """Replacement of `api.query_api` serving a synthetic day of trades
+
+    Args:
+        day (pandas.Timestamp): day of the trades
+        n_trades (int): number of trades of the day
+        seed (int): random seed
+
+    Returns:
+        function with the signature of `api.query_api`
+    """
+    rng = np.random.RandomState(seed)
+    start = day.value // 10**9
+    day_str = day.strftime('%Y-%m-%d %H:%M:%S')
+    seconds = np.sort(rng.randint(start, start + 24*60*60, n_trades))[::-1]
+    rates = rng.lognormal(7, 0.01, n_trades)
+
+    def query_api(command, raw=False, **kwargs):
+        start, end = kwargs['start'], kwargs['end']
+        lo = np.searchsorted(-seconds, -end, side='left')
+        hi = np.searchsorted(-seconds, -start, side='right')
+        if hi - lo >= api.MAX_TRADES:
+            # only the number of trades matters, the window gets split
+            trades = [dict(globalTradeID=0, tradeID=0, date=day_str,
+                           type='buy', rate='1.0', amount='1.0',
+                           total='1.0')] * api.MAX_TRADES
+        else:
+            dates = pd.to_datetime(seconds[lo:hi], unit='s').strftime(
+                '%Y-%m-%d %H:%M:%S')
+            trades = [dict(globalTradeID=i, tradeID=i, date=date,
+                           type='buy', rate=str(rates[i]), amount='1.0',
+                           total=str(rates[i]))
+                      for i, date in zip(range(lo, hi), dates)]
+        if raw:
+            return json.dumps(trades, separators=(',', ':')).encode('utf-8')
+        return trades
+
+    return query_api
+
+
+PIPELINES = ('whole day', 'streaming')
+
+
+def peak_memory(func, *args):
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def peak_rss_kib():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return peak_rss
+
+
+def run(name, n_trades):
+    """Measure the memory of a pipeline in the current process
+
+    Args:
+        name (str): one of `PIPELINES`
+        n_trades (int): number of trades of the day
+
+    Returns:
+        dict: peak RSS, its growth while running and traced peak in bytes
+    """
+    day = pd.Timestamp('2017-01-01', tz='utc')
+    end = day + pd.Timedelta(days=1, seconds=-1)
+    api.query_api = make_query_api(day, n_trades)
+    if name == 'whole day':
+        def func():
+            return make_candle_stick(fetch_trades('BTC', day, end))
+    else:
+        def func():
+            return stream_candle_stick('BTC', day, end)
+    baseline = peak_rss_kib()
+    func()
+    peak_rss = peak_rss_kib()
+    return dict(name=name, peak_rss_kib=peak_rss,
+                rss_growth_kib=peak_rss - baseline,
+                traced_peak=peak_memory(func))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--n-trades', type=int, default=400000)
+    parser.add_argument('--single', choices=PIPELINES, help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+    if args.single:
+        print(json.dumps(run(args.single, args.n_trades)))
+        return
+    for name in PIPELINES:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--single', name,
+             '--n-trades', str(args.n_trades)])
+        result = json.loads(output.decode('utf-8').splitlines()[-1])
+        print("{:>10}: {:.1f}MiB peak RSS (+{:.1f}MiB), {:.1f}MiB traced "
+              "peak".format(name, result['peak_rss_kib'] / 1024.,
+                            result['rss_growth_kib'] / 1024.,
+                            result['traced_peak'] / 2.**20))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
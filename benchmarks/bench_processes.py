@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of re-aggregating stored trades with a pool of processes
+
+Fills a trade store with synthetic trades and measures `prepare_data` of
+`zipline_poloniex.bundle` reading them back with an increasing number of
+processes. Run with::
+
+    python benchmarks/bench_processes.py
+"""
+from __future__ import print_function
+
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex.bundle import prepare_data
+from zipline_poloniex.store import STORE_DTYPES, TradeStore
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def fill_store(store, sid_map, start, end, trades_per_day=300000, seed=42):
+    """Write synthetic trades of all days of a period into a store
+
+    Args:
+        store (:class:`~zipline_poloniex.store.TradeStore`): store of trades
+        sid_map (dict): mapping from symbol id to asset pair name
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        trades_per_day (int): number of trades per day and asset pair
+        seed (int): random seed
+    """
+    rng = np.random.RandomState(seed)
+    for pair in sid_map.values():
+        for day in pd.date_range(start, end, freq='D'):
+            columns = {col: np.zeros(trades_per_day, dtype=dtype)
+                       for col, dtype in STORE_DTYPES.items()}
+            columns['date'] = (day.value // 10**9 + np.sort(
+                rng.randint(0, 24*60*60, trades_per_day))).astype(np.int64)
+            columns['rate'] = rng.lognormal(
+                7, 0.01, trades_per_day).astype(np.float32)
+            columns['amount'] = rng.exponential(
+                0.5, trades_per_day).astype(np.float32)
+            store.write_columns(pair, day, columns)
+
+
+def main(days=60):
+    sid_map = {0: 'USDT_BTC', 1: 'USDT_ETH', 2: 'USDT_LTC', 3: 'USDT_XMR'}
+    start = pd.Timestamp('2017-01-01', tz='utc')
+    end = start + pd.Timedelta(days=days)
+    root = tempfile.mkdtemp()
+    try:
+        store = TradeStore(root)
+        fill_store(store, sid_map, start, end)
+        n_cpus = multiprocessing.cpu_count()
+        processes = 1
+        while processes <= n_cpus:
+            start_time = time.time()
+            for _ in prepare_data(start, end, sid_map, dict(), store=store,
+                                  processes=processes):
+                pass
+            secs = time.time() - start_time
+            print("{:>4} processes: {:.2f}s, {:.1f} days/s".format(
+                processes, secs, len(sid_map) * days / secs))
+            processes *= 2
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
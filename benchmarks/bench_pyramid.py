@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of reading coarse bars from the bar pyramid
+
+Writes a year of synthetic minute bars of one asset pair into a
+`zipline_poloniex.bars.BarPyramidWriter` and compares reading hourly and
+2-hourly bars with `BarPyramidReader` against resampling the minute bars
+with pandas, which is what a strategy on coarse bars pays in every
+backtest. Run with::
+
+    python benchmarks/bench_pyramid.py
+"""
+from __future__ import print_function
+
+import time
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex.bars import BarPyramidReader, BarPyramidWriter
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def minute_bars(day, rng):
+    """Random walk minute bars of a day with a tenth of empty minutes
+
+    Args:
+        day (pandas.Timestamp): day
+        rng (numpy.random.RandomState): random number generator
+
+    Returns:
+        pandas.DataFrame: minute bars
+    """
+    index = pd.date_range(day, periods=24*60, freq='1T', name='date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, index.size)))
+    close[rng.rand(index.size) < 0.1] = np.nan
+    return pd.DataFrame(dict(open=close, high=close * 1.001,
+                             low=close * 0.999, close=close,
+                             volume=np.where(np.isnan(close), 0., 1.)),
+                        index=index).astype(np.float32)
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        times.append(time.time() - start_time)
+    return min(times)
+
+
+def main(days=365):
+    rng = np.random.RandomState(42)
+    start = pd.Timestamp('2017-01-01', tz='utc')
+    end = start + pd.Timedelta(days=days) - pd.Timedelta(minutes=1)
+    root = tempfile.mkdtemp()
+    try:
+        writer = BarPyramidWriter(root)
+        bars = []
+        start_time = time.time()
+        for day in pd.date_range(start, periods=days, freq='D'):
+            candles = minute_bars(day, rng)
+            writer.write_day(0, candles)
+            bars.append(candles)
+        writer.close()
+        print("wrote {} days in {:.2f}s".format(days,
+                                                time.time() - start_time))
+        bars = pd.concat(bars)
+        reader = BarPyramidReader(root)
+        how = dict(open='first', high='max', low='min', close='last',
+                   volume='sum')
+        for freq in ('1H', '2H'):
+            resample = best_of(lambda: bars.resample(freq).agg(how))
+            pyramid = best_of(lambda: reader.get_bars(0, start, end, freq))
+            print("{}: resample {:.4f}s, pyramid {:.4f}s from {}".format(
+                freq, resample, pyramid, reader.resolution(freq)))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
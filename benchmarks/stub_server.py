@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the public Poloniex API
+
+Serves `returnCurrencies`, `returnTradeHistory` and `returnChartData` from
+synthetic trades or from recorded fixtures. Like the real API, at most
+50000 trades are returned per request as compact JSON, which is gzip
+compressed if the client accepts it. The number of calls and trades
+served are answered on `/stats`, other paths than `/public` with 404.
+Use it with::
+
+    with StubServer(trades_per_day=20000, latency=0.05) as server:
+        api.set_client(api.Client(server.url))
+
+or in a process of its own, which prints its URL and serves until its
+standard input is closed::
+
+    python benchmarks/stub_server.py --trades-per-day 20000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+MAX_TRADES = 50000
+SECONDS_PER_DAY = 24 * 60 * 60
+SYMBOLS = ('BTC', 'BCH', 'ETH', 'DASH', 'ETC', 'XMR', 'ZEC', 'XRP', 'LTC',
+           'REP', 'NXT', 'STR')
+
+
+class SyntheticTrades(object):
+    """Deterministic synthetic trades generated day by day on demand
+
+    Args:
+        trades_per_day (int): expected number of trades per day and pair
+        seed (int): random seed
+        max_days (int): number of generated days kept in memory
+    """
+    def __init__(self, trades_per_day=20000, seed=42, max_days=8):
+        self.trades_per_day = trades_per_day
+        self.seed = seed
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def day(self, pair, day):
+        """Trades of a pair on a day, newest first
+
+        Args:
+            pair (str): asset pair name
+            day (int): days since epoch
+
+        Returns:
+            tuple: arrays of trade ids, seconds since epoch, rates and amounts
+        """
+        key = (pair, day)
+        with self._lock:
+            if key in self._days:
+                return self._days[key]
+        rng = np.random.RandomState(
+            (self.seed + zlib.crc32(pair.encode('utf-8')) + day) % 2**32)
+        n_trades = rng.poisson(self.trades_per_day)
+        seconds = np.sort(rng.randint(0, SECONDS_PER_DAY, n_trades))[::-1]
+        seconds = seconds + day * SECONDS_PER_DAY
+        rates = 100. * np.exp(np.cumsum(rng.normal(0, 1e-4, n_trades)))
+        amounts = rng.exponential(0.5, n_trades)
+        ids = day * 10**7 + np.arange(n_trades)[::-1]
+        trades = (ids, seconds, rates, amounts)
+        with self._lock:
+            self._days[key] = trades
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return trades
+
+    def window(self, pair, start, end):
+        """Trades of a pair in a window, newest first
+
+        Args:
+            pair (str): asset pair name
+            start (int): start of window in seconds since epoch
+            end (int): end of window in seconds since epoch, inclusive
+
+        Returns:
+            tuple: arrays of trade ids, seconds since epoch, rates and amounts
+        """
+        days = range(end // SECONDS_PER_DAY, start // SECONDS_PER_DAY - 1, -1)
+        parts = [self.day(pair, day) for day in days]
+        ids, seconds, rates, amounts = (np.concatenate(cols)
+                                        for cols in zip(*parts))
+        mask = (seconds >= start) & (seconds <= end)
+        return ids[mask], seconds[mask], rates[mask], amounts[mask]
+
+
+class RecordedTrades(object):
+    """Trades recorded as `<pair>.json` files of returnTradeHistory payloads
+
+    Args:
+        path (str): directory of the fixtures
+    """
+    def __init__(self, path):
+        self.path = path
+        self._pairs = dict()
+
+    def _load(self, pair):
+        if pair not in self._pairs:
+            with open(os.path.join(self.path, pair + '.json')) as fh:
+                trades = json.load(fh)
+            dates = pd.to_datetime([t['date'] for t in trades])
+            seconds = dates.values.astype('datetime64[s]').astype(np.int64)
+            order = np.argsort(-seconds, kind='mergesort')
+            ids = np.array([t.get('globalTradeID', i)
+                            for i, t in enumerate(trades)], dtype=np.int64)
+            self._pairs[pair] = (
+                ids[order],
+                seconds[order],
+                np.array([t['rate'] for t in trades], dtype=float)[order],
+                np.array([t['amount'] for t in trades], dtype=float)[order])
+        return self._pairs[pair]
+
+    def window(self, pair, start, end):
+        """Trades of a pair in a window like `SyntheticTrades.window`"""
+        ids, seconds, rates, amounts = self._load(pair)
+        mask = (seconds >= start) & (seconds <= end)
+        return ids[mask], seconds[mask], rates[mask], amounts[mask]
+
+
+def trades_payload(ids, seconds, rates, amounts):
+    """Format trades like returnTradeHistory
+
+    Args:
+        ids (numpy.ndarray): trade ids
+        seconds (numpy.ndarray): seconds since epoch, newest first
+        rates (numpy.ndarray): rates
+        amounts (numpy.ndarray): amounts
+
+    Returns:
+        list: trades as dictionaries
+    """
+    dates = pd.to_datetime(seconds, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+    n_trades = len(seconds)
+    return [dict(globalTradeID=int(ids[i]),
+                 tradeID=int(ids[i]),
+                 date=dates[i],
+                 type='buy' if i % 2 else 'sell',
+                 rate='{:.8f}'.format(rates[i]),
+                 amount='{:.8f}'.format(amounts[i]),
+                 total='{:.8f}'.format(rates[i] * amounts[i]))
+            for i in range(n_trades)]
+
+
+def chart_payload(seconds, rates, amounts, period):
+    """Aggregate trades to candle sticks like returnChartData
+
+    Args:
+        seconds (numpy.ndarray): seconds since epoch
+        rates (numpy.ndarray): rates
+        amounts (numpy.ndarray): amounts
+        period (int): candle stick period in seconds
+
+    Returns:
+        list: candle sticks as dictionaries
+    """
+    if not len(seconds):
+        return [dict(date=0, high=0, low=0, open=0, close=0, volume=0,
+                     quoteVolume=0, weightedAverage=0)]
+    index = pd.to_datetime(seconds, unit='s')
+    trades = pd.DataFrame(dict(rate=rates, amount=amounts,
+                               total=rates * amounts), index=index)
+    trades = trades.sort_index(kind='mergesort')
+    bars = trades.resample('{}s'.format(period)).agg(
+        dict(rate=['first', 'max', 'min', 'last'], amount='sum', total='sum'))
+    bars = bars[bars[('amount', 'sum')] > 0]
+    return [dict(date=int(ts.value // 10**9),
+                 open=row[('rate', 'first')], high=row[('rate', 'max')],
+                 low=row[('rate', 'min')], close=row[('rate', 'last')],
+                 volume=row[('total', 'sum')],
+                 quoteVolume=row[('amount', 'sum')],
+                 weightedAverage=(row[('total', 'sum')] /
+                                  row[('amount', 'sum')]))
+            for ts, row in bars.iterrows()]
+
+
+def gzip_compress(data):
+    """Compress data in gzip format like a web server
+
+    Args:
+        data (bytes): data
+
+    Returns:
+        bytes: gzip compressed data
+    """
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as fh:
+        fh.write(data)
+    return buf.getvalue()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer(object):
+    """Local HTTP server imitating the public Poloniex API
+
+    Args:
+        trades_per_day (int): expected number of synthetic trades per day
+        latency (float): seconds to wait before answering each request
+        fixtures (str): directory of recorded trades used instead of
+            synthetic ones
+        seed (int): random seed of synthetic trades
+    """
+    def __init__(self, trades_per_day=20000, latency=0., fixtures=None,
+                 seed=42):
+        if fixtures is not None:
+            self.trades = RecordedTrades(fixtures)
+        else:
+            self.trades = SyntheticTrades(trades_per_day, seed)
+        self.latency = latency
+        self.n_calls = 0
+        self.n_trades = 0
+        self.call_times = []
+        self._failures = dict()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/public".format(host, port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start serving in a background thread
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/stats':
+                    status, data = 200, stub.stats()
+                elif url.path != '/public':
+                    status, data = 404, dict(error="Not found.")
+                else:
+                    params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    status, data = stub.respond(params)
+                body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip_compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def fail(self, pair, times=1, status=503):
+        """Answer the next trade or chart requests of a pair with an error
+
+        Args:
+            pair (str): asset pair name
+            times (int): number of requests to fail
+            status (int): HTTP status, with 200 the error is reported in the
+                payload like the API does for invalid requests
+        """
+        with self._lock:
+            self._failures[pair] = (times, status)
+
+    def respond(self, params):
+        """Answer a request
+
+        Args:
+            params (dict): query parameters
+
+        Returns:
+            tuple: HTTP status and JSON payload
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.n_calls += 1
+            self.call_times.append(time.time())
+        command = params.get('command')
+        if command == 'returnCurrencies':
+            return 200, self.currencies()
+        if command not in ('returnTradeHistory', 'returnChartData'):
+            return 200, dict(error="Invalid command.")
+        pair = params['currencyPair']
+        with self._lock:
+            times, status = self._failures.get(pair, (0, None))
+            if times:
+                self._failures[pair] = (times - 1, status)
+        if times:
+            return status, dict(error="Service unavailable.")
+        start, end = int(float(params['start'])), int(float(params['end']))
+        ids, seconds, rates, amounts = self.trades.window(pair, start, end)
+        if command == 'returnChartData':
+            return 200, chart_payload(seconds, rates, amounts,
+                                      int(params['period']))
+        ids, seconds, rates, amounts = (col[:MAX_TRADES] for col in
+                                        (ids, seconds, rates, amounts))
+        with self._lock:
+            self.n_trades += len(seconds)
+        return 200, trades_payload(ids, seconds, rates, amounts)
+
+    def stats(self):
+        """Number of calls and trades served
+
+        Returns:
+            dict: `n_calls` and `n_trades`
+        """
+        with self._lock:
+            return dict(n_calls=self.n_calls, n_trades=self.n_trades)
+
+    def currencies(self):
+        """Payload of returnCurrencies
+
+        Returns:
+            dict: currencies of all served symbols
+        """
+        return {symbol: dict(id=i, name=symbol, txFee="0.0",
+                             minConf=1, depositAddress=None, disabled=0,
+                             delisted=0, frozen=0)
+                for i, symbol in enumerate(SYMBOLS)}
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--trades-per-day', type=int, default=20000)
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--fixtures', help="directory of recorded trades")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(args)
+    with StubServer(args.trades_per_day, args.latency, args.fixtures,
+                    args.seed) as server:
+        print(server.url)
+        sys.stdout.flush()
+        sys.stdin.read()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
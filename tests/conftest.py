@@ -9,4 +9,35 @@
 """
 from __future__ import print_function, absolute_import, division
 
+import os
+import sys
+
 import pytest
+
+# the API stand-in lives with the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..',
+                                'benchmarks'))
+
+
+@pytest.fixture
+def stub_server():
+    """Local stand-in of the Poloniex API serving synthetic trades"""
+    from stub_server import StubServer
+    with StubServer(trades_per_day=2000) as server:
+        yield server
+
+
+@pytest.fixture
+def use_server(monkeypatch):
+    """Point the API at a server for one test
+
+    Client and rate limiter are restored after the test, so that tests
+    neither depend on nor leak into the global state of the API.
+    """
+    from zipline_poloniex import api
+    from zipline_poloniex.utils import TokenBucket
+
+    def use(server, rate=1000):
+        monkeypatch.setattr(api, '_client', api.Client(server.url))
+        monkeypatch.setattr(api.query_api, 'bucket', TokenBucket(rate))
+    return use
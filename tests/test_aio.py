@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pandas as pd
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from zipline_poloniex.aio import AsyncClient  # noqa: E402
+from zipline_poloniex.api import (Client, RequestError,  # noqa: E402
+                                  trade_hist_to_frame)
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+START = pd.Timestamp('2017-01-01', tz='utc')
+END = START + pd.Timedelta(hours=1)
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_async_client_get_trade_hist(stub_server):
+    async def fetch():
+        async with AsyncClient(stub_server.url) as client:
+            return await client.get_trade_hist('USDT_BTC', START, END)
+
+    trades = run(fetch())
+    client = Client(stub_server.url)
+    expected = trade_hist_to_frame(client.query(
+        'returnTradeHistory', raw=True, currencyPair='USDT_BTC',
+        start=START.value // 10**9, end=END.value // 10**9))
+    client.close()
+    assert len(trades)
+    pd.testing.assert_frame_equal(trades, expected)
+
+
+def test_async_client_request_error(stub_server):
+    async def fetch():
+        async with AsyncClient(stub_server.url) as client:
+            return await client.query('returnBogus')
+
+    with pytest.raises(RequestError) as excinfo:
+        run(fetch())
+    assert "Invalid command." in str(excinfo.value)
+
+
+def test_async_client_http_error(stub_server):
+    async def fetch():
+        url = stub_server.url.replace('/public', '/missing')
+        async with AsyncClient(url) as client:
+            return await client.query('returnCurrencies')
+
+    with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+        run(fetch())
+    assert excinfo.value.status == 404
+
+
+def test_async_client_gzip(stub_server):
+    async def fetch():
+        async with AsyncClient(stub_server.url) as client:
+            async with client._session.get(
+                    client.url, params=dict(command='returnCurrencies')) as r:
+                encoding = r.headers.get('Content-Encoding')
+                data = await r.json()
+            return encoding, data, await client.query('returnCurrencies')
+
+    encoding, data, currencies = run(fetch())
+    assert encoding == 'gzip'
+    assert data == currencies
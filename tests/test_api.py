@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from zipline_poloniex import api
+from zipline_poloniex.api import (Client, RequestError, TradesExceeded,
+                                  WindowPlanner, decode_trades,
+                                  iter_trade_hist, parse_trades,
+                                  trade_hist_to_frame)
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+START = 1483228800  # 2017-01-01
+END = START + 60*60
+
+
+def test_client_query(stub_server):
+    client = Client(stub_server.url)
+    currencies = client.query('returnCurrencies')
+    assert 'BTC' in currencies
+    trades = client.query('returnTradeHistory', currencyPair='USDT_BTC',
+                          start=START, end=END)
+    assert trades
+    assert client.n_calls == stub_server.n_calls == 2
+    client.close()
+
+
+def test_client_request_error(stub_server):
+    client = Client(stub_server.url)
+    with pytest.raises(RequestError) as excinfo:
+        client.query('returnBogus')
+    assert "Invalid command." in str(excinfo.value)
+    client.close()
+
+
+def test_client_http_error(stub_server):
+    client = Client(stub_server.url.replace('/public', '/missing'))
+    with pytest.raises(requests.HTTPError):
+        client.query('returnCurrencies')
+    client.close()
+
+
+def test_client_gzip(stub_server):
+    client = Client(stub_server.url)
+    params = dict(command='returnTradeHistory', currencyPair='USDT_BTC',
+                  start=START, end=END)
+    r = client.session.get(client.url, params=params)
+    assert r.headers['Content-Encoding'] == 'gzip'
+    body = client.query(raw=True, **params)
+    assert body == r.content
+    columns = parse_trades(body)
+    expected = decode_trades(json.loads(body.decode('utf-8')))
+    assert sorted(columns) == sorted(expected)
+    for key in expected:
+        np.testing.assert_array_equal(columns[key], expected[key])
+    frame = trade_hist_to_frame(body)
+    assert len(frame) == len(expected['date'])
+    client.close()
+
+
+def trades_body(n_trades):
+    from stub_server import trades_payload
+    seconds = START + np.arange(n_trades)[::-1]
+    payload = trades_payload(np.arange(n_trades)[::-1], seconds,
+                             np.full(n_trades, 100.), np.ones(n_trades))
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def test_trades_exceeded_before_decoding(monkeypatch):
+    body = trades_body(100)
+    monkeypatch.setattr(api, 'MAX_TRADES', 100)
+
+    def gather(*args):
+        raise AssertionError("columns decoded")
+    with monkeypatch.context() as patch:
+        patch.setattr(api, '_gather', gather)
+        with pytest.raises(TradesExceeded):
+            api.trade_hist_to_columns(body)
+        # layouts the scanner does not know are counted after json decoding
+        with pytest.raises(TradesExceeded):
+            parse_trades(body.replace(b'"buy"', b'"b\\u0075y"'),
+                         max_trades=100)
+    with pytest.raises(TradesExceeded):
+        api.trade_hist_to_columns(json.loads(body.decode('utf-8')))
+    columns = api.trade_hist_to_columns(trades_body(99))
+    assert columns['date'].size == 99
+
+
+DAY = pd.Timestamp('2017-01-01', tz='utc')
+SECOND = pd.Timedelta(seconds=1)
+
+
+def assert_covers(windows, start, end):
+    """Windows cover [start, end] in order without gaps or overlap"""
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, prev_end), (next_start, next_end) in zip(windows, windows[1:]):
+        assert next_start == prev_end + SECOND
+        assert next_start <= next_end
+
+
+def test_window_planner_merges_quiet_days():
+    planner = WindowPlanner()
+    assert planner.window('USDT_BTC') == pd.Timedelta(days=1)
+    planner.observe('USDT_BTC', 1000, pd.Timedelta(days=1))
+    # 25000 trades take 25 days at 1000 trades per day
+    assert planner.window('USDT_BTC') == pd.Timedelta(days=25)
+    end = DAY + pd.Timedelta(days=20) - SECOND
+    assert planner.split('USDT_BTC', DAY, end) == [(DAY, end)]
+    # other pairs are not affected
+    assert planner.window('USDT_ETH') == pd.Timedelta(days=1)
+
+
+def test_window_planner_clamps_windows():
+    planner = WindowPlanner()
+    planner.observe('USDT_BTC', 0, pd.Timedelta(days=1))
+    assert planner.window('USDT_BTC') == pd.Timedelta(days=30)
+    planner.observe('USDT_ETH', api.MAX_TRADES, pd.Timedelta(seconds=1))
+    assert planner.window('USDT_ETH') == pd.Timedelta(minutes=1)
+
+
+def test_window_planner_reacts_to_busy_periods():
+    planner = WindowPlanner()
+    planner.observe('USDT_BTC', 1000, pd.Timedelta(days=1))
+    planner.observe('USDT_BTC', 100000, pd.Timedelta(days=1))
+    assert planner.window('USDT_BTC') == pd.Timedelta(hours=6)
+    # a quiet period only halves the estimated density
+    planner.observe('USDT_BTC', 0, pd.Timedelta(days=1))
+    assert planner.window('USDT_BTC') == pd.Timedelta(hours=12)
+
+
+@pytest.mark.parametrize('trades_per_day', [3000, 100000, 250000, 10**7])
+def test_window_planner_split_covers_period(trades_per_day):
+    planner = WindowPlanner()
+    planner.observe('USDT_BTC', trades_per_day, pd.Timedelta(days=1))
+    end = DAY + pd.Timedelta(days=3) - SECOND
+    windows = planner.split('USDT_BTC', DAY, end)
+    assert_covers(windows, DAY, end)
+    lengths = [w_end - w_start + SECOND for w_start, w_end in windows]
+    assert max(lengths) <= planner.window('USDT_BTC')
+    assert max(lengths) - min(lengths) <= SECOND
+
+
+def exceeding_trade_columns(requested, trades_per_second=1.2):
+    """Stand-in of `api.get_trade_columns` for a constant rate of trades"""
+    def get_trade_columns(pair, start, end):
+        requested.append((start, end))
+        n_trades = int((end - start + SECOND).total_seconds() *
+                       trades_per_second)
+        if n_trades >= api.MAX_TRADES:
+            raise TradesExceeded("Number of trades exceeded")
+        return dict(date=np.zeros(n_trades, dtype=np.int64))
+    return get_trade_columns
+
+
+def test_iter_trade_hist_halves_exceeded_windows(monkeypatch):
+    requested = []
+    monkeypatch.setattr(api, 'get_trade_columns',
+                        exceeding_trade_columns(requested, 0.9))
+    end = DAY + pd.Timedelta(days=1) - SECOND
+    chunks = list(iter_trade_hist('USDT_BTC', DAY, end))
+    half = DAY + pd.Timedelta(hours=12)
+    assert requested == [(DAY, end), (DAY, half - SECOND), (half, end)]
+    assert len(chunks) == 2
+
+
+def test_iter_trade_hist_plans_after_exceeded_window(monkeypatch):
+    requested = []
+    monkeypatch.setattr(api, 'get_trade_columns',
+                        exceeding_trade_columns(requested))
+    planner = WindowPlanner()
+    end = DAY + pd.Timedelta(days=1) - SECOND
+    list(iter_trade_hist('USDT_BTC', DAY, end, planner))
+    assert requested[0] == (DAY, end)
+    assert_covers(requested[1:], DAY, end)
+    # the next day is split up front, so that no window is exceeded and
+    # the windows requested cover the day exactly
+    requested[:] = []
+    start, end = end + SECOND, end + pd.Timedelta(days=1)
+    list(iter_trade_hist('USDT_BTC', start, end, planner))
+    assert_covers(requested, start, end)
+    assert len(requested) > 2
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from zipline_poloniex.bars import (FIELDS, BarPyramidReader, BarPyramidWriter,
+                                   downsample)
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+DAY = pd.Timestamp('2017-01-01', tz='UTC')
+ONE_DAY = pd.Timedelta(days=1)
+AGG = dict(open='first', high='max', low='min', close='last', volume='sum')
+
+
+def make_minute_bars(start, n_days, seed=42):
+    """Minute bars of several days with about a third of minutes empty"""
+    rng = np.random.RandomState(seed)
+    index = pd.date_range(start, periods=n_days * 24 * 60, freq='T',
+                          name='date')
+    index = index[rng.rand(index.size) < 0.7]
+    close = 100. * np.exp(np.cumsum(rng.normal(0, 1e-3, index.size)))
+    spread = rng.exponential(0.05, (2, index.size))
+    bars = pd.DataFrame(dict(open=close + rng.normal(0, 0.05, index.size),
+                             high=close + spread[0], low=close - spread[1],
+                             close=close,
+                             volume=rng.exponential(2., index.size)),
+                        index=index, columns=FIELDS)
+    return bars.astype(np.float32)
+
+
+def write_pyramid(rootdir, bars_by_sid, freqs=('1T', '5T', '1H', '1D')):
+    writer = BarPyramidWriter(rootdir, freqs)
+    for sid, bars in sorted(bars_by_sid.items()):
+        for _, day_bars in bars.groupby(bars.index.floor('D')):
+            writer.write_day(sid, day_bars)
+    writer.close()
+    return BarPyramidReader(rootdir)
+
+
+def resample(bars, start, end, freq):
+    """Bars of all minutes from start to end resampled with pandas"""
+    minutes = pd.date_range(start, end, freq='T', name='date')
+    bars = bars.reindex(minutes)
+    bars['volume'] = bars['volume'].fillna(0)
+    return bars.astype(np.float64).resample(freq).agg(AGG)[list(FIELDS)]
+
+
+def assert_bars_equal(result, expected):
+    assert result.index.equals(expected.index)
+    for field in FIELDS:
+        np.testing.assert_allclose(result[field].values,
+                                   expected[field].values, rtol=1e-5)
+
+
+@pytest.fixture
+def pyramid(tmpdir):
+    bars = {0: make_minute_bars(DAY, 3),
+            # starts a day after the pyramid
+            1: make_minute_bars(DAY + ONE_DAY, 2, seed=7)}
+    return write_pyramid(str(tmpdir.join('pyramid')), bars), bars
+
+
+@pytest.mark.parametrize('freq', ['5T', '1H', '1D', '2H', '3T'])
+@pytest.mark.parametrize('sid', [0, 1])
+def test_reader_equals_resample(pyramid, freq, sid):
+    reader, bars = pyramid
+    end = DAY + 3 * ONE_DAY - pd.Timedelta(minutes=1)
+    expected = resample(bars[sid], DAY, end, freq)
+    assert_bars_equal(reader.get_bars(sid, DAY, end, freq), expected)
+
+
+@pytest.mark.parametrize('freq', ['5T', '2H', '3T'])
+def test_reader_unaligned_range(pyramid, freq):
+    reader, bars = pyramid
+    # starts within a bar, before the first day of sid 1 and crosses it
+    start = DAY + ONE_DAY - pd.Timedelta(hours=3, minutes=-7)
+    end = DAY + ONE_DAY + pd.Timedelta(hours=3, minutes=2)
+    full_end = DAY + 3 * ONE_DAY - pd.Timedelta(minutes=1)
+    for sid in (0, 1):
+        expected = resample(bars[sid], DAY, full_end, freq)
+        expected = expected.loc[start.floor(freq):end.floor(freq)]
+        result = reader.get_bars(sid, start, end, freq)
+        assert_bars_equal(result, expected)
+    opens, volumes = reader.load_raw_arrays(['open', 'volume'], start, end,
+                                            [0, 1], freq)
+    assert opens.shape == volumes.shape == (expected.shape[0], 2)
+    np.testing.assert_allclose(opens[:, 1], expected['open'].values,
+                               rtol=1e-5)
+
+
+def test_window_slices_memmap(pyramid):
+    reader, bars = pyramid
+    end = DAY + 2 * ONE_DAY + pd.Timedelta(hours=5, minutes=30)
+    close = reader.window('close', 1, end, 30)
+    assert isinstance(close, np.memmap)
+    expected = resample(bars[1], DAY + ONE_DAY, end, '1T')['close']
+    np.testing.assert_array_equal(close, expected.values[-30:])
+    hourly = reader.window('volume', 0, end, 10, freq='1H')
+    assert isinstance(hourly, np.memmap)
+    # the bar containing `end` is complete
+    expected = resample(bars[0], DAY, DAY + 3 * ONE_DAY, '1H')['volume']
+    np.testing.assert_allclose(hourly, expected[:end].values[-10:], rtol=1e-5)
+
+
+def test_window_before_first_day(pyramid):
+    reader, bars = pyramid
+    end = DAY + ONE_DAY + pd.Timedelta(minutes=9)
+    close = reader.window('close', 1, end, 30)
+    assert not isinstance(close, np.memmap)
+    expected = resample(bars[1], DAY + ONE_DAY, end, '1T')['close']
+    assert np.isnan(close[:20]).all()
+    np.testing.assert_array_equal(close[20:], expected.values)
+
+
+def test_downsample_equals_resample():
+    bars = make_minute_bars(DAY, 1)
+    full = resample(bars, DAY, DAY + ONE_DAY - pd.Timedelta(minutes=1), '1T')
+    arrays = {field: full[field].values.astype(np.float32)
+              for field in FIELDS}
+    result = downsample(arrays, 60)
+    expected = resample(bars, DAY, DAY + ONE_DAY - pd.Timedelta(minutes=1),
+                        '1H')
+    for field in FIELDS:
+        np.testing.assert_allclose(result[field], expected[field].values,
+                                   rtol=1e-5)
@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import os
+import resource
+
+import numpy as np
+import pandas as pd
+import pytest
+try:
+    from pandas.testing import assert_frame_equal
+except ImportError:  # pandas < 0.20
+    from pandas.util.testing import assert_frame_equal
+
+from zipline.data.bundles import ingest, load, register
+
+from zipline_poloniex import api
+from zipline_poloniex.bars import MICROSTRUCTURE_FIELDS, downsample
+from zipline_poloniex.bundle import (CandleAccumulator, arrays_to_frame,
+                                     collect_daily_bars, create_bundle,
+                                     fetch_trades, find_active_days,
+                                     make_candle_stick, make_candle_sticks,
+                                     prepare_data, stream_candle_stick)
+from zipline_poloniex.metrics import get_metrics
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+DAY = pd.Timestamp('2017-01-01', tz='utc')
+END = DAY + pd.Timedelta(days=1, seconds=-1)
+
+
+def resample_candle_stick(trades, freq='1T'):
+    """Reference of the former implementation with one resample per field"""
+    volume = trades['amount'].resample(freq).sum()
+    volume = volume.fillna(0)
+    high = trades['rate'].resample(freq).max()
+    low = trades['rate'].resample(freq).min()
+    open = trades['rate'].resample(freq).first()
+    close = trades['rate'].resample(freq).last()
+    return pd.DataFrame(
+        dict(open=open, high=high, low=low, close=close, volume=volume),
+        columns=['open', 'high', 'low', 'close', 'volume'])
+
+
+def make_trades(n_trades=5000, seed=42, pad=True):
+    """Synthetic trades of a day, newest first like Poloniex returns them
+
+    Trades are clustered, so that many minutes have no trades, and padded
+    with the day's start and end like `fetch_trades` does.
+    """
+    rng = np.random.RandomState(seed)
+    # unique seconds, so that the order of trades within a minute is defined
+    seconds = np.sort(rng.choice(6*60*60, n_trades, replace=False) +
+                      rng.choice([0, 8, 16], n_trades) * 60*60)[::-1]
+    nanos = DAY.value + seconds.astype(np.int64) * 10**9
+    index = pd.DatetimeIndex(nanos.view('datetime64[ns]'), name='date',
+                             tz='UTC')
+    trades = pd.DataFrame(
+        dict(rate=rng.lognormal(7, 0.01, n_trades).astype(np.float32),
+             amount=rng.exponential(0.5, n_trades).astype(np.float32)),
+        index=index, columns=['rate', 'amount'])
+    if pad:
+        trades.loc[DAY] = np.nan
+        trades.loc[END] = np.nan
+    return trades
+
+
+def assert_candles_equal(result, expected):
+    """Compare candles ignoring the frequency attribute of their index"""
+    assert result.index.equals(expected.index)
+    assert result.index.name == expected.index.name
+    assert_frame_equal(result.reset_index(drop=True),
+                       expected.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize('freq', ['1T', '5T', '15T', '1H', '1D'])
+def test_make_candle_stick_equals_resample(freq):
+    trades = make_trades()
+    assert_candles_equal(make_candle_stick(trades, freq),
+                         resample_candle_stick(trades, freq))
+
+
+def test_make_candle_stick_unpadded():
+    trades = make_trades(pad=False)
+    assert_candles_equal(make_candle_stick(trades),
+                         resample_candle_stick(trades))
+
+
+def test_make_candle_stick_unsorted():
+    trades = make_trades()
+    shuffled = trades.iloc[np.random.RandomState(0).permutation(len(trades))]
+    assert_candles_equal(make_candle_stick(shuffled),
+                         resample_candle_stick(trades))
+
+
+def test_make_candle_stick_padded_empty_day():
+    trades = make_trades(n_trades=0)
+    result = make_candle_stick(trades)
+    assert len(result) == 24 * 60
+    assert result[['open', 'high', 'low', 'close']].isnull().all().all()
+    assert (result['volume'] == 0).all()
+    assert_candles_equal(result, resample_candle_stick(trades))
+
+
+def test_make_candle_stick_no_trades():
+    trades = make_trades(n_trades=0, pad=False)
+    result = make_candle_stick(trades)
+    assert result.empty
+    assert list(result.columns) == ['open', 'high', 'low', 'close', 'volume']
+
+
+def test_make_candle_sticks_several_freqs():
+    trades = make_trades()
+    freqs = ('1T', '5T', '1H')
+    charts = make_candle_sticks(trades, freqs)
+    assert sorted(charts) == sorted(freqs)
+    for freq in freqs:
+        assert_candles_equal(charts[freq],
+                             resample_candle_stick(trades, freq))
+
+
+def microstructure_reference(trades, freq='1T'):
+    """VWAP, number of trades and buy and sell volume by a pandas groupby"""
+    amount = trades['amount'].astype(np.float64)
+    buy = trades['type'] == 'buy'
+    df = pd.DataFrame(dict(notional=trades['rate'].astype(np.float64) * amount,
+                           amount=amount, trades=1,
+                           buy_volume=amount.where(buy, 0.),
+                           sell_volume=amount.where(~buy, 0.)),
+                      index=trades.index)
+    bins = pd.date_range(DAY, END, freq=freq, name='date')
+    grouped = df.groupby(df.index.floor(freq)).sum().reindex(bins).fillna(0)
+    vwap = (grouped['notional'] / grouped['amount']).where(
+        grouped['amount'] > 0)
+    return pd.DataFrame(dict(vwap=vwap, trades=grouped['trades'],
+                             buy_volume=grouped['buy_volume'],
+                             sell_volume=grouped['sell_volume']),
+                        columns=MICROSTRUCTURE_FIELDS)
+
+
+def assert_microstructure_equal(arrays, expected):
+    vwap = arrays['vwap']
+    # minutes without trades
+    np.testing.assert_array_equal(np.isnan(vwap), expected['vwap'].isnull())
+    np.testing.assert_array_equal(arrays['trades'][np.isnan(vwap)], 0)
+    np.testing.assert_allclose(vwap, expected['vwap'].values, rtol=1e-6)
+    np.testing.assert_array_equal(arrays['trades'], expected['trades'].values)
+    for field in ('buy_volume', 'sell_volume'):
+        np.testing.assert_allclose(arrays[field], expected[field].values,
+                                   rtol=1e-5)
+
+
+def test_candle_accumulator_microstructure():
+    trades = make_trades(pad=False).sort_index()
+    rng = np.random.RandomState(7)
+    trades['type'] = rng.choice(api.TRADE_TYPES, len(trades))
+    columns = dict(
+        date=trades.index.values.astype('datetime64[s]').astype(np.int64),
+        rate=trades['rate'].values, amount=trades['amount'].values,
+        type=pd.Categorical(trades['type'], api.TRADE_TYPES))
+    candles = CandleAccumulator(DAY, END, microstructure=True)
+    # chunks of consecutive windows
+    for chunk in np.array_split(np.arange(len(trades)), 3):
+        candles.update({col: values[chunk] for col, values in columns.items()})
+    first, freq, arrays = candles.to_arrays()
+    assert first == DAY.value
+    expected = microstructure_reference(trades)
+    assert (expected['trades'] == 0).sum() > 100
+    assert_microstructure_equal(arrays, expected)
+    np.testing.assert_allclose(arrays['buy_volume'] + arrays['sell_volume'],
+                               arrays['volume'], rtol=1e-5)
+    # bars of the pyramid combined from the minute bars
+    for factor, coarse in ((5, '5T'), (60, '1H'), (24*60, '1D')):
+        fields = ('volume',) + MICROSTRUCTURE_FIELDS
+        combined = downsample({field: arrays[field] for field in fields},
+                              factor)
+        assert_microstructure_equal(combined,
+                                    microstructure_reference(trades, coarse))
+
+
+def test_collect_daily_bars_equals_resample():
+    days = []
+    for i, n_trades in enumerate([5000, 0, 300]):
+        trades = make_trades(n_trades, seed=i)
+        trades.index += pd.Timedelta(days=i)
+        days.append(make_candle_stick(trades))
+    daily_bars = dict()
+    passed = collect_daily_bars([(7, candles) for candles in days],
+                                daily_bars)
+    assert all(candles is day for (_, candles), day in zip(passed, days))
+    result = pd.DataFrame([bar for _, bar in daily_bars[7]],
+                          index=[day for day, _ in daily_bars[7]],
+                          columns=['open', 'high', 'low', 'close', 'volume'])
+    expected = pd.concat(days).resample('1D').agg(
+        dict(open='first', high='max', low='min', close='last', volume='sum'))
+    # the day without trades has no prices and zero volume
+    assert result.iloc[1][['open', 'high', 'low', 'close']].isnull().all()
+    assert result.iloc[1]['volume'] == 0
+    assert list(result.index) == list(expected.index)
+    assert_frame_equal(result.reset_index(drop=True),
+                       expected[result.columns].reset_index(drop=True),
+                       check_dtype=False)
+
+
+def make_query_api(day, n_trades, seed=42):
+    """Stand-in of `api.query_api` serving raw bodies of a synthetic day
+
+    Records are encoded up front, so that serving a window allocates
+    little more than its body. Like the API, at most `api.MAX_TRADES`
+    trades are returned.
+    """
+    rng = np.random.RandomState(seed)
+    start = day.value // 10**9
+    seconds = np.sort(rng.randint(start, start + 24*60*60, n_trades))[::-1]
+    dates = pd.to_datetime(seconds, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+    rates = rng.lognormal(7, 0.01, n_trades)
+    records = [json.dumps(dict(globalTradeID=n_trades - i,
+                               tradeID=n_trades - i, date=dates[i],
+                               type='buy', rate='{:.8f}'.format(rates[i]),
+                               amount='1.0',
+                               total='{:.8f}'.format(rates[i])),
+                          separators=(',', ':')).encode('utf-8')
+               for i in range(n_trades)]
+
+    def query_api(command, raw=False, **kwargs):
+        assert command == 'returnTradeHistory' and raw
+        lo = np.searchsorted(-seconds, -kwargs['end'], side='left')
+        hi = np.searchsorted(-seconds, -kwargs['start'], side='right')
+        hi = min(hi, lo + api.MAX_TRADES)
+        return b'[' + b','.join(records[lo:hi]) + b']'
+
+    return query_api
+
+
+def traced_peak(func, *args):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_kib():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return peak_rss
+
+
+def test_stream_candle_stick_equals_whole_day(monkeypatch):
+    monkeypatch.setattr(api, 'MAX_TRADES', 2000)
+    monkeypatch.setattr(api, 'query_api', make_query_api(DAY, 10000))
+    streamed = stream_candle_stick('USDT_BTC', DAY, END)
+    whole_day = make_candle_stick(fetch_trades('USDT_BTC', DAY, END))
+    assert_frame_equal(streamed, whole_day, check_dtype=False)
+
+
+def test_stream_candle_stick_bounded_memory(monkeypatch, record_property):
+    pytest.importorskip('tracemalloc')
+    monkeypatch.setattr(api, 'MAX_TRADES', 2000)
+    peaks = []
+    for n_trades in (10000, 40000):
+        monkeypatch.setattr(api, 'query_api', make_query_api(DAY, n_trades))
+        peaks.append(traced_peak(stream_candle_stick, 'USDT_BTC', DAY, END))
+    whole_day = traced_peak(
+        lambda: make_candle_stick(fetch_trades('USDT_BTC', DAY, END)))
+    # memory depends on the size of a chunk, not on the trades of the day
+    assert peaks[1] < 1.5 * peaks[0]
+    assert peaks[1] < whole_day / 2
+    # the peak RSS of the test process also holds all earlier tests, so it is
+    # only reported, see benchmarks/bench_memory.py for RSS per pipeline
+    record_property('peak_rss_kib', peak_rss_kib())
+
+
+def ingest_bundle(root, name, start, end, pairs=('USDT_ETH',), **kwargs):
+    """Ingest a bundle of `create_bundle` from the server in use"""
+    register(name, create_bundle(list(pairs), **kwargs),
+             calendar_name='POLONIEX', minutes_per_day=24*60,
+             start_session=start, end_session=end)
+    ingest(name, environ=dict(ZIPLINE_ROOT=root))
+
+
+def load_minute_bars(root, name, start, end):
+    """Minute bars of all assets of the most recent ingestion"""
+    bundle = load(name, environ=dict(ZIPLINE_ROOT=root))
+    reader = bundle.equity_minute_bar_reader
+    assets = bundle.asset_finder.retrieve_all(bundle.asset_finder.sids)
+    minutes = reader.calendar.minutes_for_sessions_in_range(start, end)
+    fields = ['open', 'high', 'low', 'close', 'volume']
+    return {asset.symbol: reader.load_raw_arrays(
+                fields, minutes[0], minutes[-1], [asset.sid])
+            for asset in assets}
+
+
+def assert_bars_equal(result, expected):
+    assert sorted(result) == sorted(expected)
+    for symbol in expected:
+        for array, expected_array in zip(result[symbol], expected[symbol]):
+            np.testing.assert_array_equal(array, expected_array)
+
+
+def test_incremental_ingest_equals_full_ingest(stub_server, use_server,
+                                               tmpdir):
+    use_server(stub_server)
+    start = DAY
+    first_end = start + pd.Timedelta(days=2)
+    end = start + pd.Timedelta(days=4)
+    pairs = ('USDT_ETH', 'USDT_LTC')
+    full_root = str(tmpdir.join('full'))
+    ingest_bundle(full_root, 'full', start, end, pairs)
+    expected = load_minute_bars(full_root, 'full', start, end)
+
+    root = str(tmpdir.join('incremental'))
+    ingest_bundle(root, 'incremental', start, first_end, pairs,
+                  incremental=True)
+    n_trades = stub_server.n_trades
+    ingest_bundle(root, 'incremental', start, end, pairs, incremental=True)
+    assert_bars_equal(load_minute_bars(root, 'incremental', start, end),
+                      expected)
+    # only the trades of the new days were requested
+    new_trades = sum(
+        len(stub_server.trades.window(pair, first_end.value // 10**9,
+                                      end.value // 10**9 - 1)[0])
+        for pair in pairs)
+    assert stub_server.n_trades - n_trades == new_trades
+
+
+def test_failed_ingest_resumes(stub_server, use_server, tmpdir):
+    use_server(stub_server)
+    end = DAY + pd.Timedelta(days=4)
+    pairs = ('USDT_ETH', 'USDT_LTC')
+    full_root = str(tmpdir.join('full'))
+    ingest_bundle(full_root, 'full', DAY, end, pairs)
+    expected = load_minute_bars(full_root, 'full', DAY, end)
+
+    root = str(tmpdir.join('resumed'))
+    # the days of the first pair are done when the second one fails
+    stub_server.fail('USDT_LTC', status=200)
+    with pytest.raises(api.RequestError):
+        ingest_bundle(root, 'resumed', DAY, end, pairs)
+    n_calls, n_trades = stub_server.n_calls, stub_server.n_trades
+    ingest_bundle(root, 'resumed', DAY, end, pairs)
+    assert_bars_equal(load_minute_bars(root, 'resumed', DAY, end), expected)
+    # the days kept by zipline's cache of the failed ingest are not fetched
+    # again, only the assets and the trades of the failed pair
+    ltc_trades = len(stub_server.trades.window(
+        'USDT_LTC', DAY.value // 10**9, end.value // 10**9 - 1)[0])
+    assert stub_server.n_trades - n_trades == ltc_trades
+    resumed_calls = stub_server.n_calls - n_calls
+    n_calls = stub_server.n_calls
+    ingest_bundle(str(tmpdir.join('ltc')), 'ltc', DAY, end, ('USDT_LTC',))
+    assert resumed_calls == stub_server.n_calls - n_calls
+
+
+def test_incremental_ingest_other_start_session(stub_server, use_server,
+                                                tmpdir, caplog):
+    use_server(stub_server)
+    start = DAY + pd.Timedelta(days=1)
+    end = start + pd.Timedelta(days=2)
+    full_root = str(tmpdir.join('full'))
+    ingest_bundle(full_root, 'full', start, end)
+    expected = load_minute_bars(full_root, 'full', start, end)
+
+    root = str(tmpdir.join('incremental'))
+    ingest_bundle(root, 'incremental', DAY, end - pd.Timedelta(days=1),
+                  incremental=True)
+    ingest_bundle(root, 'incremental', start, end, incremental=True)
+    assert "incompatible, ingesting all data" in caplog.text
+    assert_bars_equal(load_minute_bars(root, 'incremental', start, end),
+                      expected)
+
+
+def test_chart_ingest(stub_server, use_server, tmpdir):
+    use_server(stub_server)
+    root = str(tmpdir)
+    end = DAY + pd.Timedelta(days=2)
+    ingest_bundle(root, 'chart', DAY, end, chart_period=300)
+    bundle = load('chart', environ=dict(ZIPLINE_ROOT=root))
+    asset, = bundle.asset_finder.retrieve_all(bundle.asset_finder.sids)
+    ids, seconds, rates, amounts = stub_server.trades.window(
+        'USDT_ETH', DAY.value // 10**9, end.value // 10**9 - 1)
+    trades = pd.DataFrame(
+        dict(rate=rates, amount=amounts),
+        index=pd.DatetimeIndex(pd.to_datetime(seconds, unit='s'), tz='UTC'))
+    trades = trades.sort_index(kind='mergesort')
+
+    # candles are written at the last minute of their period
+    expected = resample_candle_stick(trades, '5T')
+    expected.index += pd.Timedelta(minutes=4)
+    minutes = bundle.equity_minute_bar_reader.calendar.minutes_in_range(
+        DAY, end - pd.Timedelta(minutes=1))
+    close, volume = bundle.equity_minute_bar_reader.load_raw_arrays(
+        ['close', 'volume'], minutes[0], minutes[-1], [asset.sid])
+    bars = pd.DataFrame(dict(close=close[:, 0], volume=volume[:, 0]),
+                        index=minutes)
+    assert bars['close'].notnull().sum() == expected['close'].notnull().sum()
+    np.testing.assert_allclose(bars['close'].reindex(expected.index),
+                               expected['close'], atol=1e-3)
+    np.testing.assert_allclose(bars['volume'].reindex(expected.index),
+                               expected['volume'], atol=1)
+
+    daily = bundle.equity_daily_bar_reader.load_raw_arrays(
+        ['open', 'close'], DAY, end - pd.Timedelta(days=1), [asset.sid])
+    expected = resample_candle_stick(trades, '1D')
+    np.testing.assert_allclose(daily[0][:, 0], expected['open'], atol=1e-3)
+    np.testing.assert_allclose(daily[1][:, 0], expected['close'], atol=1e-3)
+
+
+@pytest.mark.parametrize('option', [
+    dict(incremental=True), dict(trade_store='store'),
+    dict(resolutions=['5T']), dict(microstructure=True),
+    dict(metrics_path='metrics.json'), dict(candle_cache='cache')])
+def test_chart_ingest_rejects_trade_options(option):
+    with pytest.raises(ValueError) as excinfo:
+        create_bundle(['USDT_ETH'], chart_period=300, **option)
+    assert list(option)[0] in str(excinfo.value)
+
+
+def test_prepare_data_processes_equals_threads(stub_server, use_server):
+    use_server(stub_server)
+    bucket = api.query_api.bucket
+    sid_map = {0: 'USDT_ETH'}
+    end = DAY + pd.Timedelta(days=30)
+    expected = list(prepare_data(DAY, end, sid_map, dict()))
+
+    n_calls = stub_server.n_calls
+    metrics = get_metrics()
+    metrics.reset()
+    planner = api.WindowPlanner()
+    result = list(prepare_data(DAY, end, sid_map, dict(), planner=planner,
+                               processes=2, skip_inactive=True))
+    assert len(result) == len(expected) == 30
+    for (sid, candles), (expected_sid, expected_candles) in zip(result,
+                                                                expected):
+        assert sid == expected_sid
+        assert_frame_equal(candles, expected_candles)
+    # the densities of the workers let the parent merge quiet days
+    assert planner.density('USDT_ETH') is not None
+    assert stub_server.n_calls - n_calls < 15
+    # calls of the parent and of the workers are counted
+    counters = metrics.summary()['counters']
+    assert counters['api_calls'] == stub_server.n_calls - n_calls
+    assert api.query_api.bucket is bucket
+
+
+def test_prepare_data_workers_share_the_rate_limit(use_server):
+    from stub_server import StubServer
+    sid_map = {2: 'USDT_LTC', 0: 'USDT_ETH', 1: 'USDT_XRP'}
+    end = DAY + pd.Timedelta(days=3)
+    days = list(pd.date_range(DAY, end, freq='D', closed='left', tz='utc'))
+    with StubServer(trades_per_day=2000, latency=0.2) as server:
+        use_server(server)
+        expected = list(prepare_data(DAY, end, sid_map, dict()))
+        # the default limit of `query_api`
+        use_server(server, rate=6)
+        n_calls = server.n_calls
+        result = list(prepare_data(DAY, end, sid_map, dict(), workers=4))
+    # in the order of the symbol ids and days passed
+    assert [(sid, candles.index[0]) for sid, candles in result] == \
+        [(sid, day) for sid in sid_map for day in days]
+    for (_, candles), (_, expected_candles) in zip(result, expected):
+        assert_frame_equal(candles, expected_candles)
+    times = np.array(server.call_times[n_calls:])
+    assert times.size == len(sid_map) * len(days)
+    # calls are spaced by the rate limit while their latency overlaps
+    assert np.diff(times).min() > 1. / 6 - 0.05
+    assert times[-1] - times[0] < 0.2 * (times.size - 1)
+
+
+def test_aggregate_unit_in_spawned_processes(stub_server, use_server):
+    import multiprocessing
+    from zipline_poloniex.bundle import _aggregate_unit, _shared_limiter
+    use_server(stub_server)
+    sid_map = {0: 'USDT_ETH', 1: 'USDT_LTC'}
+    end = DAY + pd.Timedelta(days=2)
+    expected = list(prepare_data(DAY, end, sid_map, dict()))
+    days = list(pd.date_range(DAY, end, freq='D', closed='left', tz='utc'))
+
+    n_calls = stub_server.n_calls
+    # spawned workers inherit neither the client nor the rate limiter
+    pool = multiprocessing.get_context('spawn').Pool(2)
+    try:
+        with _shared_limiter() as limiter:
+            tasks = [((sid, pair, days, 'fetch'), None, limiter,
+                      stub_server.url, (10, 60), False, None)
+                     for sid, pair in sorted(sid_map.items())]
+            results = pool.map(_aggregate_unit, tasks)
+    finally:
+        pool.terminate()
+    assert sum(result[3] for result in results) == \
+        stub_server.n_calls - n_calls > 0
+    for (unit, arrays, density, _), task in zip(results, tasks):
+        assert unit == task[0]
+        assert density is not None
+        expected_candles = pd.concat([candles for sid, candles in expected
+                                      if sid == unit[0]])
+        assert_candles_equal(arrays_to_frame(*arrays), expected_candles)
+
+
+def test_find_active_days(stub_server, use_server):
+    use_server(stub_server)
+    end = DAY + pd.Timedelta(days=3, seconds=-1)
+    active = find_active_days('USDT_ETH', DAY + pd.Timedelta(hours=5), end)
+    assert list(active) == list(pd.date_range(DAY, periods=3, freq='D'))
+
+
+def record_trades(path, pair, days, n_trades=100):
+    """Fixture of the stub server with trades of a pair on some days"""
+    trades = []
+    for day in days:
+        dates = pd.date_range(day, periods=n_trades, freq='10T')
+        trades.extend(dict(date=date.strftime('%Y-%m-%d %H:%M:%S'),
+                           rate=100. + i, amount=1.)
+                      for i, date in enumerate(dates))
+    with open(os.path.join(path, pair + '.json'), 'w') as fh:
+        json.dump(trades, fh)
+
+
+def test_prepare_data_skips_inactive_days(use_server, tmpdir):
+    from stub_server import StubServer
+    record_trades(str(tmpdir), 'USDT_ETH', [DAY, DAY + pd.Timedelta(days=2)])
+    with StubServer(fixtures=str(tmpdir)) as server:
+        use_server(server)
+        end = DAY + pd.Timedelta(days=4)
+        active = find_active_days('USDT_ETH', DAY, end)
+        assert list(active) == [DAY, DAY + pd.Timedelta(days=2)]
+        metrics = get_metrics()
+        metrics.reset()
+        result = list(prepare_data(DAY, end, {0: 'USDT_ETH'}, dict(),
+                                   skip_inactive=True))
+    assert metrics.summary()['counters']['inactive_days'] == 2
+    volume = [candles['volume'].sum() for _, candles in result]
+    assert volume == [100., 0., 100., 0.]
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+try:
+    from pandas.testing import assert_frame_equal
+except ImportError:  # pandas < 0.20
+    from pandas.util.testing import assert_frame_equal
+
+from zipline_poloniex.bars import FIELD_DTYPES, FIELDS, MICROSTRUCTURE_FIELDS
+from zipline_poloniex.cache import CandleCache
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+DAY = pd.Timestamp('2017-01-01', tz='UTC')
+
+
+def make_candles(day=DAY, seed=42, fields=FIELDS):
+    """Minute bars of a whole day like `prepare_data` caches them"""
+    rng = np.random.RandomState(seed)
+    index = pd.date_range(day, periods=24*60, freq='T', name='date')
+    close = 100. * np.exp(np.cumsum(rng.normal(0, 1e-3, index.size)))
+    values = dict(open=close, high=close * 1.001, low=close * 0.999,
+                  close=close, volume=rng.exponential(2., index.size),
+                  vwap=close, trades=rng.poisson(3, index.size),
+                  buy_volume=rng.exponential(1., index.size),
+                  sell_volume=rng.exponential(1., index.size))
+    candles = pd.DataFrame({field: values[field].astype(FIELD_DTYPES[field])
+                            for field in fields},
+                           index=index, columns=fields)
+    # minutes without trades
+    empty = rng.rand(index.size) < 0.3
+    for field in fields:
+        if field in ('volume', 'trades', 'buy_volume', 'sell_volume'):
+            candles.loc[empty, field] = 0
+        else:
+            candles.loc[empty, field] = np.nan
+    return candles.astype({field: FIELD_DTYPES[field] for field in fields})
+
+
+def key(sid, day=DAY):
+    return "{}_{}".format(sid, day.strftime("%Y-%m-%d"))
+
+
+def test_round_trip_preserves_dtypes(tmpdir):
+    fields = FIELDS + MICROSTRUCTURE_FIELDS
+    candles = make_candles(fields=fields)
+    root = str(tmpdir.join('cache'))
+    with CandleCache(root) as cache:
+        cache[key(0) + '_micro'] = candles
+        assert key(0) + '_micro' in cache
+        assert key(0) not in cache
+        # from the pending days
+        assert_frame_equal(cache[key(0) + '_micro'], candles)
+    cache = CandleCache(root)
+    assert key(0) + '_micro' in cache
+    result = cache[key(0) + '_micro']
+    assert_frame_equal(result, candles)
+    assert result['trades'].dtype == np.int32
+    assert result['vwap'].dtype == np.float32
+    with pytest.raises(KeyError):
+        cache[key(0, DAY + pd.Timedelta(days=1)) + '_micro']
+
+
+def test_partial_day(tmpdir):
+    candles = make_candles()
+    cache = CandleCache(str(tmpdir))
+    cache[key(0)] = candles.iloc[100:200]
+    result = cache[key(0)]
+    assert result.shape[0] == 24 * 60
+    assert_frame_equal(result.iloc[100:200], candles.iloc[100:200])
+    assert np.isnan(result['close'].values[:100]).all()
+    assert (result['volume'].values[200:] == 0).all()
+    # bars of another day or not on whole minutes
+    with pytest.raises(ValueError):
+        cache[key(1, DAY + pd.Timedelta(days=1))] = candles
+    with pytest.raises(ValueError):
+        cache[key(1)] = candles.set_index(
+            candles.index + pd.Timedelta(seconds=30))
+
+
+def fill(cache, sids):
+    """Write a day of each symbol id and flush it as a block of its own"""
+    for sid in sids:
+        cache[key(sid)] = make_candles(seed=sid)
+        cache.flush()
+
+
+def block_path(root, sid):
+    return os.path.join(root, str(sid), '2017-01.npy')
+
+
+def test_eviction_of_least_recently_used(tmpdir):
+    root = str(tmpdir)
+    cache = CandleCache(root)
+    fill(cache, [0])
+    block_size = cache.nbytes
+    cache = CandleCache(root, max_bytes=int(2.5 * block_size))
+    fill(cache, [1])
+    cache[key(0)]  # newer use than sid 1
+    fill(cache, [2])
+    assert cache.nbytes <= 2.5 * block_size
+    assert key(1) not in cache
+    assert not os.path.exists(block_path(root, 1))
+    assert key(0) in cache and key(2) in cache
+    assert_frame_equal(cache[key(0)], make_candles(seed=0))
+
+
+def test_pinned_blocks_survive_eviction(tmpdir):
+    root = str(tmpdir)
+    cache = CandleCache(root)
+    fill(cache, [0])
+    block_size = cache.nbytes
+    cache = CandleCache(root, max_bytes=int(2.5 * block_size))
+    fill(cache, [1])
+    # sid 0 is the least recently used block but was found and not read
+    assert key(0) in cache
+    fill(cache, [2])
+    assert os.path.exists(block_path(root, 0))
+    assert key(1) not in cache
+    assert_frame_equal(cache[key(0)], make_candles(seed=0))
+    # read, so it goes once it is the least recently used block
+    fill(cache, [3, 4])
+    assert not os.path.exists(block_path(root, 0))
+    assert cache.nbytes <= 2.5 * block_size
+
+
+def crash_on_index_write(monkeypatch):
+    def crash(self):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(CandleCache, '_write_index', crash)
+
+
+def test_crash_between_block_and_index_write(tmpdir, monkeypatch):
+    root = str(tmpdir)
+    cache = CandleCache(root)
+    fill(cache, [0, 1])
+    block_size = cache.nbytes // 2
+    with monkeypatch.context() as patch:
+        crash_on_index_write(patch)
+        # a new block and another day of a written block
+        cache[key(2)] = make_candles(seed=2)
+        with pytest.raises(KeyboardInterrupt):
+            cache.flush()
+        cache[key(0, DAY + pd.Timedelta(days=1))] = make_candles(
+            DAY + pd.Timedelta(days=1), seed=3)
+        with pytest.raises(KeyboardInterrupt):
+            cache.flush()
+    assert os.path.exists(block_path(root, 2))
+
+    cache = CandleCache(root)
+    assert key(2) not in cache
+    assert not os.path.exists(block_path(root, 2))
+    assert key(0, DAY + pd.Timedelta(days=1)) not in cache
+    assert_frame_equal(cache[key(0)], make_candles(seed=0))
+    assert_frame_equal(cache[key(1)], make_candles(seed=1))
+    assert cache.nbytes == 2 * block_size
+
+
+def test_crash_between_eviction_and_index_write(tmpdir, monkeypatch):
+    root = str(tmpdir)
+    cache = CandleCache(root)
+    fill(cache, [0, 1])
+    block_size = cache.nbytes // 2
+    cache = CandleCache(root, max_bytes=int(2.5 * block_size))
+    with monkeypatch.context() as patch:
+        crash_on_index_write(patch)
+        cache[key(2)] = make_candles(seed=2)
+        with pytest.raises(KeyboardInterrupt):
+            cache.flush()
+    assert not os.path.exists(block_path(root, 0))
+
+    cache = CandleCache(root)
+    assert key(0) not in cache
+    assert_frame_equal(cache[key(1)], make_candles(seed=1))
+    assert cache.nbytes == block_size
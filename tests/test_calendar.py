@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex.calendar import PoloniexCalendar
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+START = pd.Timestamp('2017-01-01', tz='UTC')
+END = pd.Timestamp('2017-01-31', tz='UTC')
+
+
+def test_minute_index_to_session_labels():
+    calendar = PoloniexCalendar(START, END)
+    index = pd.DatetimeIndex(['2017-01-02 00:00', '2017-01-02 23:59',
+                              '2017-01-05 12:30'], tz='UTC')
+    labels = calendar.minute_index_to_session_labels(index)
+    expected = pd.DatetimeIndex(['2017-01-02', '2017-01-02', '2017-01-05'],
+                                tz='UTC')
+    assert labels.equals(expected)
+
+
+def test_minute_index_to_session_labels_empty():
+    calendar = PoloniexCalendar(START, END)
+    index = pd.DatetimeIndex([], tz='UTC')
+    assert calendar.minute_index_to_session_labels(index).size == 0
+
+
+def test_cached_minutes_shared_by_end(tmpdir):
+    cache_dir = str(tmpdir)
+    short = PoloniexCalendar(START, END, cache_dir=cache_dir)
+    longer = PoloniexCalendar(START, END + pd.Timedelta(days=30),
+                              cache_dir=cache_dir)
+    assert short.all_minutes.size == 31 * 24 * 60
+    assert longer.all_minutes.size == 61 * 24 * 60
+    assert short.all_minutes[-1] == END + pd.Timedelta(hours=23, minutes=59)
+    assert len(os.listdir(cache_dir)) == 1
+    # calendars of other ranges keep the cached minutes of the others
+    later = PoloniexCalendar(START + pd.Timedelta(days=1), END,
+                             cache_dir=cache_dir)
+    assert later.all_minutes[0] == START + pd.Timedelta(days=1)
+    assert len(os.listdir(cache_dir)) == 2
+    much_longer = PoloniexCalendar(START, END + pd.Timedelta(days=400),
+                                   cache_dir=cache_dir)
+    assert much_longer.all_minutes.size == 431 * 24 * 60
+    assert len(os.listdir(cache_dir)) == 3
+    cached = PoloniexCalendar(START, END, cache_dir=cache_dir)
+    assert cached.all_minutes.equals(short.all_minutes)
+    uncached = PoloniexCalendar(START, END + pd.Timedelta(days=30))
+    np.testing.assert_array_equal(longer.all_minutes.values,
+                                  uncached.all_minutes.values)
+
+
+def test_calendar_factory_caches_only_if_configured(tmpdir, monkeypatch):
+    from zipline_poloniex.hooks import poloniex_calendar
+    monkeypatch.delenv('ZIPLINE_POLONIEX_CALENDAR_CACHE', raising=False)
+    assert poloniex_calendar(START, END).cache_dir is None
+    monkeypatch.setenv('ZIPLINE_POLONIEX_CALENDAR_CACHE', str(tmpdir))
+    calendar = poloniex_calendar(START, END)
+    assert calendar.all_minutes.size == 31 * 24 * 60
+    assert len(os.listdir(str(tmpdir))) == 1
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from zipline_poloniex.dump import load_dumps
+from zipline_poloniex.store import STORE_DTYPES, TradeStore
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+DAY = pd.Timestamp('2017-01-01', tz='UTC')
+
+
+def make_dump(start, n_trades=1000, pairs=('USDT_BTC', 'USDT_ETH'), seed=42):
+    """Trades of a dump every 20 seconds from `start`, pairs alternating"""
+    rng = np.random.RandomState(seed)
+    dates = pd.date_range(start, periods=n_trades, freq='20S')
+    rate = rng.lognormal(7, 0.01, n_trades).astype(np.float32)
+    amount = rng.exponential(0.5, n_trades).astype(np.float32)
+    return pd.DataFrame(
+        dict(globalTradeID=np.arange(n_trades), tradeID=np.arange(n_trades),
+             date=dates.strftime('%Y-%m-%d %H:%M:%S'),
+             type=rng.choice(['buy', 'sell'], n_trades),
+             rate=rate, amount=amount, total=rate * amount,
+             pair=np.resize(pairs, n_trades)),
+        columns=['globalTradeID', 'tradeID', 'date', 'type', 'rate', 'amount',
+                 'total', 'pair'])
+
+
+def expected_store(root, dump):
+    """Store written from the trades of a dump with `TradeStore.write`"""
+    store = TradeStore(root)
+    trades = dump.assign(date=pd.to_datetime(dump['date'], utc=True))
+    for col in ('rate', 'amount', 'total'):
+        trades[col] = trades[col].astype(np.float32)
+    for pair, pair_trades in trades.groupby('pair'):
+        for day, day_trades in pair_trades.groupby(
+                pair_trades['date'].dt.floor('D')):
+            store.write(pair, day, day_trades)
+    return store
+
+
+def assert_stores_equal(result, expected, pair, days):
+    for day in days:
+        assert (pair, day) in result
+        end = day + pd.Timedelta(days=1, seconds=-1)
+        columns = result.read_columns(pair, day, end)
+        expected_columns = expected.read_columns(pair, day, end)
+        for col, values in expected_columns.items():
+            assert columns[col].dtype == STORE_DTYPES[col]
+            np.testing.assert_array_equal(columns[col], values)
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.csv.gz'])
+def test_load_dumps_across_days(tmpdir, suffix):
+    # trades from 22:00 of the first day to 03:30 of the second one
+    dump = make_dump(DAY + pd.Timedelta(hours=22))
+    path = str(tmpdir.join('trades' + suffix))
+    dump.to_csv(path, index=False,
+                compression='gzip' if suffix.endswith('.gz') else None)
+    store = TradeStore(str(tmpdir.join('store')))
+    written = load_dumps([path], store, chunksize=150)
+    days = [DAY, DAY + pd.Timedelta(days=1)]
+    assert sorted(written) == sorted((pair, day) for pair in
+                                     ('USDT_BTC', 'USDT_ETH') for day in days)
+    assert store.staged() == []
+    expected = expected_store(str(tmpdir.join('expected')), dump)
+    for pair in ('USDT_BTC', 'USDT_ETH'):
+        assert_stores_equal(store, expected, pair, days)
+
+
+def test_load_dumps_of_a_pair(tmpdir):
+    dump = make_dump(DAY + pd.Timedelta(hours=22), pairs=('USDT_BTC',))
+    path = str(tmpdir.join('trades.csv.gz'))
+    dump.drop('pair', axis=1).to_csv(path, index=False, compression='gzip')
+    store = TradeStore(str(tmpdir.join('store')))
+    load_dumps([path], store, pair='USDT_BTC', chunksize=300)
+    expected = expected_store(str(tmpdir.join('expected')), dump)
+    assert_stores_equal(store, expected, 'USDT_BTC',
+                        [DAY, DAY + pd.Timedelta(days=1)])
+
+
+def test_load_dumps_fills_empty_days(tmpdir):
+    dump = pd.concat([make_dump(DAY, 10),
+                      make_dump(DAY + pd.Timedelta(days=3), 10)])
+    path = str(tmpdir.join('trades.csv'))
+    dump.to_csv(path, index=False)
+    store = TradeStore(str(tmpdir.join('store')))
+    load_dumps([path], store)
+    assert store.covers('USDT_BTC', DAY,
+                        DAY + pd.Timedelta(days=4, seconds=-1))
+    empty = store.read_columns('USDT_BTC', DAY + pd.Timedelta(days=1),
+                               DAY + pd.Timedelta(days=2))
+    assert empty['date'].size == 0
+
+
+def test_load_dumps_skips_days_not_over(tmpdir):
+    dump = make_dump(DAY + pd.Timedelta(hours=22))
+    path = str(tmpdir.join('trades.csv'))
+    dump.to_csv(path, index=False)
+    store = TradeStore(str(tmpdir.join('store')))
+    # the dump was taken during the second day
+    fetched = DAY + pd.Timedelta(days=1, hours=4)
+    written = load_dumps([path], store, fetched=fetched)
+    assert sorted(written) == [('USDT_BTC', DAY), ('USDT_ETH', DAY)]
+    assert ('USDT_BTC', DAY + pd.Timedelta(days=1)) not in store
+    assert store.staged() == []
+
+
+def test_load_dumps_unknown_type(tmpdir):
+    dump = make_dump(DAY, 10)
+    dump.loc[3, 'type'] = 'BUY'
+    path = str(tmpdir.join('trades.csv'))
+    dump.to_csv(path, index=False)
+    store = TradeStore(str(tmpdir.join('store')))
+    with pytest.raises(ValueError) as excinfo:
+        load_dumps([path], store)
+    assert 'BUY' in str(excinfo.value)
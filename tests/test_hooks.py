@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def run_python(code):
+    """JSON printed by code run in a fresh interpreter"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.abspath(ROOT)] + env.get('PYTHONPATH', '').split(os.pathsep))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                     universal_newlines=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def test_import_is_lazy():
+    modules = run_python(
+        "import sys, json; import zipline_poloniex; "
+        "print(json.dumps(sorted(sys.modules)))")
+    assert 'zipline_poloniex.hooks' in modules
+    for name in ('zipline_poloniex.bundle', 'zipline_poloniex.api',
+                 'zipline_poloniex.calendar', 'zipline', 'pandas', 'numpy',
+                 'requests', 'pkg_resources'):
+        assert name not in modules
+
+
+def test_registration_deferred_until_zipline_is_imported():
+    result = run_python(
+        "import sys, json; import zipline_poloniex; "
+        "from zipline.data.bundles import bundles; "
+        "from zipline.utils.calendars import get_calendar; "
+        "registered = '.test_poloniex' in bundles; "
+        "built = 'zipline_poloniex.calendar' in sys.modules; "
+        "nyse = type(get_calendar('NYSE')).__name__; "
+        "print(json.dumps([registered, built, nyse, "
+        "zipline_poloniex.create_bundle.__module__]))")
+    # the calendar is built on first use only
+    assert result == [True, False, 'PoloniexCalendar',
+                      'zipline_poloniex.bundle']
+
+
+def test_registration_after_zipline_is_imported():
+    result = run_python(
+        "import json; from zipline.data.bundles import bundles; "
+        "from zipline_poloniex import register; "
+        "print(json.dumps(['.test_poloniex' in bundles, "
+        "register.__module__]))")
+    assert result == [True, 'zipline.data.bundles.core']
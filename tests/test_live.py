@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from zipline_poloniex import api
+from zipline_poloniex.live import LiveBars
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def trades(ids, seconds, rates, amounts=None):
+    if amounts is None:
+        amounts = np.ones(len(ids))
+    return dict(globalTradeID=np.array(ids, dtype=np.int64),
+                date=np.array(seconds, dtype=np.int64),
+                rate=np.array(rates, dtype=np.float64),
+                amount=np.array(amounts, dtype=np.float64))
+
+
+def test_update_emits_closed_minutes():
+    clock = Clock(16 * 60)
+    feed = LiveBars(['USDT_BTC'], clock=clock)
+    emitted = feed.update('USDT_BTC', trades([1, 2, 3],
+                                             [16*60, 16*60 + 30, 17*60 + 1],
+                                             [1., 3., 2.]))
+    assert len(emitted) == 1
+    pair, minute, bar = emitted[0]
+    assert minute.value == 16 * 60 * 10**9
+    assert (bar['open'], bar['high'], bar['low'], bar['close']) == (1, 3, 1, 3)
+    assert bar['volume'] == 2
+    assert feed.current('USDT_BTC')['open'] == 2
+
+
+def test_update_with_only_late_trades():
+    clock = Clock(16 * 60)
+    feed = LiveBars(['USDT_BTC'], clock=clock)
+    feed.update('USDT_BTC', trades([1], [16*60 + 10], [1.]))
+    clock.now = 18 * 60
+    assert len(feed.close()) == 2
+    # trade of an already emitted minute with an unseen id
+    assert feed.update('USDT_BTC', trades([2], [17*60 + 5], [2.])) == []
+    assert feed.late_trades == 1
+    assert np.isnan(feed.current('USDT_BTC')['open'])
+
+
+def test_update_ignores_known_trades():
+    clock = Clock(16 * 60)
+    feed = LiveBars(['USDT_BTC'], clock=clock)
+    columns = trades([1, 2], [16*60 + 1, 16*60 + 2], [1., 2.])
+    feed.update('USDT_BTC', columns)
+    assert feed.update('USDT_BTC', columns) == []
+    assert feed.current('USDT_BTC')['volume'] == 2
+
+
+def test_iter_bars_pages_past_the_cap(stub_server, use_server):
+    use_server(stub_server)
+    start = 17167 * 24 * 60 * 60  # 2017-01-01
+    clock = Clock(start + 30)
+    feed = LiveBars(['USDT_ETH'], clock=clock)
+    emitted = list(feed.iter_bars(interval=0., max_polls=1))
+    # a pause of 30 days holds more trades than a single response
+    clock.now = start + 30 * 24 * 60 * 60 + 30
+    n_calls = stub_server.n_calls
+    emitted += list(feed.iter_bars(interval=0., max_polls=1))
+    assert stub_server.n_calls - n_calls > 1
+    assert len(emitted) == 30 * 24 * 60
+    ids, seconds, rates, amounts = stub_server.trades.window(
+        'USDT_ETH', start, int(clock.now))
+    assert ids.size > api.MAX_TRADES
+    volume = sum(bar['volume'] for _, _, bar in emitted)
+    np.testing.assert_allclose(volume + feed.current('USDT_ETH')['volume'],
+                               amounts.sum(), rtol=1e-9)
+    last = seconds < start + 30 * 24 * 60 * 60
+    np.testing.assert_allclose(emitted[-1][2]['close'], rates[last][0],
+                               rtol=1e-8)
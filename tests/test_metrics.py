@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+import pandas as pd
+import pytest
+
+from zipline.data.bundles import ingest, register
+
+from zipline_poloniex import api, metrics
+from zipline_poloniex.bundle import create_bundle
+from zipline_poloniex.metrics import Metrics, get_metrics
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+DAY = pd.Timestamp('2017-01-01', tz='utc')
+
+
+def parse_prometheus(text):
+    """Samples of the Prometheus text format by metric name and labels"""
+    samples = dict()
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        name, labels = name[:-1].split('{')
+        labels = tuple(sorted(tuple(label.split('=')) for label in
+                              labels.split(',') if label))
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def test_export_formats():
+    recorder = Metrics()
+    with recorder.labels('USDT_ETH', DAY):
+        recorder.add_time('http', 0.5)
+        recorder.add_time('http', 0.25)
+        recorder.incr('api_calls', 2)
+    recorder.incr('api_calls', pair='USDT_LTC')
+    summary = json.loads(recorder.to_json())
+    assert summary['stages']['http'] == dict(seconds=0.75, count=2)
+    assert summary['counters'] == dict(api_calls=3)
+    assert summary['pairs']['USDT_ETH']['2017-01-01'] == dict(http=0.75)
+    samples = parse_prometheus(recorder.to_prometheus())
+    eth = (('pair', '"USDT_ETH"'),)
+    assert samples[('zipline_poloniex_stage_seconds_total',
+                    eth + (('stage', '"http"'),))] == 0.75
+    assert samples[('zipline_poloniex_stage_calls_total',
+                    eth + (('stage', '"http"'),))] == 2
+    assert samples[('zipline_poloniex_api_calls_total', eth)] == 2
+    assert samples[('zipline_poloniex_api_calls_total',
+                    (('pair', '"USDT_LTC"'),))] == 1
+    recorder.reset()
+    assert recorder.summary()['counters'] == dict()
+
+
+def ingest_with_metrics(server, root, name, metrics_path):
+    """Ingest two days of a pair with window splits and an HTTP retry"""
+    register(name, create_bundle(['USDT_ETH'], metrics_path=metrics_path),
+             calendar_name='POLONIEX', minutes_per_day=24*60,
+             start_session=DAY, end_session=DAY + pd.Timedelta(days=2))
+    server.fail('USDT_ETH')
+    n_calls = server.n_calls
+    ingest(name, environ=dict(ZIPLINE_ROOT=root))
+    return server.n_calls - n_calls
+
+
+@pytest.fixture
+def recorder(stub_server, use_server, monkeypatch):
+    use_server(stub_server)
+    # a day of the stub server has more trades than a response may hold
+    monkeypatch.setattr(api, 'MAX_TRADES', 1000)
+    recorder = Metrics()
+    monkeypatch.setattr(metrics, '_metrics', recorder)
+    # recorded before the ingest and dropped by it
+    recorder.incr('api_calls', 100)
+    return recorder
+
+
+def test_ingest_writes_json(stub_server, recorder, tmpdir):
+    path = str(tmpdir.join('metrics.json'))
+    n_calls = ingest_with_metrics(stub_server, str(tmpdir), 'metrics_json',
+                                  path)
+    with open(path) as fh:
+        summary = json.load(fh)
+    assert get_metrics() is recorder
+    counters = summary['counters']
+    # including the call for the assets
+    assert counters['api_calls'] == n_calls
+    assert counters['http_retries'] == 1
+    assert counters['window_splits'] > 0
+    for stage in ('http', 'aggregate', 'bar_write'):
+        assert summary['stages'][stage]['count'] > 0
+    assert sorted(summary['pairs']['USDT_ETH']) == ['2017-01-01',
+                                                    '2017-01-02']
+
+
+def test_ingest_writes_prometheus(stub_server, recorder, tmpdir):
+    path = str(tmpdir.join('metrics.prom'))
+    n_calls = ingest_with_metrics(stub_server, str(tmpdir), 'metrics_prom',
+                                  path)
+    with open(path) as fh:
+        samples = parse_prometheus(fh.read())
+    eth = (('pair', '"USDT_ETH"'),)
+    api_calls = sum(value for (name, _), value in samples.items()
+                    if name == 'zipline_poloniex_api_calls_total')
+    assert api_calls == n_calls
+    assert samples[('zipline_poloniex_http_retries_total', eth)] == 1
+    assert samples[('zipline_poloniex_window_splits_total', eth)] > 0
+    assert samples[('zipline_poloniex_stage_calls_total',
+                    eth + (('stage', '"http"'),))] > 0
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from zipline_poloniex.store import TradeStore
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def make_columns(start, end, n_trades=100):
+    seconds = np.linspace(start.value // 10**9, end.value // 10**9,
+                          n_trades).astype(np.int64)
+    return dict(globalTradeID=np.arange(n_trades, dtype=np.int64),
+                tradeID=np.arange(n_trades, dtype=np.int64),
+                date=seconds,
+                type=np.zeros(n_trades, dtype=np.int8),
+                rate=np.ones(n_trades, dtype=np.float32),
+                amount=np.ones(n_trades, dtype=np.float32),
+                total=np.ones(n_trades, dtype=np.float32))
+
+
+def test_write_columns_range_complete_days(tmpdir):
+    store = TradeStore(str(tmpdir))
+    start = pd.Timestamp('2017-01-01 12:00', tz='UTC')
+    end = pd.Timestamp('2017-01-04 11:59:59', tz='UTC')
+    store.write_columns_range('USDT_BTC', start, end, make_columns(start, end))
+    assert ('USDT_BTC', pd.Timestamp('2017-01-01', tz='UTC')) not in store
+    assert ('USDT_BTC', pd.Timestamp('2017-01-02', tz='UTC')) in store
+    assert ('USDT_BTC', pd.Timestamp('2017-01-03', tz='UTC')) in store
+    assert ('USDT_BTC', pd.Timestamp('2017-01-04', tz='UTC')) not in store
+
+
+def test_write_columns_range_skips_days_not_over(tmpdir):
+    store = TradeStore(str(tmpdir))
+    start = pd.Timestamp('2017-01-01', tz='UTC')
+    end = pd.Timestamp('2017-01-03 23:59:59', tz='UTC')
+    fetched = pd.Timestamp('2017-01-03 15:00', tz='UTC')
+    store.write_columns_range('USDT_BTC', start, fetched,
+                              make_columns(start, fetched), fetched)
+    store.write_columns_range('USDT_ETH', start, end,
+                              make_columns(start, fetched), fetched)
+    for pair in ('USDT_BTC', 'USDT_ETH'):
+        assert (pair, pd.Timestamp('2017-01-02', tz='UTC')) in store
+        assert (pair, pd.Timestamp('2017-01-03', tz='UTC')) not in store
+
+
+def test_write_range_skips_today(tmpdir):
+    store = TradeStore(str(tmpdir))
+    today = pd.Timestamp.utcnow().normalize()
+    start = today - pd.Timedelta(days=1)
+    end = today + pd.Timedelta(days=1, seconds=-1)
+    store.write_columns_range('USDT_BTC', start, end,
+                              make_columns(start, pd.Timestamp.utcnow()))
+    assert ('USDT_BTC', start) in store
+    assert ('USDT_BTC', today) not in store
+
+
+def test_append_concurrently(tmpdir):
+    store = TradeStore(str(tmpdir))
+    day = pd.Timestamp('2017-01-01', tz='UTC')
+    columns = make_columns(day, day + pd.Timedelta(days=1, seconds=-1), 4000)
+    chunks = [{col: values[i::40] for col, values in columns.items()}
+              for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda chunk: store.append('USDT_BTC', day, chunk),
+                          chunks))
+    assert store.commit() == [('USDT_BTC', day)]
+    result = store.read_columns('USDT_BTC', day,
+                                day + pd.Timedelta(days=1, seconds=-1))
+    np.testing.assert_array_equal(np.sort(result['globalTradeID']),
+                                  columns['globalTradeID'])
+
+
+def test_commit_drops_days_without_chunks(tmpdir, monkeypatch):
+    store = TradeStore(str(tmpdir))
+    days = pd.date_range('2017-01-01', periods=3, freq='D', tz='UTC')
+    for day in days:
+        store.append('USDT_BTC', day,
+                     make_columns(day, day + pd.Timedelta(hours=1)))
+    # only the hidden file of a crashed append is left of the second day
+    path = str(tmpdir.join('.staging', 'USDT_BTC', '2017-01-02'))
+    for name in os.listdir(path):
+        os.rename(os.path.join(path, name), os.path.join(path, '.' + name))
+    staged = store.staged
+
+    def staged_and_committed_concurrently():
+        days_staged = staged()
+        shutil.rmtree(str(tmpdir.join('.staging', 'USDT_BTC', '2017-01-03')))
+        return days_staged
+    monkeypatch.setattr(store, 'staged', staged_and_committed_concurrently)
+    assert store.commit() == [('USDT_BTC', days[0])]
+    assert ('USDT_BTC', days[1]) not in store
+    assert not os.path.exists(path)
+
+
+def test_lock_removes_lock_files(tmpdir):
+    store = TradeStore(str(tmpdir))
+    start = pd.Timestamp('2017-01-01', tz='UTC')
+    end = pd.Timestamp('2017-01-03 23:59:59', tz='UTC')
+    path = str(tmpdir.join('.locks', 'USDT_BTC'))
+    with store.lock('USDT_BTC', start, end):
+        assert len(os.listdir(path)) == 3
+    assert os.listdir(path) == []
+
+
+def increment_locked(args):
+    root, n_times = args
+    store = TradeStore(root)
+    day = pd.Timestamp('2017-01-01', tz='UTC')
+    path = os.path.join(root, 'counter')
+    for _ in range(n_times):
+        with store.lock('USDT_BTC', day, day):
+            with open(path) as fh:
+                count = int(fh.read())
+            time.sleep(0.001)
+            with open(path, 'w') as fh:
+                fh.write(str(count + 1))
+
+
+def test_lock_excludes_processes(tmpdir):
+    root = str(tmpdir)
+    with open(os.path.join(root, 'counter'), 'w') as fh:
+        fh.write('0')
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        list(executor.map(increment_locked, [(root, 50)] * 3))
+    with open(os.path.join(root, 'counter')) as fh:
+        assert int(fh.read()) == 150
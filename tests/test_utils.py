@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from zipline_poloniex.utils import FileTokenBucket, TokenBucket, throttle
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+
+def acquire_times(bucket, n_calls):
+    times = []
+    for _ in range(n_calls):
+        bucket.acquire()
+        times.append(time.time())
+    return times
+
+
+def test_token_bucket_blocking():
+    bucket = TokenBucket(50)
+    times = acquire_times(bucket, 6)
+    # the first token is available, the others are spaced by 1 / rate
+    assert times[-1] - times[0] >= 5 / 50. - 0.005
+    assert np.diff(times).min() >= 1 / 50. - 0.005
+
+
+def test_token_bucket_non_blocking():
+    bucket = TokenBucket(10)
+    assert bucket.acquire(blocking=False)
+    assert not bucket.acquire(blocking=False)
+    started = time.time()
+    assert not bucket.acquire(timeout=0.01)
+    assert time.time() - started < 0.05
+    # failed attempts take no tokens
+    assert bucket.acquire(timeout=0.2)
+    assert time.time() - started < 0.2
+
+
+def test_token_bucket_capacity():
+    bucket = TokenBucket(10, capacity=3)
+    time.sleep(0.3)
+    assert all(bucket.acquire(blocking=False) for _ in range(3))
+    assert not bucket.acquire(blocking=False)
+
+
+def test_throttle_spaces_calls():
+    calls = []
+
+    @throttle(20)
+    def call():
+        calls.append(time.time())
+
+    for _ in range(25):
+        call()
+    calls = np.array(calls)
+    # no interval of one second holds more than 20 calls, allowing for
+    # the jitter of sleep
+    in_second = np.searchsorted(calls, calls + 0.99) - np.arange(calls.size)
+    assert in_second.max() <= 20
+    assert calls[-1] - calls[0] >= 24 / 20. - 0.01
+
+
+def test_file_token_bucket_non_blocking(tmpdir):
+    path = str(tmpdir.join('bucket'))
+    bucket = FileTokenBucket(path, 10)
+    assert bucket.acquire(blocking=False)
+    # a new bucket on the same file sees the tokens taken
+    other = FileTokenBucket(path, 10)
+    assert not other.acquire(blocking=False)
+    assert not other.acquire(timeout=0.01)
+    assert other.acquire(timeout=0.2)
+
+
+def file_bucket_times(args):
+    path, n_calls = args
+    return acquire_times(FileTokenBucket(path, 20), n_calls)
+
+
+def test_file_token_bucket_shared_by_processes(tmpdir):
+    path = str(tmpdir.join('bucket'))
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(file_bucket_times,
+                                    [(path, 5), (path, 5)]))
+    times = np.sort(np.concatenate(results))
+    # both processes take turns in the budget of a single bucket
+    assert times[-1] - times[0] >= 9 / 20. - 0.01
+    assert np.diff(times).min() >= 1 / 20. - 0.01
@@ -1,12 +1,47 @@
 # -*- coding: utf-8 -*-
-import pkg_resources
+import sys
 
-try:
-    __version__ = pkg_resources.get_distribution(__name__).version
-except:
-    __version__ = 'unknown'
+# import only the registration hooks for ~/.zipline/extension.py
+from .hooks import lazy_bundle, register_hooks  # noqa, lazy_bundle for users
 
-# import only most import functionality for ~/.zipline/extension.py
-from zipline.data.bundles import register
+register_hooks()
 
-from .bundle import Pairs, create_bundle
+# heavy modules are imported on first access of these names
+_LAZY = dict(Pairs='.bundle', create_bundle='.bundle',
+             register='zipline.data.bundles')
+
+
+def _version():
+    import pkg_resources
+    try:
+        return pkg_resources.get_distribution(__name__).version
+    except Exception:
+        return 'unknown'
+
+
+def __getattr__(name):
+    if name == '__version__':
+        globals()[name] = _version()
+        return globals()[name]
+    if name in _LAZY:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__, name))
+
+
+if sys.version_info < (3, 7):  # no module level __getattr__
+    from types import ModuleType
+
+    class _LazyModule(ModuleType):
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+    try:
+        sys.modules[__name__].__class__ = _LazyModule
+    except TypeError:  # Python < 3.5
+        __version__ = _version()
+        from zipline.data.bundles import register  # noqa
+        from .bundle import Pairs, create_bundle  # noqa
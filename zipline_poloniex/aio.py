@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous API of Poloniex based on asyncio
+
+Requires Python 3.5+ and aiohttp which is installed with the `async` extra.
+"""
+import json
+import asyncio
+import logging
+
+import aiohttp
+import pandas as pd
+
+from .api import (API_URL, CHART_PERIODS, check_payload, currencies_to_frame,
+                  trade_hist_to_frame)
+from .metrics import get_metrics
+from .utils import unix_time, TokenBucket
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+
+async def acquire_async(bucket, tokens=1):
+    """Acquire tokens of a rate limiter without blocking the event loop
+
+    Args:
+        bucket (:class:`~.utils.TokenBucket`): rate limiter
+        tokens (float): number of tokens
+    """
+    delta = bucket.reserve(tokens)
+    if delta > 0:
+        _logger.debug("Stalling call for {}s".format(delta))
+        get_metrics().add_time('throttle', delta)
+        await asyncio.sleep(delta)
+
+
+class AsyncClient(object):
+    """Asynchronous client of the public Poloniex API
+
+    Many requests can be in flight at once over a pool of keep-alive
+    connections while a token bucket honors the rate limit. Use it as
+    asynchronous context manager::
+
+        async with AsyncClient() as client:
+            trades = await client.get_trade_hist(pair, start, end)
+
+    Args:
+        url (str): URL of the public API
+        pool_size (int): maximum number of concurrent connections
+        timeout (float): total timeout of a request in seconds
+        calls (int): number of calls per second
+        bucket (:class:`~.utils.TokenBucket`): rate limiter to use instead
+            of a new one, e.g. `api.query_api.bucket` to share the budget
+            with the synchronous API
+    """
+    def __init__(self, url=API_URL, pool_size=10, timeout=60, calls=6,
+                 bucket=None):
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        if bucket is None:
+            bucket = TokenBucket(calls)
+        self.bucket = bucket
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """Open the pooled session
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout,
+                headers={'Accept-Encoding': 'gzip, deflate'})
+
+    async def close(self):
+        """Close the pooled session
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def query(self, command, raw=False, **kwargs):
+        """Call to Poloniex API returning the raw payload
+
+        Args:
+            command (str): API command
+            raw (bool): return the undecoded body, e.g. for `parse_trades`
+            **kwargs: additional request parameters
+
+        Returns:
+            list or dict: decoded JSON payload or bytes of the body if `raw`
+        """
+        await self.open()
+        payload = dict(command=command)
+        payload.update(kwargs)
+        payload = {k: str(v) for k, v in payload.items()}
+        await acquire_async(self.bucket)
+        metrics = get_metrics()
+        metrics.incr('api_calls', pair=kwargs.get('currencyPair'))
+        with metrics.timer('http', kwargs.get('currencyPair')):
+            async with self._session.get(self.url, params=payload) as r:
+                r.raise_for_status()
+                if raw:
+                    return await r.read()
+                text = await r.text()
+        with metrics.timer('json_decode', kwargs.get('currencyPair')):
+            data = json.loads(text)
+        return check_payload(data)
+
+    async def get_currencies(self):
+        """Fetch all available currency pairs, i.e. asset pairs
+
+        Returns:
+            pandas.DataFrame: dataframe containing asset pairs
+        """
+        return currencies_to_frame(await self.query('returnCurrencies'))
+
+    async def get_trade_hist(self, pair, start, end):
+        """Fetch trade history of an asset pair in given period
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period
+
+        Returns:
+            pandas.DataFrame: dataframe containing period's trades
+        """
+        start, end = unix_time(start), unix_time(end)
+        trades = await self.query('returnTradeHistory',
+                                  raw=True,
+                                  currencyPair=pair,
+                                  start=start,
+                                  end=end)
+        return trade_hist_to_frame(trades)
+
+    async def get_chart_data(self, pair, start, end, period=1800):
+        """Fetch chart data for asset pair in given period
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period
+            period: period span in seconds
+
+        Returns:
+            pandas.DataFrame: dataframe containing candle stick data
+        """
+        assert period in CHART_PERIODS, "Invalid period"
+        start, end = unix_time(start), unix_time(end)
+        data = await self.query('returnChartData',
+                                currencyPair=pair,
+                                start=start,
+                                end=end,
+                                period=period)
+        return pd.DataFrame(data)
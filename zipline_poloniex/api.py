@@ -2,11 +2,16 @@
 """
 API of Poloniex
 """
+import json
 import logging
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 
+from .metrics import get_metrics
 from .utils import unix_time, throttle
 
 __author__ = "Florian Wilhelm"
@@ -16,6 +21,12 @@ __license__ = "mit"
 _logger = logging.getLogger(__name__)
 
 API_URL = "https://poloniex.com/public"
+TRADE_COLUMNS = ["globalTradeID", "tradeID", "date", "type",
+                 "rate", "amount", "total"]
+TRADE_TYPES = ["buy", "sell"]
+CHART_PERIODS = (300, 900, 1800, 7200, 14400, 86400)
+MAX_TRADES = 50000
+_QUOTE, _COLON, _OPEN, _CLOSE = (ord(char) for char in '":{}')
 
 
 class TradesExceeded(Exception):
@@ -26,7 +37,133 @@ class RequestError(Exception):
     pass
 
 
+def check_payload(data):
+    """Raise an error if the API responded with an error message
+
+    Args:
+        data (list or dict): decoded JSON payload
+
+    Returns:
+        list or dict: the unchanged payload
+    """
+    if isinstance(data, dict) and 'error' in data.keys():
+        raise RequestError(data['error'])
+    return data
+
+
+class Client(object):
+    """Client of the public Poloniex API keeping a pool of connections
+
+    Connections are kept alive and reused across requests which avoids a
+    new TCP and TLS handshake for every call. The number of requests sent
+    is counted in `n_calls`. Responses are requested gzip compressed,
+    which shrinks trade histories several times over the wire.
+
+    Args:
+        url (str): URL of the public API
+        pool_size (int): maximum number of connections kept alive
+        timeout (float or tuple): connect and read timeout in seconds
+    """
+    def __init__(self, url=API_URL, pool_size=10, timeout=(10, 60)):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.n_calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, command, raw=False, **kwargs):
+        """Call to Poloniex API returning the raw payload
+
+        Args:
+            command (str): API command
+            raw (bool): return the undecoded body, e.g. for `parse_trades`
+            **kwargs: additional request parameters
+
+        Returns:
+            list or dict: decoded JSON payload or bytes of the body if `raw`
+        """
+        payload = dict(command=command)
+        payload.update(kwargs)
+        with self._lock:
+            self.n_calls += 1
+        metrics = get_metrics()
+        metrics.incr('api_calls')
+        with metrics.timer('http'):
+            r = self.session.get(self.url, params=payload,
+                                 timeout=self.timeout)
+            r.raise_for_status()
+            r.content  # read the body here to time decoding separately
+        if raw:
+            return r.content
+        with metrics.timer('json_decode'):
+            data = r.json()
+        return check_payload(data)
+
+    def close(self):
+        """Close all pooled connections
+        """
+        self.session.close()
+
+
+_client = None
+
+
+def get_client():
+    """Get the client used by the functions of this module
+
+    Returns:
+        :class:`Client`: shared client, created on first use
+    """
+    global _client
+    if _client is None:
+        _client = Client()
+    return _client
+
+
+def set_client(client):
+    """Set the client used by the functions of this module
+
+    Use this to change pool size, timeouts or the URL, e.g. of a stub
+    server for testing.
+
+    Args:
+        client (:class:`Client`): new shared client
+    """
+    global _client
+    _client = client
+
+
+def set_rate_limiter(bucket):
+    """Set the rate limiter of all calls to the API
+
+    Pass a :class:`~.utils.FileTokenBucket` to share the request budget
+    between several processes ingesting at the same time.
+
+    Args:
+        bucket (:class:`~.utils.TokenBucket`): new rate limiter
+    """
+    query_api.bucket = bucket
+
+
 @throttle(6)
+def query_api(command, raw=False, **kwargs):
+    """Call to Poloniex API returning the raw payload
+
+    Args:
+        command (str): API command
+        raw (bool): return the undecoded body, e.g. for `parse_trades`
+        **kwargs: additional request parameters
+
+    Returns:
+        list or dict: decoded JSON payload or bytes of the body if `raw`
+    """
+    return get_client().query(command, raw=raw, **kwargs)
+
+
 def call_api(command, **kwargs):
     """Call to Poloniex API
 
@@ -37,14 +174,210 @@ def call_api(command, **kwargs):
     Returns:
         pandas.DataFrame: dataframe containing the results
     """
-    payload = dict(command=command)
-    payload.update(kwargs)
-    r = requests.get(API_URL, params=payload)
-    r.raise_for_status()
-    data = r.json()
-    if isinstance(data, dict) and 'error' in data.keys():
-        raise RequestError(data['error'])
-    return pd.DataFrame(data)
+    return pd.DataFrame(query_api(command, **kwargs))
+
+
+def decode_trades(data, dtype=np.float32):
+    """Decode a returnTradeHistory payload into typed columns
+
+    Each field is converted with one vectorized NumPy call instead of
+    building a generic dataframe and casting it column by column.
+
+    Args:
+        data (list): trades as returned by the API
+        dtype: floating point type of `rate`, `amount` and `total`
+
+    Returns:
+        dict: column name to numpy.ndarray with `date` as int64 seconds
+        since epoch and `type` as pandas.Categorical
+    """
+    def column(key, col_dtype):
+        return np.array([trade[key] for trade in data], dtype=col_dtype)
+
+    metrics = get_metrics()
+    with metrics.timer('date_parse'):
+        date = column('date', 'datetime64[s]').astype(np.int64)
+    with metrics.timer('column_decode'):
+        types = np.array([trade['type'] for trade in data], dtype=object)
+        return dict(
+            globalTradeID=column('globalTradeID', np.int64),
+            tradeID=column('tradeID', np.int64),
+            date=date,
+            type=pd.Categorical.from_codes(
+                (types == TRADE_TYPES[1]).astype(np.int8), TRADE_TYPES),
+            rate=column('rate', dtype),
+            amount=column('amount', dtype),
+            total=column('total', dtype))
+
+
+def _gather(buf, starts, ends):
+    """Copy byte ranges of a buffer into a fixed-width bytes array
+
+    Args:
+        buf (numpy.ndarray): uint8 buffer
+        starts (numpy.ndarray): first byte of each range
+        ends (numpy.ndarray): byte after each range
+
+    Returns:
+        numpy.ndarray: ranges as bytes padded with zeros
+    """
+    lengths = ends - starts
+    width = max(int(lengths.max()), 1)
+    chars = np.empty((starts.size, width), dtype=np.uint8)
+    # one byte of all ranges at a time keeps temporaries small
+    for offset in range(width):
+        column = buf[np.minimum(starts + offset, buf.size - 1)]
+        column[lengths <= offset] = 0
+        chars[:, offset] = column
+    return chars.view('S{}'.format(width)).ravel()
+
+
+def _scan_records(body):
+    """Locate the values of a compact JSON array of flat records
+
+    All structural characters are found with vectorized comparisons over
+    the body and every record is checked to have the same keys in the same
+    order with the same kind of values, like the records of Poloniex.
+
+    Args:
+        body (bytes): JSON body
+
+    Returns:
+        tuple: buffer of the body and dictionary of key to first and after
+        last byte of its values or None if the body has another layout
+    """
+    if b'\\' in body or not body.lstrip().startswith(b'[{'):
+        return None
+    buf = np.frombuffer(body, dtype=np.uint8)
+    opens = np.flatnonzero(buf == _OPEN)
+    closes = np.flatnonzero(buf == _CLOSE)
+    quotes = np.flatnonzero(buf == _QUOTE)
+    n_records = opens.size
+    if (closes.size != n_records or not quotes.size or
+            quotes.size % n_records):
+        return None
+    quotes = quotes.reshape(n_records, -1)
+    if (quotes.shape[1] % 2 or (quotes[:, 0] < opens).any() or
+            (quotes[:, -1] > closes).any() or (opens[1:] < closes[:-1]).any()):
+        return None
+    # character after each string tells keys from values
+    after = buf[quotes[:, 1::2] + 1]
+    if (after != after[0]).any():
+        return None
+    n_strings = after.shape[1]
+    spans = dict()
+    string = 0
+    while string < n_strings:
+        key_start, key_end = quotes[:, 2*string] + 1, quotes[:, 2*string + 1]
+        if after[0, string] != _COLON:
+            return None
+        key = body[key_start[0]:key_end[0]]
+        if (key_end - key_start != len(key)).any():
+            return None
+        for offset, char in enumerate(bytearray(key)):
+            if (buf[key_start + offset] != char).any():
+                return None
+        quoted = buf[key_end + 2] == _QUOTE
+        if (quoted != quoted[0]).any():
+            return None
+        if quoted[0]:
+            if string + 1 == n_strings:
+                return None
+            start, end = quotes[:, 2*string + 2] + 1, quotes[:, 2*string + 3]
+            string += 2
+        else:
+            start = key_end + 2
+            if string + 1 < n_strings:
+                end = quotes[:, 2*string + 2] - 1
+            else:
+                end = closes
+            string += 1
+        spans[key.decode('ascii')] = (start, end)
+    return buf, spans
+
+
+def parse_trades(body, dtype=np.float32, max_trades=None):
+    """Decode the body of a returnTradeHistory response into typed columns
+
+    The compact JSON of the API is scanned with NumPy and the values of
+    each field are converted straight from the body without building a
+    Python object per trade. Other bodies, e.g. error messages, are decoded
+    with `json` and `decode_trades`.
+
+    Args:
+        body (bytes): body of the response
+        dtype: floating point type of `rate`, `amount` and `total`
+        max_trades (int): raise `TradesExceeded` for this many trades or
+            more, before any column is decoded
+
+    Returns:
+        dict: columns like `decode_trades`
+    """
+    metrics = get_metrics()
+    with metrics.timer('json_decode'):
+        scanned = _scan_records(body)
+    if scanned is not None and all(col in scanned[1] for col in TRADE_COLUMNS):
+        buf, spans = scanned
+        _check_trades(spans['date'][0].size, max_trades)
+
+        def column(key):
+            return _gather(buf, *spans[key])
+
+        sell = TRADE_TYPES[1].encode('ascii')
+        try:
+            with metrics.timer('date_parse'):
+                date = column('date').astype('datetime64[s]').astype(np.int64)
+            with metrics.timer('column_decode'):
+                return dict(
+                    globalTradeID=column('globalTradeID').astype(np.int64),
+                    tradeID=column('tradeID').astype(np.int64),
+                    date=date,
+                    type=pd.Categorical.from_codes(
+                        (column('type') == sell).astype(np.int8),
+                        TRADE_TYPES),
+                    rate=column('rate').astype(np.float64).astype(dtype),
+                    amount=column('amount').astype(np.float64).astype(dtype),
+                    total=column('total').astype(np.float64).astype(dtype))
+        except ValueError:
+            _logger.debug("Falling back to JSON decoding of trades")
+    with metrics.timer('json_decode'):
+        data = check_payload(json.loads(body.decode('utf-8')))
+    _check_trades(len(data), max_trades)
+    return decode_trades(data, dtype)
+
+
+def _check_trades(n_trades, max_trades):
+    if max_trades is not None and n_trades >= max_trades:
+        raise TradesExceeded("Number of trades exceeded")
+
+
+def trades_to_frame(columns):
+    """Build a trades dataframe from decoded columns
+
+    Args:
+        columns (dict): decoded columns as returned by `decode_trades`,
+            possibly only a subset of them
+
+    Returns:
+        pandas.DataFrame: trades with `date` as UTC timestamps
+    """
+    frame = pd.DataFrame(
+        columns, columns=[col for col in TRADE_COLUMNS if col in columns])
+    if 'date' in columns:
+        frame['date'] = pd.to_datetime(columns['date'], unit='s', utc=True)
+    return frame
+
+
+def currencies_to_frame(data):
+    """Build a dataframe of currencies from a returnCurrencies payload
+
+    Args:
+        data (dict): currencies as returned by the API
+
+    Returns:
+        pandas.DataFrame: dataframe containing asset pairs
+    """
+    return pd.DataFrame(data).transpose()
 
 
 def get_currencies():
@@ -53,7 +386,76 @@ def get_currencies():
     Returns:
         pandas.DataFrame: dataframe containing asset pairs
     """
-    return call_api('returnCurrencies').transpose()
+    return currencies_to_frame(query_api('returnCurrencies'))
+
+
+def trade_hist_to_columns(data):
+    """Decode a returnTradeHistory payload checking the number of trades
+
+    Args:
+        data (bytes or list): body of the response or trades as returned
+            by the API
+
+    Returns:
+        dict: decoded columns as returned by `decode_trades`
+    """
+    if isinstance(data, bytes):
+        return parse_trades(data, max_trades=MAX_TRADES)
+    _check_trades(len(data), MAX_TRADES)
+    return decode_trades(data)
+
+
+def trade_hist_to_frame(data):
+    """Build a dataframe of trades from a returnTradeHistory payload
+
+    Args:
+        data (list): trades as returned by the API
+
+    Returns:
+        pandas.DataFrame: dataframe containing period's trades
+    """
+    return trades_to_frame(trade_hist_to_columns(data))
+
+
+def concat_trades(chunks):
+    """Concatenate decoded columns of several chunks of trades
+
+    Args:
+        chunks (list): decoded columns as returned by `decode_trades`
+
+    Returns:
+        dict: concatenated columns
+    """
+    columns = dict()
+    for col in chunks[0]:
+        values = [chunk[col] for chunk in chunks]
+        if isinstance(values[0], pd.Categorical):
+            columns[col] = pd.Categorical.from_codes(
+                np.concatenate([v.codes for v in values]),
+                values[0].categories)
+        else:
+            columns[col] = np.concatenate(values)
+    return columns
+
+
+def get_trade_columns(pair, start, end):
+    """Fetch trade history of an asset pair in given period as columns
+
+    Args:
+        pair (str): asset pair name
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+
+    Returns:
+        dict: decoded columns as returned by `decode_trades`
+    """
+    start, end = unix_time(start), unix_time(end)
+    trades = query_api('returnTradeHistory',
+                       raw=True,
+                       currencyPair=pair,
+                       start=start,
+                       end=end)
+    return trade_hist_to_columns(trades)
 
 
 def get_trade_hist(pair, start, end):
@@ -67,22 +469,115 @@ def get_trade_hist(pair, start, end):
     Returns:
         pandas.DataFrame: dataframe containing period's trades
     """
-    start, end = unix_time(start), unix_time(end)
-    trades = call_api('returnTradeHistory',
-                      currencyPair=pair,
-                      start=start,
-                      end=end)
-    if trades.empty:  # make sure we add the expected columns
-        trades = pd.DataFrame(
-            columns=["globalTradeID", "tradeID", "date", "type",
-                     "rate", "amount", "total"])
-    if trades.shape[0] >= 50000:
-        raise TradesExceeded("Number of trades exceeded")
-    return trades
+    return trades_to_frame(get_trade_columns(pair, start, end))
+
 
+class WindowPlanner(object):
+    """Plans the query windows of trade histories from observed density
 
-def get_trade_hist_alias(asset_pair, start, end):
-    """Helper function to run api.get_trade_hist
+    The density of trades, i.e. trades per second, is estimated per asset
+    pair from previous responses. Windows are then sized to hold about
+    `fill` times the maximum number of trades per request, so that busy
+    periods are split before a request is sent and quiet periods are
+    merged into a single request.
+
+    Args:
+        fill (float): targeted fraction of the maximum number of trades
+        min_window (pandas.Timedelta): lower bound of a window
+        max_window (pandas.Timedelta): upper bound of a window
+        default_window (pandas.Timedelta): window for unknown asset pairs
+    """
+    def __init__(self, fill=0.5,
+                 min_window=pd.Timedelta(minutes=1),
+                 max_window=pd.Timedelta(days=30),
+                 default_window=pd.Timedelta(days=1)):
+        self.fill = fill
+        self.min_window = min_window
+        self.max_window = max_window
+        self.default_window = default_window
+        self._density = dict()
+
+    def observe(self, pair, n_trades, period):
+        """Update the density estimate of an asset pair
+
+        Args:
+            pair (str): asset pair name
+            n_trades (int): number of trades in period
+            period (pandas.Timedelta): length of the period
+        """
+        density = n_trades / max(period.total_seconds(), 1.)
+        last_density = self._density.get(pair)
+        if last_density is not None:
+            # smooth estimate but react fast to busy periods
+            density = max(density, (density + last_density) / 2)
+        self._density[pair] = density
+
+    def density(self, pair):
+        """Current density estimate of an asset pair
+
+        Args:
+            pair (str): asset pair name
+
+        Returns:
+            float: trades per second or None if nothing was observed yet
+        """
+        return self._density.get(pair)
+
+    def set_density(self, pair, density):
+        """Replace the density estimate of an asset pair
+
+        Use this to pass on the estimate of another planner, e.g. of a
+        worker process.
+
+        Args:
+            pair (str): asset pair name
+            density (float): trades per second
+        """
+        self._density[pair] = density
+
+    def window(self, pair):
+        """Length of the next window for an asset pair
+
+        Args:
+            pair (str): asset pair name
+
+        Returns:
+            pandas.Timedelta: length of window
+        """
+        density = self._density.get(pair)
+        if density is None:
+            return self.default_window
+        if density == 0:
+            return self.max_window
+        window = pd.Timedelta(seconds=int(self.fill * MAX_TRADES / density))
+        return min(max(window, self.min_window), self.max_window)
+
+    def split(self, pair, start, end):
+        """Split a period into windows of the planned length
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+
+        Returns:
+            list: tuples of start and end of each window
+        """
+        second = pd.Timedelta(seconds=1)
+        n_windows = int(np.ceil((end - start + second) / self.window(pair)))
+        if n_windows <= 1:
+            return [(start, end)]
+        length = (end - start + second) / n_windows
+        starts = [start + (i * length).floor('s') for i in range(n_windows)]
+        ends = [s - second for s in starts[1:]] + [end]
+        return list(zip(starts, ends))
+
+
+def iter_trade_hist(asset_pair, start, end, planner=None):
+    """Fetch trade history of an asset pair chunk by chunk
+
+    If a planner is given, the timerange is split up front into windows
+    that are expected to stay below the maximum number of trades.
 
     If a TradesExceeded exception is raised, it splits the timerange of
     (start) to (end) in half and calls itself with the new timeranges.
@@ -98,25 +593,62 @@ def get_trade_hist_alias(asset_pair, start, end):
     however, the HTTPError should not occur more than once (per API call),
     and the TradesExceeded error is limited to the amount of trades per day.
 
+    Chunks are yielded in chronological order of their windows as soon as
+    they are fetched, so that callers never need to hold more than one.
+
     Args:
         asset_pair: name of the asset pair
         start (pandas.Timestamp): start of period
         end (pandas.Timestamp): end of period
+        planner (:class:`WindowPlanner`): planner of query windows
 
     Returns:
-        pandas.DataFrame: dataframe containing trades of asset
+        generator of decoded columns as returned by `decode_trades`
     """
     original_timedelta = end - start
-    try:
-        df = get_trade_hist(asset_pair, start, end)
-    except requests.exceptions.HTTPError:
-        df = get_trade_hist_alias(asset_pair, start, end)
-    except TradesExceeded:
-        new_timedelta = original_timedelta / 2
-        df = pd.concat([
-            get_trade_hist_alias(asset_pair, start,start + new_timedelta - pd.offsets.Second()),
-            get_trade_hist_alias(asset_pair, start + new_timedelta, end)])
-    return df
+    windows = [(start, end)]
+    if planner is not None:
+        windows = planner.split(asset_pair, start, end)
+    if len(windows) == 1:
+        try:
+            columns = get_trade_columns(asset_pair, start, end)
+        except requests.exceptions.HTTPError:
+            get_metrics().incr('http_retries', pair=asset_pair)
+        except TradesExceeded:
+            get_metrics().incr('window_splits', pair=asset_pair)
+            if planner is not None:
+                planner.observe(asset_pair, MAX_TRADES, original_timedelta)
+            # halve on whole seconds, so that no second falls between
+            second = pd.Timedelta(seconds=1)
+            middle = start + ((original_timedelta + second) / 2).floor('s')
+            windows = [(start, middle - second), (middle, end)]
+        else:
+            if planner is not None:
+                planner.observe(asset_pair, columns['date'].shape[0],
+                                original_timedelta)
+            yield columns
+            return
+    for w_start, w_end in windows:
+        for columns in iter_trade_hist(asset_pair, w_start, w_end, planner):
+            yield columns
+
+
+def get_trade_hist_alias(asset_pair, start, end, planner=None):
+    """Helper function to fetch the trade history of a period at once
+
+    See `iter_trade_hist` for how the period is split.
+
+    Args:
+        asset_pair: name of the asset pair
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        planner (:class:`WindowPlanner`): planner of query windows
+
+    Returns:
+        pandas.DataFrame: dataframe containing trades of asset
+    """
+    chunks = list(iter_trade_hist(asset_pair, start, end, planner))
+    return trades_to_frame(concat_trades(chunks))
 
 
 def get_chart_data(pair, start, end, period=1800):
@@ -131,8 +663,7 @@ def get_chart_data(pair, start, end, period=1800):
     Returns:
         pandas.DataFrame: dataframe containing candle stick data
     """
-    valid_periods = (300, 900, 1800, 7200, 14400, 86400)
-    assert period in valid_periods, "Invalid period"
+    assert period in CHART_PERIODS, "Invalid period"
     start, end = unix_time(start), unix_time(end)
     return call_api('returnChartData',
                     currencyPair=pair,
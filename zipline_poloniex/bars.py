@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+Pyramid of bars in several resolutions stored alongside a bundle
+
+The minute bars of each day are aggregated to coarser resolutions like 5
+minutes, 1 hour and 1 day while they are written to the bundle, so
+strategies working on coarse bars need not resample minute bars in every
+backtest. Besides OHLCV, bars may have microstructure fields like VWAP and
+buy and sell volume, which zipline's bar readers do not know. Each field
+of each resolution and symbol id is kept as a plain binary array covering
+all days from the first day of the symbol id, which is memory-mapped by
+:class:`BarPyramidReader`::
+
+    reader = BarPyramidReader.from_bundle('poloniex')
+    hourly = reader.get_bars(sid, start, end, freq='1H')
+    vwap = reader.window('vwap', sid, end, bar_count=30)
+"""
+import os
+import json
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from .metrics import get_metrics
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+_NANOS_PER_MINUTE = 60 * 10**9
+_NANOS_PER_DAY = 24 * 60 * _NANOS_PER_MINUTE
+MINUTES_PER_DAY = 24 * 60
+
+RESOLUTIONS = ('1T', '5T', '1H', '1D')
+PYRAMID_DIR = 'bar_pyramid'
+METADATA_FILE = 'metadata.json'
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+# volume weighted average price, number of trades and volume of buy and
+# sell trades, i.e. trades initiated by the buyer and seller, respectively
+MICROSTRUCTURE_FIELDS = ('vwap', 'trades', 'buy_volume', 'sell_volume')
+# how bars of a finer resolution are combined to a bar of a coarser one
+AGGREGATIONS = dict(open='first', high='max', low='min', close='last',
+                    volume='sum', vwap='vwap', trades='sum',
+                    buy_volume='sum', sell_volume='sum')
+FIELD_DTYPES = dict(open=np.float32, high=np.float32, low=np.float32,
+                    close=np.float32, volume=np.float32, vwap=np.float32,
+                    trades=np.int32, buy_volume=np.float32,
+                    sell_volume=np.float32)
+
+
+def bars_per_day(freq):
+    """Number of bars of a resolution per day
+
+    Args:
+        freq (str): resolution, a whole number of minutes dividing a day
+
+    Returns:
+        int: number of bars
+    """
+    step = to_offset(freq).nanos
+    if step % _NANOS_PER_MINUTE or _NANOS_PER_DAY % step:
+        raise ValueError("Resolution {} does not divide a day into whole "
+                         "minutes".format(freq))
+    return _NANOS_PER_DAY // step
+
+
+def downsample(arrays, factor):
+    """Combine each `factor` consecutive bars to one bar
+
+    Args:
+        arrays (dict): arrays of bars by field, their length being a
+            multiple of `factor`, including `volume` if `vwap` is given
+        factor (int): number of bars combined
+
+    Returns:
+        dict: arrays of combined bars by field
+    """
+    result = dict()
+    for field, array in arrays.items():
+        how = AGGREGATIONS[field]
+        array = array.reshape(-1, factor)
+        rows = np.arange(array.shape[0])
+        if how == 'vwap':
+            volume = arrays['volume'].reshape(-1, factor).astype(np.float64)
+            notional = np.where(volume > 0, array * volume, 0.).sum(axis=1)
+            total = volume.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                vwap = np.where(total > 0, notional / total, np.nan)
+            result[field] = vwap.astype(array.dtype)
+        elif how == 'first':
+            result[field] = array[rows, np.argmax(~np.isnan(array), axis=1)]
+        elif how == 'last':
+            last = factor - 1 - np.argmax(~np.isnan(array[:, ::-1]), axis=1)
+            result[field] = array[rows, last]
+        elif how == 'max':
+            result[field] = np.fmax.reduce(array, axis=1)
+        elif how == 'min':
+            result[field] = np.fmin.reduce(array, axis=1)
+        else:
+            result[field] = array.sum(axis=1, dtype=array.dtype)
+    return result
+
+
+def day_arrays(candles, fields):
+    """Minute bars of a day as arrays of all minutes of the day
+
+    Args:
+        candles (pandas.DataFrame): minute bars within a single day
+        fields (iterable): fields to extract
+
+    Returns:
+        tuple: day as pandas.Timestamp and arrays of the day by field,
+        missing minutes having NaN prices and zero volume
+    """
+    nanos = candles.index.values.astype('datetime64[ns]').astype(np.int64)
+    day = nanos[0] - nanos[0] % _NANOS_PER_DAY
+    minutes = (nanos - day) // _NANOS_PER_MINUTE
+    arrays = dict()
+    for field in fields:
+        array = np.full(MINUTES_PER_DAY, empty_value(field),
+                        dtype=FIELD_DTYPES[field])
+        array[minutes] = candles[field].values
+        arrays[field] = array
+    return pd.Timestamp(day, tz='UTC'), arrays
+
+
+def empty_value(field):
+    """Value of a field in a bar without trades, NaN or zero for sums
+    """
+    return 0 if AGGREGATIONS[field] == 'sum' else np.nan
+
+
+def _empty_days(fields, n_days):
+    return {field: np.full(n_days * MINUTES_PER_DAY, empty_value(field),
+                           dtype=FIELD_DTYPES[field])
+            for field in fields}
+
+
+class BarPyramidWriter(object):
+    """Writer appending the minute bars of each day to all resolutions
+
+    Days of a symbol id have to be written in chronological order, gaps are
+    filled with empty bars and days not after the last written day are
+    ignored. An existing pyramid, e.g. copied from a previous ingestion, is
+    appended to.
+
+    Args:
+        rootdir (str): directory of the pyramid
+        freqs (iterable): resolutions to write
+        fields (iterable): fields to write (default all known fields)
+    """
+    def __init__(self, rootdir, freqs=RESOLUTIONS, fields=None):
+        self.rootdir = rootdir
+        metadata = read_metadata(rootdir)
+        if metadata is None:
+            metadata = dict(freqs=list(freqs),
+                            fields=list(fields or FIELDS),
+                            sids=dict())
+        for freq in metadata['freqs']:
+            bars_per_day(freq)  # validate
+        self.freqs = metadata['freqs']
+        self.fields = metadata['fields']
+        self._sids = metadata['sids']
+
+    def _path(self, freq, sid, field):
+        return os.path.join(self.rootdir, freq, str(sid), field)
+
+    def write_day(self, sid, candles):
+        """Append the minute bars of a day of a symbol id
+
+        Args:
+            sid (int): symbol id
+            candles (pandas.DataFrame): minute bars within a single day
+        """
+        if candles.empty:
+            return
+        with get_metrics().timer('pyramid_write'):
+            self._write_day(sid, candles)
+
+    def _write_day(self, sid, candles):
+        day, arrays = day_arrays(candles, self.fields)
+        info = self._sids.get(str(sid))
+        if info is None:
+            info = self._sids[str(sid)] = dict(first=day.value, days=0)
+            for freq in self.freqs:
+                path = os.path.dirname(self._path(freq, sid, self.fields[0]))
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+        n_gap = (day.value - info['first']) // _NANOS_PER_DAY - info['days']
+        if n_gap < 0:
+            return
+        if n_gap > 0:
+            self._append(sid, _empty_days(self.fields, n_gap))
+        self._append(sid, arrays)
+        info['days'] += n_gap + 1
+
+    def _append(self, sid, arrays):
+        for freq in self.freqs:
+            factor = MINUTES_PER_DAY // bars_per_day(freq)
+            bars = arrays if factor == 1 else downsample(arrays, factor)
+            for field, array in bars.items():
+                with open(self._path(freq, sid, field), 'ab') as fh:
+                    array.tofile(fh)
+
+    def collect(self, data):
+        """Pass minute bars of days through while writing them
+
+        Args:
+            data: iterable of symbol id and dataframe of a day tuples
+
+        Returns:
+            generator of symbol id and dataframe tuples
+        """
+        for sid, candles in data:
+            self.write_day(sid, candles)
+            yield sid, candles
+
+    def close(self):
+        """Write the metadata of the pyramid
+        """
+        if not os.path.isdir(self.rootdir):
+            os.makedirs(self.rootdir)
+        metadata = dict(freqs=self.freqs, fields=self.fields, sids=self._sids)
+        with open(os.path.join(self.rootdir, METADATA_FILE), 'w') as fh:
+            json.dump(metadata, fh)
+
+
+def read_metadata(rootdir):
+    """Read the metadata of a pyramid
+
+    Args:
+        rootdir (str): directory of the pyramid
+
+    Returns:
+        dict: resolutions, fields and first day and number of days of each
+        symbol id or None if there is no pyramid
+    """
+    path = os.path.join(rootdir, METADATA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def copy_pyramid(ingestion_dir, rootdir, sid_map, freqs, fields=FIELDS):
+    """Copy the pyramid of a previous ingestion into the current one
+
+    Symbol ids may differ between ingestions, so they are matched by
+    `sid_map`. Nothing is copied if the previous pyramid has different
+    resolutions or fields.
+
+    Args:
+        ingestion_dir (str): directory of the previous ingestion
+        rootdir (str): directory of the pyramid of the current ingestion
+        sid_map (dict): mapping from previous to current symbol id
+        freqs (iterable): resolutions of the current pyramid
+        fields (iterable): fields of the current pyramid
+
+    Returns:
+        bool: True if the pyramid was copied
+    """
+    metadata = read_metadata(os.path.join(ingestion_dir, PYRAMID_DIR))
+    if (metadata is None or metadata['freqs'] != list(freqs) or
+            metadata['fields'] != list(fields)):
+        _logger.warning("No compatible bar pyramid in {}, writing only new "
+                        "days".format(ingestion_dir))
+        return False
+    sids = dict()
+    for last_sid, sid in sid_map.items():
+        info = metadata['sids'].get(str(last_sid))
+        if info is None:
+            continue
+        for freq in metadata['freqs']:
+            shutil.copytree(
+                os.path.join(ingestion_dir, PYRAMID_DIR, freq, str(last_sid)),
+                os.path.join(rootdir, freq, str(sid)))
+        sids[str(sid)] = info
+    metadata['sids'] = sids
+    if not os.path.isdir(rootdir):
+        os.makedirs(rootdir)
+    with open(os.path.join(rootdir, METADATA_FILE), 'w') as fh:
+        json.dump(metadata, fh)
+    return True
+
+
+class BarPyramidReader(object):
+    """Reader of a pyramid serving each request from the coarsest resolution
+
+    A request for a resolution that is not stored, e.g. 2 hours, is
+    aggregated from the coarsest stored resolution dividing it, e.g. 1 hour.
+
+    Args:
+        rootdir (str): directory of the pyramid
+    """
+    def __init__(self, rootdir):
+        metadata = read_metadata(rootdir)
+        if metadata is None:
+            raise IOError("No bar pyramid in {}".format(rootdir))
+        self.rootdir = rootdir
+        self.freqs = metadata['freqs']
+        self.fields = metadata['fields']
+        self._sids = {int(sid): info for sid, info in metadata['sids'].items()}
+        self._arrays = dict()
+
+    @classmethod
+    def from_bundle(cls, bundle_name, timestamp=None, environ=None):
+        """Reader of the pyramid of the most recent ingestion of a bundle
+
+        Args:
+            bundle_name (str): name of the bundle
+            timestamp (pandas.Timestamp): latest ingestion to consider
+                (default now)
+            environ (mapping): environment used to find zipline's root
+
+        Returns:
+            :class:`BarPyramidReader`: reader
+        """
+        from zipline.data.bundles.core import most_recent_data
+        if timestamp is None:
+            timestamp = pd.Timestamp.utcnow()
+        ingestion_dir = most_recent_data(bundle_name, timestamp, environ)
+        return cls(os.path.join(ingestion_dir, PYRAMID_DIR))
+
+    @property
+    def sids(self):
+        return sorted(self._sids)
+
+    def resolution(self, freq):
+        """Coarsest stored resolution a resolution can be aggregated from
+
+        Args:
+            freq (str): requested resolution
+
+        Returns:
+            str: stored resolution
+        """
+        n_bars = bars_per_day(freq)
+        candidates = [stored for stored in self.freqs
+                      if bars_per_day(stored) % n_bars == 0]
+        if not candidates:
+            raise ValueError("Resolution {} cannot be served from {}".format(
+                freq, ', '.join(self.freqs)))
+        return min(candidates, key=bars_per_day)
+
+    def _array(self, freq, sid, field):
+        key = freq, sid, field
+        if key not in self._arrays:
+            path = os.path.join(self.rootdir, freq, str(sid), field)
+            self._arrays[key] = np.memmap(path, dtype=FIELD_DTYPES[field],
+                                          mode='r')
+        return self._arrays[key]
+
+    def _bar_range(self, freq, start, end):
+        step = to_offset(freq).nanos
+        first = start.value // step
+        last = end.value // step
+        return first, max(last - first + 1, 0)
+
+    def load_raw_arrays(self, fields, start, end, sids, freq='1T'):
+        """Bars of a period and several symbol ids as 2d arrays
+
+        Bars outside the written days have NaN prices and zero volume.
+
+        Args:
+            fields (list): fields to load
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+            sids (list): symbol ids
+            freq (str): resolution of the bars
+
+        Returns:
+            list: array of shape (bars, symbol ids) for each field
+        """
+        stored = self.resolution(freq)
+        factor = bars_per_day(stored) // bars_per_day(freq)
+        stored_step = to_offset(stored).nanos
+        first, n_bars = self._bar_range(freq, start, end)
+        stored_first = first * factor
+        out = {field: np.full((n_bars, len(sids)), empty_value(field),
+                              dtype=FIELD_DTYPES[field])
+               for field in fields}
+        for col, sid in enumerate(sids):
+            info = self._sids.get(sid)
+            if info is None:
+                continue
+            offset = info['first'] // stored_step
+            lo = max(stored_first - offset, 0)
+            hi = min(stored_first + n_bars * factor - offset,
+                     info['days'] * bars_per_day(stored))
+            if hi <= lo:
+                continue
+            needed = set(fields)
+            if factor > 1 and 'vwap' in needed:
+                needed.add('volume')
+            arrays = {field: self._array(stored, sid, field)[lo:hi]
+                      for field in needed}
+            if factor > 1:
+                arrays = downsample(arrays, factor)
+            row = (offset + lo) // factor - first
+            for field in fields:
+                out[field][row:row + arrays[field].size, col] = arrays[field]
+        return [out[field] for field in fields]
+
+    def window(self, field, sid, end, bar_count, freq='1T'):
+        """Last bars of a field up to and including the bar containing `end`
+
+        If the resolution is stored and all bars were written, a slice of
+        the memory-mapped array is returned without copying, e.g. to read
+        the VWAP of the last 30 minutes in `handle_data` of an algorithm::
+
+            reader.window('vwap', sid, get_datetime(), 30)
+
+        Args:
+            field (str): field to read
+            sid (int): symbol id
+            end (pandas.Timestamp): time of the last bar
+            bar_count (int): number of bars
+            freq (str): resolution of the bars
+
+        Returns:
+            numpy.ndarray: values of the bars in chronological order
+        """
+        step = to_offset(freq).nanos
+        last = end.value // step
+        info = self._sids.get(sid)
+        if freq in self.freqs and info is not None:
+            hi = last - info['first'] // step + 1
+            lo = hi - bar_count
+            if lo >= 0 and hi <= info['days'] * bars_per_day(freq):
+                return self._array(freq, sid, field)[lo:hi]
+        start = pd.Timestamp((last - bar_count + 1) * step, tz='UTC')
+        return self.load_raw_arrays([field], start, end, [sid], freq)[0][:, 0]
+
+    def get_bars(self, sid, start, end, freq='1T', fields=None):
+        """Bars of a period and a single symbol id
+
+        Args:
+            sid (int): symbol id
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+            freq (str): resolution of the bars
+            fields (list): fields to load (default all stored fields)
+
+        Returns:
+            pandas.DataFrame: bars indexed by their start
+        """
+        if fields is None:
+            fields = self.fields
+        arrays = self.load_raw_arrays(fields, start, end, [sid], freq)
+        first, n_bars = self._bar_range(freq, start, end)
+        index = pd.date_range(
+            pd.Timestamp(first * to_offset(freq).nanos, tz='UTC'),
+            periods=n_bars, freq=freq, name='date')
+        return pd.DataFrame({field: array[:, 0]
+                             for field, array in zip(fields, arrays)},
+                            index=index, columns=fields)
@@ -2,20 +2,36 @@
 """
 Zipline bundle for Poloniex exchange
 """
+import os
+import time
+import shutil
 import logging
-from datetime import time, timedelta, datetime
+import tempfile
+from glob import glob
+from contextlib import contextmanager
+from datetime import timedelta
 
-from pytz import timezone
+import requests
 import numpy as np
 import pandas as pd
-from pandas.tseries.offsets import CustomBusinessDay
-from zipline.utils.calendars import (
-    TradingCalendar, register_calendar, register_calendar_alias,
-    deregister_calendar)
-from zipline.data.bundles import register
-from zipline.utils.memoize import lazyval
+from pandas.tseries.frequencies import to_offset
+from zipline.assets import AssetFinder
+from zipline.data.bundles.core import (daily_equity_relative,
+                                       minute_equity_relative)
+from zipline.data.minute_bars import BcolzMinuteBarMetadata, _sid_subdir_path
+from zipline.data.us_equity_pricing import BcolzDailyBarReader
 
-from .api import get_currencies, get_trade_hist_alias
+from .api import (CHART_PERIODS, concat_trades, get_client, get_currencies,
+                  get_chart_data, get_trade_hist_alias, iter_trade_hist,
+                  query_api, set_client, set_rate_limiter, Client,
+                  RequestError, WindowPlanner, TRADE_TYPES)
+from .bars import (FIELDS, MICROSTRUCTURE_FIELDS, PYRAMID_DIR,
+                   BarPyramidWriter, copy_pyramid)
+from .cache import CandleCache
+from .calendar import PoloniexCalendar  # noqa, formerly defined here
+from .metrics import get_metrics
+from .store import TradeStore, default_root
+from .utils import FileTokenBucket, ordered_map
 
 __author__ = "Florian Wilhelm"
 __copyright__ = "Florian Wilhelm"
@@ -23,6 +39,15 @@ __license__ = "mit"
 
 _logger = logging.getLogger(__name__)
 
+_NANOS_PER_DAY = 24 * 60 * 60 * 10**9
+# kinds of units of days in `prepare_data`
+_FETCH, _CACHED, _INACTIVE = 'fetch', 'cached', 'inactive'
+# maximum number of candles requested at once from returnChartData
+_MAX_CANDLES = 10000
+# directories of the bars within an ingestion as named by zipline
+_MINUTE_BARS_DIR = minute_equity_relative(None, None)[-1]
+_DAILY_BARS_DIR = daily_equity_relative(None, None)[-1]
+
 
 class Pairs(object):
     """Record object holding most common US-$ / crypto-currency pairs
@@ -59,6 +84,91 @@ def fetch_assets(asset_pairs):
     return asset_df
 
 
+def _bin_ohlcv(nanos, rate, amount, step):
+    """Aggregate sorted trades into OHLCV bins of fixed width
+
+    Bins are aligned to midnight of the first timestamp like pandas' resample
+    does for frequencies dividing a day. Empty bins get NaN prices and zero
+    volume.
+
+    Args:
+        nanos (numpy.ndarray): sorted int64 nanoseconds since epoch
+        rate (numpy.ndarray): rate of each trade, NaN for padding rows
+        amount (numpy.ndarray): amount of each trade, NaN for padding rows
+        step (int): bin width in nanoseconds
+
+    Returns:
+        tuple: first bin label in nanoseconds and arrays of open, high,
+        low, close and volume
+    """
+    origin = nanos[0] - nanos[0] % _NANOS_PER_DAY
+    bins = (nanos - origin) // step
+    first_bin = bins[0]
+    bins -= first_bin
+    n_bins = bins[-1] + 1
+
+    valid_amount = ~np.isnan(amount)
+    volume = np.bincount(bins[valid_amount], weights=amount[valid_amount],
+                         minlength=n_bins).astype(amount.dtype)
+
+    valid_rate = ~np.isnan(rate)
+    rate, bins = rate[valid_rate], bins[valid_rate]
+    open, high, low, close = (np.full(n_bins, np.nan, dtype=rate.dtype)
+                              for _ in range(4))
+    if rate.size:
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        ends = np.r_[starts[1:], rate.size] - 1
+        idx = bins[starts]
+        open[idx] = rate[starts]
+        close[idx] = rate[ends]
+        high[idx] = np.maximum.reduceat(rate, starts)
+        low[idx] = np.minimum.reduceat(rate, starts)
+    return origin + first_bin * step, open, high, low, close, volume
+
+
+def make_candle_sticks(trades, freqs=('1T',)):
+    """Make candle stick like charts for several frequencies at once
+
+    Trades are sorted once by timestamp and then bucketed on integer offsets
+    for every frequency, which avoids one full resample per OHLCV field.
+    Only fixed frequencies like minutes, hours or days are supported.
+
+    Args:
+        trades (pandas.DataFrame): dataframe containing trades
+        freqs (iterable): frequencies for aggregation (default 1 minute)
+
+    Returns:
+        dict: chart data as pandas.DataFrame for each frequency
+    """
+    index = trades.index
+    nanos = index.values.astype('datetime64[ns]').view(np.int64)
+    order = np.argsort(nanos, kind='mergesort')
+    nanos = nanos[order]
+    rate = trades['rate'].values[order]
+    amount = trades['amount'].values[order]
+
+    charts = dict()
+    for freq in freqs:
+        if nanos.size:
+            first, open, high, low, close, volume = _bin_ohlcv(
+                nanos, rate, amount, to_offset(freq).nanos)
+            bin_index = pd.date_range(pd.Timestamp(first, tz='UTC'),
+                                      periods=open.size, freq=freq,
+                                      name=index.name)
+            if index.tz is None:
+                bin_index = bin_index.tz_localize(None)
+            else:
+                bin_index = bin_index.tz_convert(index.tz)
+        else:
+            open = high = low = close = rate[:0]
+            volume = amount[:0]
+            bin_index = index[:0]
+        charts[freq] = pd.DataFrame(
+            dict(open=open, high=high, low=low, close=close, volume=volume),
+            index=bin_index, columns=list(FIELDS))
+    return charts
+
+
 def make_candle_stick(trades, freq='1T'):
     """Make a candle stick like chart
 
@@ -72,80 +182,879 @@ def make_candle_stick(trades, freq='1T'):
     Returns:
         pandas.DataFrame: chart data
     """
-    volume = trades['amount'].resample(freq).sum()
-    volume = volume.fillna(0)
-    high = trades['rate'].resample(freq).max()
-    low = trades['rate'].resample(freq).min()
-    open = trades['rate'].resample(freq).first()
-    close = trades['rate'].resample(freq).last()
-    return pd.DataFrame(
-        dict(open=open, high=high, low=low, close=close, volume=volume))
+    return make_candle_sticks(trades, (freq,))[freq]
+
+
+class CandleAccumulator(object):
+    """Running candle sticks of a period folded from chunks of trades
+
+    Bins are laid out for the whole period up front like
+    `make_candle_stick` does for trades padded with `start` and `end`.
+    Chunks are expected in chronological order of their windows and can be
+    dropped after `update`, so memory is bounded by the bins and a single
+    chunk.
+
+    With microstructure, the fields of `bars.MICROSTRUCTURE_FIELDS` are
+    accumulated as well, which needs the `type` of the trades.
+
+    Args:
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        freq (str): frequency of the candle sticks (default 1 minute)
+        dtype: floating point type of prices
+        microstructure (bool): also accumulate VWAP, number of trades and
+            buy and sell volume
+    """
+    def __init__(self, start, end, freq='1T', dtype=np.float32,
+                 microstructure=False):
+        self.freq = freq
+        self.microstructure = microstructure
+        self.step = to_offset(freq).nanos
+        origin = start.value - start.value % _NANOS_PER_DAY
+        self.first = origin + (start.value - origin) // self.step * self.step
+        n_bins = (end.value - self.first) // self.step + 1
+        self.open, self.high, self.low, self.close = (
+            np.full(n_bins, np.nan, dtype=dtype) for _ in range(4))
+        self.volume = np.zeros(n_bins, dtype=np.float64)
+        self._open_nanos = np.full(n_bins, np.iinfo(np.int64).max,
+                                   dtype=np.int64)
+        self._close_nanos = np.full(n_bins, np.iinfo(np.int64).min,
+                                    dtype=np.int64)
+        if microstructure:
+            self.notional, self.buy_volume, self.sell_volume = (
+                np.zeros(n_bins, dtype=np.float64) for _ in range(3))
+            self.trades = np.zeros(n_bins, dtype=np.int64)
+
+    def update(self, columns):
+        """Fold a chunk of trades into the candle sticks
+
+        Args:
+            columns (dict): columns with at least `date` in seconds since
+                epoch, `rate` and `amount` and with microstructure `type`
+        """
+        with get_metrics().timer('aggregate'):
+            self._update(columns)
+
+    def _update(self, columns):
+        nanos = columns['date'] * 10**9
+        order = np.argsort(nanos, kind='mergesort')
+        nanos = nanos[order]
+        bins = (nanos - self.first) // self.step
+        valid = (bins >= 0) & (bins < self.volume.size)
+        nanos, bins = nanos[valid], bins[valid]
+        rate = columns['rate'][order][valid]
+        amount = columns['amount'][order][valid]
+        if not bins.size:
+            return
+        self.volume += np.bincount(bins, weights=amount,
+                                   minlength=self.volume.size)
+        if self.microstructure:
+            self._update_microstructure(bins, rate, amount,
+                                        columns['type'], order[valid])
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        ends = np.r_[starts[1:], bins.size] - 1
+        idx = bins[starts]
+        first = nanos[starts] < self._open_nanos[idx]
+        self.open[idx[first]] = rate[starts[first]]
+        self._open_nanos[idx[first]] = nanos[starts[first]]
+        last = nanos[ends] >= self._close_nanos[idx]
+        self.close[idx[last]] = rate[ends[last]]
+        self._close_nanos[idx[last]] = nanos[ends[last]]
+        self.high[idx] = np.fmax(self.high[idx],
+                                 np.maximum.reduceat(rate, starts))
+        self.low[idx] = np.fmin(self.low[idx],
+                                np.minimum.reduceat(rate, starts))
+
+    def _update_microstructure(self, bins, rate, amount, types, idx):
+        n_bins = self.volume.size
+        if isinstance(types, pd.Categorical):
+            types = types.codes
+        sell = types[idx] == TRADE_TYPES.index('sell')
+        notional = rate.astype(np.float64) * amount
+        self.notional += np.bincount(bins, weights=notional, minlength=n_bins)
+        self.trades += np.bincount(bins, minlength=n_bins)
+        self.sell_volume += np.bincount(bins[sell], weights=amount[sell],
+                                        minlength=n_bins)
+        self.buy_volume += np.bincount(bins[~sell], weights=amount[~sell],
+                                       minlength=n_bins)
+
+    def to_arrays(self):
+        """Candle sticks of the period as plain arrays
+
+        Arrays are cheap to pass between processes, use `arrays_to_frame`
+        to turn them into chart data.
+
+        Returns:
+            tuple: first bin label in nanoseconds, frequency and dictionary
+            of open, high, low, close and volume arrays and the arrays of
+            microstructure fields
+        """
+        arrays = dict(
+            open=self.open, high=self.high, low=self.low, close=self.close,
+            volume=self.volume.astype(self.open.dtype))
+        if self.microstructure:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                vwap = np.where(self.volume > 0, self.notional / self.volume,
+                                np.nan)
+            arrays.update(vwap=vwap.astype(self.open.dtype),
+                          trades=self.trades.astype(np.int32),
+                          buy_volume=self.buy_volume.astype(self.open.dtype),
+                          sell_volume=self.sell_volume.astype(self.open.dtype))
+        return self.first, self.freq, arrays
+
+    def to_frame(self):
+        """Candle sticks of the period
+
+        Returns:
+            pandas.DataFrame: chart data
+        """
+        return arrays_to_frame(*self.to_arrays())
+
+
+def arrays_to_frame(first, freq, arrays):
+    """Build chart data from the arrays of `CandleAccumulator.to_arrays`
+
+    Args:
+        first (int): first bin label in nanoseconds
+        freq (str): frequency of the candle sticks
+        arrays (dict): open, high, low, close and volume arrays and
+            optionally arrays of microstructure fields
+
+    Returns:
+        pandas.DataFrame: chart data
+    """
+    index = pd.date_range(pd.Timestamp(first, tz='UTC'),
+                          periods=arrays['volume'].size, freq=freq,
+                          name='date')
+    columns = [field for field in FIELDS + MICROSTRUCTURE_FIELDS
+               if field in arrays]
+    return pd.DataFrame(arrays, index=index, columns=columns)
 
 
-def fetch_trades(asset_pair, start, end):
+def fetch_trades(asset_pair, start, end, planner=None, store=None):
     """Helper function to fetch trades for a single asset pair
 
-    Does all necessary conversions, sets `date` as index and assures
-    that `start` and `end` are in the index.
+    Trades are read from the store if it holds all days of the period.
+    Otherwise they are fetched from the API and days that were over when
+    fetching started are added to the store, while the days are locked for
+    other processes sharing it.
+
+    Sets `date` as index and assures that `start` and `end` are in the
+    index.
 
     Args:
         asset_pair: name of the asset pair
         start (pandas.Timestamp): start of period
         end (pandas.Timestamp): end of period
+        planner (:class:`~.api.WindowPlanner`): planner of query windows
+        store (:class:`~.store.TradeStore`): store of raw trades
 
     Returns:
         pandas.DataFrame: dataframe containing trades of asset
     """
-    df = get_trade_hist_alias(asset_pair, start, end)
-    df['date'] = df['date'].apply(lambda x: datetime.strptime(
-        x, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone('UTC')))
-    for col in ('total', 'rate', 'amount'):
-        df[col] = df[col].astype(np.float32)
+    if store is None:
+        df = get_trade_hist_alias(asset_pair, start, end, planner)
+    else:
+        with store.lock(asset_pair, start, end):
+            if store.covers(asset_pair, start, end):
+                df = store.read(asset_pair, start, end)
+            else:
+                fetched = pd.Timestamp.utcnow()
+                df = get_trade_hist_alias(asset_pair, start, end, planner)
+                store.write_range(asset_pair, start, end, df, fetched)
     df = df.set_index('date')
-    if start not in df.index:
-        df.loc[start] = np.nan
-    if end not in df.index:
-        df.loc[end] = np.nan
+    missing = [ts for ts in (start, end) if ts not in df.index]
+    if missing:
+        df = pd.concat([df, pd.DataFrame(
+            index=pd.DatetimeIndex(missing, name=df.index.name))])
     return df
 
 
-def prepare_data(start, end, sid_map, cache):
+def stream_candle_stick(asset_pair, start, end, planner=None, store=None,
+                        microstructure=False):
+    """Fetch trades of a single asset pair and fold them into candle sticks
+
+    Gives the same result as `make_candle_stick(fetch_trades(...))` but
+    never holds more than one chunk of trades unless raw trades need to be
+    added to the store.
+
+    Args:
+        asset_pair: name of the asset pair
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        planner (:class:`~.api.WindowPlanner`): planner of query windows
+        store (:class:`~.store.TradeStore`): store of raw trades
+        microstructure (bool): add the fields of `bars.MICROSTRUCTURE_FIELDS`
+
+    Returns:
+        pandas.DataFrame: chart data
+    """
+    return stream_candles(asset_pair, start, end, planner, store,
+                          microstructure).to_frame()
+
+
+def stream_candles(asset_pair, start, end, planner=None, store=None,
+                   microstructure=False):
+    """Fetch trades of a single asset pair and fold them into an accumulator
+
+    See `stream_candle_stick` for details. With a store, the days of the
+    period are locked while runs of days available in the store are read
+    and the missing ones fetched, so other processes sharing the store
+    wait for days in flight instead of fetching them as well.
+
+    Args:
+        asset_pair: name of the asset pair
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        planner (:class:`~.api.WindowPlanner`): planner of query windows
+        store (:class:`~.store.TradeStore`): store of raw trades
+        microstructure (bool): accumulate microstructure fields as well
+
+    Returns:
+        :class:`CandleAccumulator`: candle sticks of the period
+    """
+    metrics = get_metrics()
+    candles = CandleAccumulator(start, end, microstructure=microstructure)
+    if store is None:
+        for columns in iter_trade_hist(asset_pair, start, end, planner):
+            candles.update(columns)
+        return candles
+
+    columns = ['date', 'rate', 'amount']
+    if microstructure:
+        columns.append('type')
+    started = time.time()
+    with store.lock(asset_pair, start, end):
+        metrics.add_time('store_lock', time.time() - started)
+        for span_start, span_end, available in store.spans(asset_pair, start,
+                                                           end):
+            if available:
+                for day in pd.date_range(span_start, span_end, freq='D'):
+                    day_end = min(day + timedelta(days=1, seconds=-1),
+                                  span_end)
+                    with metrics.timer('store_read'):
+                        day_columns = store.read_columns(
+                            asset_pair, day, day_end, columns)
+                    candles.update(day_columns)
+                continue
+            chunks = []
+            fetched = pd.Timestamp.utcnow()
+            for chunk in iter_trade_hist(asset_pair, span_start, span_end,
+                                         planner):
+                candles.update(chunk)
+                chunks.append(chunk)
+            with metrics.timer('store_write'):
+                store.write_columns_range(asset_pair, span_start, span_end,
+                                          concat_trades(chunks), fetched)
+    return candles
+
+
+_worker_pid = None
+
+
+def _aggregate_unit(task):
+    """Fetch and aggregate the trades of consecutive days in a worker process
+
+    Each process opens its own connections to the API URL of the task,
+    since pooled connections of a forked parent must not be shared and a
+    spawned process does not know the parent's client, and shares the rate
+    limit with all other processes through the state file of a
+    :class:`~.utils.FileTokenBucket`. The planner of each unit starts from
+    the density estimate of the parent's planner and its new estimate is
+    handed back, so the parent can plan the next units.
+
+    Args:
+        task (tuple): unit of `prepare_data`, i.e. symbol id, asset pair
+            name, days and their kind, the trade store, path, rate and
+            capacity of the rate limiter, URL and timeout of the API client,
+            if microstructure fields are accumulated and the density
+            estimate of the asset pair
+
+    Returns:
+        tuple: the unit, candle sticks as returned by
+        `CandleAccumulator.to_arrays` or None for days not to be fetched,
+        the new density estimate and the number of API calls
+    """
+    global _worker_pid
+    unit, store, limiter, url, timeout, microstructure, density = task
+    sid, asset_pair, days, kind = unit
+    if kind != _FETCH:
+        return unit, None, density, 0
+    if _worker_pid != os.getpid():
+        set_client(Client(url, timeout=timeout))
+        set_rate_limiter(FileTokenBucket(*limiter))
+        _worker_pid = os.getpid()
+    planner = WindowPlanner()
+    if density is not None:
+        planner.set_density(asset_pair, density)
+    n_calls = get_client().n_calls
+    start_day, end_day = days[0], days[-1] + timedelta(days=1, seconds=-1)
+    candles = stream_candles(asset_pair, start_day, end_day, planner,
+                             store, microstructure)
+    return (unit, candles.to_arrays(), planner.density(asset_pair),
+            get_client().n_calls - n_calls)
+
+
+@contextmanager
+def _shared_limiter():
+    """Context manager providing a rate limiter shared with other processes
+
+    Returns:
+        tuple: path, rate and capacity of a :class:`~.utils.FileTokenBucket`
+        with the settings of the current rate limiter of the API
+    """
+    bucket = query_api.bucket
+    if isinstance(bucket, FileTokenBucket):
+        yield bucket.path, bucket.rate, bucket.capacity
+        return
+    fd, path = tempfile.mkstemp(prefix='zipline_poloniex_', suffix='.bucket')
+    os.close(fd)
+    try:
+        yield path, bucket.rate, bucket.capacity
+    finally:
+        os.remove(path)
+
+
+def prepare_data(start, end, sid_map, cache, workers=1, planner=None,
+                 last_days=None, store=None, processes=1, skip_inactive=False,
+                 microstructure=False):
     """Retrieve and prepare trade data for ingestion
 
+    Consecutive days missing in the cache are fetched with as few requests
+    as the planner deems possible, i.e. quiet days are merged into one
+    request and busy days are split.
+
+    If inactive days are skipped, days without volume in the daily chart
+    data of an asset pair, e.g. before its listing, get empty bars without
+    requesting their trades. This costs one request per asset pair with
+    days neither cached nor in the store.
+
+    With more than one worker, the days of all asset pairs are fetched
+    concurrently while sharing the throttled API budget. Results are still
+    yielded in the order of symbol ids and days.
+
+    With more than one process, decoding and aggregation of trades run in a
+    pool of processes instead, which return plain arrays of candle sticks
+    while the caller stays the only writer. The API budget is then shared
+    through a file, the density estimates of the workers are passed back to
+    the planner and stage timings of the workers are not recorded, only
+    their API calls.
+
     Args:
         start (pandas.Timestamp): start of period
         end (pandas.Timestamp): end of period
         sid_map (dict): mapping from symbol id to asset pair name
         cache: cache object as provided by zipline
+        workers (int): number of threads fetching trades
+        planner (:class:`~.api.WindowPlanner`): planner of query windows
+        last_days (dict): mapping from symbol id to the last day already
+            ingested, only later days are retrieved
+        store (:class:`~.store.TradeStore`): store of raw trades
+        processes (int): number of processes aggregating trades, replaces
+            the threads of `workers` if larger than 1
+        skip_inactive (bool): skip days without trades according to the
+            daily chart data
+        microstructure (bool): add the fields of `bars.MICROSTRUCTURE_FIELDS`
+            to the candle sticks
 
     Returns:
         generator of symbol id and dataframe tuples
     """
+    if planner is None:
+        planner = WindowPlanner()
+    if last_days is None:
+        last_days = dict()
+    one_day = timedelta(days=1)
+    metrics = get_metrics()
+
     def get_key(sid, day):
-        return "{}_{}".format(sid, day.strftime("%Y-%m-%d"))
+        key = "{}_{}".format(sid, day.strftime("%Y-%m-%d"))
+        # candle sticks with and without microstructure are cached apart
+        return key + "_micro" if microstructure else key
+
+    def get_kinds(sid, asset_pair, all_days):
+        kinds = [_CACHED if get_key(sid, day) in cache else _FETCH
+                 for day in all_days]
+        fetched = [day for day, kind in zip(all_days, kinds) if kind == _FETCH]
+        if not skip_inactive or not fetched:
+            return kinds
+        last_second = fetched[-1] + timedelta(days=1, seconds=-1)
+        if store is not None and store.covers(asset_pair, fetched[0],
+                                              last_second):
+            return kinds
+        active = find_active_days(asset_pair, fetched[0], last_second)
+        if active is None:
+            return kinds
+        return [_INACTIVE if kind == _FETCH and day not in active else kind
+                for day, kind in zip(all_days, kinds)]
+
+    def get_units():
+        for sid, asset_pair in sid_map.items():
+            days = []
+            first_day = start
+            if sid in last_days:
+                first_day = max(start, last_days[sid] + one_day)
+            all_days = pd.date_range(first_day, end, freq='D', closed='left',
+                                     tz='utc')
+            kinds = get_kinds(sid, asset_pair, all_days)
+            for start_day, kind in zip(all_days, kinds):
+                full = len(days) * one_day >= planner.window(asset_pair)
+                if days and (kind != _FETCH or full):
+                    yield sid, asset_pair, days, _FETCH
+                    days = []
+                if kind == _FETCH:
+                    days.append(start_day)
+                else:
+                    yield sid, asset_pair, [start_day], kind
+            if days:
+                yield sid, asset_pair, days, _FETCH
+
+    def load(unit):
+        sid, asset_pair, days, kind = unit
+        if kind != _FETCH:
+            return unit, None
+        start_day, end_day = days[0], days[-1] + timedelta(days=1, seconds=-1)
+        with metrics.labels(asset_pair, start_day):
+            candles = stream_candle_stick(asset_pair, start_day, end_day,
+                                          planner, store, microstructure)
+        _logger.debug("Fetched trades from {} to {}".format(start_day,
+                                                            end_day))
+        return unit, candles
+
+    def get_results():
+        if processes <= 1:
+            for result in ordered_map(load, get_units(), workers):
+                yield result
+            return
+        with _shared_limiter() as limiter:
+            # requests of the parent, e.g. for inactive days, share the budget
+            bucket = query_api.bucket
+            set_rate_limiter(FileTokenBucket(*limiter))
+            try:
+                client = get_client()
+                tasks = ((unit, store, limiter, client.url, client.timeout,
+                          microstructure, planner.density(unit[1]))
+                         for unit in get_units())
+                for unit, arrays, density, n_calls in ordered_map(
+                        _aggregate_unit, tasks, processes, processes=True):
+                    if density is not None:
+                        planner.set_density(unit[1], density)
+                    metrics.incr('api_calls', n_calls, pair=unit[1])
+                    candles = (None if arrays is None
+                               else arrays_to_frame(*arrays))
+                    yield unit, candles
+            finally:
+                set_rate_limiter(bucket)
+
+    for (sid, asset_pair, days, kind), candles in get_results():
+        if kind == _INACTIVE:
+            day = days[0]
+            metrics.incr('inactive_days', pair=asset_pair)
+            yield sid, CandleAccumulator(
+                day, day + timedelta(days=1, seconds=-1),
+                microstructure=microstructure).to_frame()
+            continue
+        for day in days:
+            key = get_key(sid, day)
+            if candles is not None:
+                with metrics.timer('cache_write', asset_pair, day):
+                    day_end = day + timedelta(days=1, seconds=-1)
+                    cache[key] = candles.loc[day:day_end]
+            else:
+                metrics.incr('cache_hits', pair=asset_pair)
+            with metrics.timer('cache_read', asset_pair, day):
+                day_candles = cache[key]
+            yield sid, day_candles
+
+
+def fetch_chart_data(asset_pair, start, end, period):
+    """Helper function to fetch candle sticks of a single asset pair
+
+    The period is split into chunks of at most 10000 candles. The volume is
+    taken from `quoteVolume`, i.e. the amount of the asset like the volume
+    of candles made from trades.
+
+    Args:
+        asset_pair: name of the asset pair
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        period (int): candle stick period in seconds
+
+    Returns:
+        pandas.DataFrame: chart data indexed by the start of each candle
+    """
+    second = pd.Timedelta(seconds=1)
+    span = pd.Timedelta(seconds=period * _MAX_CANDLES)
+    frames = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + span - second, end)
+        frames.append(get_chart_data(asset_pair, chunk_start, chunk_end,
+                                     period))
+        chunk_start = chunk_end + second
+    df = pd.concat(frames)
+    if 'date' not in df.columns:
+        df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close',
+                                   'quoteVolume'])
+    # empty responses consist of a single candle dated 0
+    df = df[df['date'].astype(np.int64) > 0]
+    index = pd.DatetimeIndex(
+        pd.to_datetime(df['date'].values.astype(np.int64), unit='s', utc=True),
+        name='date')
+    bars = pd.DataFrame(
+        dict(open=df['open'].values, high=df['high'].values,
+             low=df['low'].values, close=df['close'].values,
+             volume=df['quoteVolume'].values),
+        index=index, columns=list(FIELDS)).astype(np.float64)
+    return bars[~bars.index.duplicated()].sort_index()
+
+
+def find_active_days(asset_pair, start, end):
+    """Find the days an asset pair was traded from its daily chart data
+
+    Args:
+        asset_pair: name of the asset pair
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+
+    Returns:
+        pandas.DatetimeIndex: days with positive volume or None if the
+        chart data could not be retrieved
+    """
+    try:
+        daily = fetch_chart_data(asset_pair, start.normalize(), end, 24*60*60)
+    except (requests.exceptions.HTTPError, RequestError) as e:
+        _logger.warning("Could not find active days of {}: {}".format(
+            asset_pair, e))
+        return None
+    active = daily.index[daily['volume'].values > 0]
+    _logger.debug("{} has {} active days from {} to {}".format(
+        asset_pair, len(active), start, end))
+    return active
+
+
+def complete_sessions(daily, calendar):
+    """Reindex daily bars to all sessions between the first and last bar
+
+    Args:
+        daily (pandas.DataFrame): daily bars with OHLCV columns
+        calendar: trading calendar
+
+    Returns:
+        pandas.DataFrame: daily bars without gaps as needed by zipline
+    """
+    if daily.empty:
+        return daily
+    sessions = calendar.sessions_in_range(daily.index[0], daily.index[-1])
+    daily = daily.reindex(sessions)
+    daily['volume'] = daily['volume'].fillna(0)
+    return daily
+
+
+def make_daily_bars(bars, calendar):
+    """Aggregate bars of a single asset to daily bars
+
+    Args:
+        bars (pandas.DataFrame): bars with OHLCV columns
+        calendar: trading calendar
 
+    Returns:
+        pandas.DataFrame: daily bars for each session between the first and
+        last bar
+    """
+    daily = bars.resample('1D').agg(
+        dict(open='first', high='max', low='min', close='last', volume='sum'))
+    return complete_sessions(daily, calendar)
+
+
+def make_daily_bar(candles):
+    """Aggregate the minute bars of a single day to a daily bar
+
+    Args:
+        candles (pandas.DataFrame): minute bars of a day
+
+    Returns:
+        dict: open, high, low, close and volume of the day
+    """
+    close = candles['close'].values
+    traded = np.flatnonzero(~np.isnan(close))
+    if not traded.size:
+        return dict(open=np.nan, high=np.nan, low=np.nan, close=np.nan,
+                    volume=0.)
+    return dict(open=candles['open'].values[traded[0]],
+                high=np.nanmax(candles['high'].values),
+                low=np.nanmin(candles['low'].values),
+                close=close[traded[-1]],
+                volume=candles['volume'].values.sum())
+
+
+def collect_daily_bars(data, daily_bars):
+    """Pass minute bars through while aggregating them to daily bars
+
+    Args:
+        data: iterable of symbol id and dataframe of a day tuples
+        daily_bars (dict): mapping from symbol id to a list of days and
+            daily bar tuples that is filled while consuming the generator
+
+    Returns:
+        generator of symbol id and dataframe tuples
+    """
+    for sid, candles in data:
+        if not candles.empty:
+            day = candles.index[0].normalize()
+            daily_bars.setdefault(sid, []).append(
+                (day, make_daily_bar(candles)))
+        yield sid, candles
+
+
+def prepare_chart_data(start, end, sid_map, period):
+    """Retrieve candle sticks of the API for ingestion
+
+    Args:
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        sid_map (dict): mapping from symbol id to asset pair name
+        period (int): candle stick period in seconds
+
+    Returns:
+        generator of symbol id and dataframe tuples
+    """
     for sid, asset_pair in sid_map.items():
-        for start_day in pd.date_range(start, end, freq='D', closed='left', tz='utc'):
-            key = get_key(sid, start_day)
-            if key not in cache:
-                end_day = start_day + timedelta(days=1, seconds=-1)
-                trades = fetch_trades(asset_pair, start_day, end_day)
-                cache[key] = make_candle_stick(trades)
-                _logger.debug("Fetched trades from {} to {}".format(start_day, end_day))
-            yield sid, cache[key]
+        bars = fetch_chart_data(asset_pair, start,
+                                end - timedelta(seconds=1), period)
+        _logger.debug("Fetched chart data of {} from {} to {}".format(
+            asset_pair, start, end))
+        yield sid, bars
+
+
+def find_last_ingestion(output_dir):
+    """Find the most recent previous ingestion of a bundle
+
+    Args:
+        output_dir (str): output directory of the current ingestion
+
+    Returns:
+        str: directory of the previous ingestion or None
+    """
+    bundle_dir, current = os.path.split(os.path.normpath(output_dir))
+    if not os.path.isdir(bundle_dir):
+        return None
+    for name in sorted(os.listdir(bundle_dir), reverse=True):
+        if name.startswith('.') or name == current:
+            continue
+        if os.path.isdir(os.path.join(bundle_dir, name, _MINUTE_BARS_DIR)):
+            return os.path.join(bundle_dir, name)
+    return None
+
+
+def read_sids(ingestion_dir):
+    """Read the symbol ids of an ingestion
+
+    Args:
+        ingestion_dir (str): directory of the ingestion
 
+    Returns:
+        dict: mapping from symbol to symbol id
+    """
+    asset_db, = glob(os.path.join(ingestion_dir, 'assets-*.sqlite'))
+    finder = AssetFinder(asset_db)
+    return {asset.symbol: asset.sid
+            for asset in finder.retrieve_all(finder.sids)}
+
+
+def read_daily_bars(ingestion_dir, asset_df, last_days):
+    """Read the daily bars of a previous ingestion
 
-def create_bundle(asset_pairs, start=None, end=None):
+    Args:
+        ingestion_dir (str): directory of the previous ingestion
+        asset_df (pandas.DataFrame): dataframe of asset pairs
+        last_days (dict): mapping from symbol id to the last day to read
+
+    Returns:
+        dict: mapping from symbol id to a list of days and daily bar tuples
+    """
+    path = os.path.join(ingestion_dir, _DAILY_BARS_DIR)
+    if not os.path.exists(os.path.join(path, '__rootdirs__')):
+        return dict()
+    reader = BcolzDailyBarReader(path)
+    last_sids = read_sids(ingestion_dir)
+    fields = ['open', 'high', 'low', 'close', 'volume']
+    daily_bars = dict()
+    for sid, last_day in last_days.items():
+        symbol = asset_df['symbol'][sid]
+        arrays = reader.load_raw_arrays(
+            fields, reader.sessions[0], last_day, [last_sids[symbol]])
+        daily = pd.DataFrame(
+            {field: array[:, 0] for field, array in zip(fields, arrays)},
+            index=reader.sessions[:arrays[0].shape[0]])
+        daily = daily[daily['close'].notnull().values.cumsum() > 0]
+        daily_bars[sid] = [(day, bar.to_dict())
+                           for day, bar in daily.iterrows()]
+    return daily_bars
+
+
+def write_daily_bars(daily_bars, calendar, daily_bar_writer, show_progress):
+    """Write collected daily bars
+
+    Args:
+        daily_bars (dict): mapping from symbol id to a list of days and
+            daily bar tuples
+        calendar: trading calendar
+        daily_bar_writer: daily bar writer as provided by zipline
+        show_progress (bool): show a progress bar while writing
+    """
+    def get_data():
+        for sid, bars in sorted(daily_bars.items()):
+            days, rows = zip(*bars)
+            daily = pd.DataFrame(list(rows), index=pd.DatetimeIndex(days))
+            daily = complete_sessions(daily[~daily.index.duplicated()],
+                                      calendar)
+            yield sid, daily
+
+    daily_bar_writer.write(get_data(), show_progress=show_progress)
+
+
+def copy_minute_bars(ingestion_dir, minute_bar_writer, asset_df,
+                     start_session):
+    """Copy the minute bars of a previous ingestion into the current one
+
+    Assets are matched by symbol since symbol ids may differ between
+    ingestions. Nothing is copied if the previous ingestion started at a
+    different session.
+
+    Args:
+        ingestion_dir (str): directory of the previous ingestion
+        minute_bar_writer: minute bar writer as provided by zipline
+        asset_df (pandas.DataFrame): dataframe of asset pairs
+        start_session (pandas.Timestamp): first session of the bundle
+
+    Returns:
+        dict: mapping from symbol id to last day in the copied minute bars
+    """
+    rootdir = os.path.join(ingestion_dir, _MINUTE_BARS_DIR)
+    metadata = BcolzMinuteBarMetadata.read(rootdir)
+    if (metadata.start_session != start_session or
+            metadata.minutes_per_day != 24*60):
+        _logger.warning("Minute bars in {} are incompatible, ingesting all "
+                        "data".format(rootdir))
+        return dict()
+    last_sids = read_sids(ingestion_dir)
+    last_days = dict()
+    for sid, symbol in asset_df['symbol'].items():
+        if symbol not in last_sids:
+            continue
+        sidpath = os.path.join(rootdir, _sid_subdir_path(last_sids[symbol]))
+        if not os.path.isdir(sidpath):
+            continue
+        shutil.copytree(sidpath, minute_bar_writer.sidpath(sid))
+        last_day = minute_bar_writer.last_date_in_output_for_sid(sid)
+        if not pd.isnull(last_day):
+            last_days[sid] = last_day
+    return last_days
+
+
+def write_chart_data(start, end, sid_map, period, calendar,
+                     minute_bar_writer, daily_bar_writer, show_progress):
+    """Write minute and daily bars built from candle sticks of the API
+
+    Args:
+        start (pandas.Timestamp): start of period
+        end (pandas.Timestamp): end of period
+        sid_map (dict): mapping from symbol id to asset pair name
+        period (int): candle stick period in seconds
+        calendar: trading calendar
+        minute_bar_writer: minute bar writer as provided by zipline
+        daily_bar_writer: daily bar writer as provided by zipline
+        show_progress (bool): show a progress bar while writing
+    """
+    assert period in CHART_PERIODS, "Invalid period"
+    daily_bars = dict()
+    minute_bars = dict()
+    for sid, bars in prepare_chart_data(start, end, sid_map, period):
+        if bars.empty:
+            continue
+        daily_bars[sid] = make_daily_bars(bars, calendar)
+        if period < 24*60*60:
+            # candles become visible at the last minute of their period
+            bars.index += pd.Timedelta(seconds=period - 60)
+            minute_bars[sid] = bars
+    if minute_bars:
+        minute_bar_writer.write(minute_bars.items(),
+                                show_progress=show_progress)
+    daily_bar_writer.write(daily_bars.items(), show_progress=show_progress)
+
+
+def create_bundle(asset_pairs, start=None, end=None, workers=1,
+                  incremental=False, trade_store=None, chart_period=None,
+                  metrics_path=None, processes=1, skip_inactive=False,
+                  resolutions=None, microstructure=False, candle_cache=None,
+                  candle_cache_bytes=None):
     """Create a bundle ingest function
 
+    If a chart period is given, bars are built from the candle sticks of the
+    API instead of individual trades, which needs only a few requests per
+    asset pair. Each candle is written as minute bar at the last minute of
+    its period and all candles are aggregated to daily bars. With a period
+    of one day only daily bars are written. Options only used when building
+    bars from trades raise a ValueError in this case.
+
+    When building bars from trades, daily bars are aggregated from the
+    minute bars of each day while they are written.
+
+    In incremental mode, the minute bars of the previous ingestion are
+    copied and only the days after its last session are fetched. Progress
+    is checkpointed in zipline's cache which survives failed ingestions,
+    so an interrupted ingest resumes with the days not yet fetched.
+
     Args:
         asset_pairs (list): list of asset pairs
         start (pandas.Timestamp): start of trading period
         end (pandas.Timestamp): end of trading period
+        workers (int): number of threads fetching trades concurrently
+        incremental (bool): only fetch days after the previous ingestion
+        trade_store (str): directory of a store keeping the raw trades,
+            which are then read from it instead of the API on later ingests,
+            or True for the store shared by all bundles of the machine,
+            see `store.default_root`
+        chart_period (int): candle stick period in seconds out of
+            (300, 900, 1800, 7200, 14400, 86400)
+        metrics_path (str): file to write the time spent in each stage
+            and counters to, in Prometheus text format if it ends with
+            `.prom` and as JSON otherwise
+        processes (int): number of processes decoding and aggregating
+            trades, e.g. the number of cores when re-aggregating trades of
+            the trade store
+        skip_inactive (bool): write empty bars for days without volume in
+            the daily chart data instead of requesting their trades, e.g.
+            before an asset pair was listed, at the cost of one more
+            request per asset pair
+        resolutions (iterable): resolutions like `bars.RESOLUTIONS`, i.e.
+            ('1T', '5T', '1H', '1D'), of a pyramid of bars built from trades
+            and written next to the bundle, see
+            :class:`~.bars.BarPyramidReader`
+        microstructure (bool): add VWAP, number of trades and buy and sell
+            volume of each bar to the pyramid, which then has at least
+            minute resolution
+        candle_cache (str): directory of a :class:`~.cache.CandleCache`
+            used instead of zipline's cache of the bundle, e.g. to keep the
+            candle sticks of several years in a few large files
+        candle_cache_bytes (int): byte budget of the candle cache, least
+            recently used months are evicted beyond it
 
     Returns:
         ingest function needed by zipline's register.
     """
+    if chart_period is not None:
+        # options of building bars from trades
+        trade_options = [name for name, value in (
+            ('incremental', incremental), ('trade_store', trade_store),
+            ('resolutions', resolutions), ('microstructure', microstructure),
+            ('metrics_path', metrics_path), ('candle_cache', candle_cache))
+            if value]
+        if trade_options:
+            raise ValueError("{} cannot be combined with chart_period".format(
+                ", ".join(trade_options)))
+
     def ingest(environ,
                asset_db_writer,
                minute_bar_writer,
@@ -160,6 +1069,9 @@ def create_bundle(asset_pairs, start=None, end=None):
                # pass these as defaults to make them 'nonlocal' in py2
                start=start,
                end=end):
+        # the calls of fetching the assets are counted as well
+        metrics = get_metrics()
+        metrics.reset()
         if start is None:
             start = start_session
         if end is None:
@@ -173,49 +1085,68 @@ def create_bundle(asset_pairs, start=None, end=None):
         asset_pair_map = {pair.split("_")[1]: pair for pair in asset_pairs}
         sid_map = {k: asset_pair_map[v] for k, v in asset_map.items()}
 
-        data = prepare_data(start, end, sid_map, cache)
-        minute_bar_writer.write(data, show_progress=show_progress)
-    return ingest
+        if chart_period is not None:
+            write_chart_data(start, end, sid_map, chart_period, calendar,
+                             minute_bar_writer, daily_bar_writer,
+                             show_progress)
+            return
 
+        last_days = dict()
+        daily_bars = dict()
+        last_ingestion = None
+        if incremental:
+            last_ingestion = find_last_ingestion(output_dir)
+        if last_ingestion is not None:
+            _logger.info("Appending to ingestion {}".format(last_ingestion))
+            last_days = copy_minute_bars(
+                last_ingestion, minute_bar_writer, asset_df, start_session)
+            daily_bars = read_daily_bars(last_ingestion, asset_df, last_days)
+        pyramid = None
+        freqs, fields = resolutions, FIELDS
+        if microstructure:
+            fields += MICROSTRUCTURE_FIELDS
+            if freqs is None:
+                freqs = ('1T',)
+        if freqs is not None:
+            pyramid_dir = os.path.join(output_dir, PYRAMID_DIR)
+            if last_days:
+                last_sids = read_sids(last_ingestion)
+                copy_pyramid(last_ingestion, pyramid_dir,
+                             {last_sids[asset_df['symbol'][sid]]: sid
+                              for sid in last_days},
+                             freqs, fields)
+            pyramid = BarPyramidWriter(pyramid_dir, freqs, fields)
 
-class PoloniexCalendar(TradingCalendar):
-    """Trading Calender of Poloniex Exchange
-    """
-    @property
-    def name(self):
-        return "POLONIEX"
-
-    @property
-    def tz(self):
-        return timezone('UTC')
-
-    @property
-    def open_times(self):
-        return ((None, time(0, 0)),)
-
-    @property
-    def close_times(self):
-        return ((None, time(23, 59)),)
-
-    @lazyval
-    def day(self):
-        return CustomBusinessDay(
-            weekmask='Mon Tue Wed Thu Fri Sat Sun'
-        )
-
-
-register_calendar('POLONIEX', PoloniexCalendar())
-# The following is necessary because zipline's developer hard-coded NYSE
-# everywhere in run_algo._run, *DOH*!!!
-deregister_calendar('NYSE')
-register_calendar_alias('NYSE', 'POLONIEX', force=False)
-register(
-    '.test_poloniex',
-    create_bundle(
-        [Pairs.usdt_eth],
-        pd.Timestamp('2016-01-01', tz='utc'),
-        pd.Timestamp('2016-01-31', tz='utc'),
-    ),
-    calendar_name='POLONIEX',
-    minutes_per_day=24*60
-)
+        store = None
+        if trade_store is True:
+            store = TradeStore(default_root(environ))
+        elif trade_store is not None:
+            store = TradeStore(trade_store)
+        if candle_cache is not None:
+            cache = CandleCache(candle_cache, candle_cache_bytes)
+        try:
+            data = prepare_data(start, end, sid_map, cache, workers,
+                                last_days=last_days, store=store,
+                                processes=processes,
+                                skip_inactive=skip_inactive,
+                                microstructure=microstructure)
+            data = collect_daily_bars(data, daily_bars)
+            if pyramid is not None:
+                data = pyramid.collect(data)
+            data = metrics.time_consumer(data, 'bar_write')
+            minute_bar_writer.write(data, show_progress=show_progress)
+        finally:
+            # keep the candle sticks of a failed ingestion for the next one
+            if candle_cache is not None:
+                cache.close()
+        if pyramid is not None:
+            pyramid.close()
+        with metrics.timer('bar_write'):
+            write_daily_bars(daily_bars, calendar, daily_bar_writer,
+                             show_progress)
+        _logger.info("Ingested {} asset pairs with {} API calls".format(
+            len(sid_map), metrics.summary()['counters'].get('api_calls', 0)))
+        metrics.log_summary()
+        if metrics_path is not None:
+            metrics.write(metrics_path)
+    return ingest
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Size-bounded cache of daily candle sticks compacted into monthly blocks
+
+`prepare_data` caches the candle sticks of each symbol id and day. In
+zipline's dataframe cache, each of them is a pickle of its own. Here the
+days of a month are compacted into one block file per symbol id, which
+holds a float32 array per field. Blocks are memory-mapped for reading. An
+index of all blocks and their days is kept in memory, so checking for a key
+needs no disk access. Blocks that have not been used for the longest time
+are evicted once the cache exceeds its byte budget, except for blocks of
+days found in the cache but not yet read. The index is written whenever a
+block is, so that an interrupted ingestion keeps what it wrote, and blocks
+the index does not agree with are dropped when it is read. Values are
+minute bars within their day and are read back with all minutes of the
+day like `prepare_data` writes them. The cache is a drop-in replacement of
+zipline's cache in `prepare_data`::
+
+    with CandleCache('~/.zipline/poloniex_candles', max_bytes=10**10) as cache:
+        for sid, candles in prepare_data(start, end, sid_map, cache):
+            ...
+"""
+import os
+import re
+import json
+import logging
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .bars import FIELD_DTYPES, MINUTES_PER_DAY, empty_value, day_arrays
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+# keys of prepare_data, i.e. "<sid>_<YYYY-MM-DD>" with an optional suffix
+_KEY = re.compile(r'^(.+?)_(\d{4})-(\d{2})-(\d{2})(.*)$')
+_NANOS_PER_MINUTE = 60 * 10**9
+_MINUTE_OFFSETS = (np.arange(MINUTES_PER_DAY, dtype=np.int64) *
+                   _NANOS_PER_MINUTE)
+
+
+def _split_key(key):
+    """Split a key into the name of its block and the day within the month
+
+    Args:
+        key (str): key like `"<sid>_<YYYY-MM-DD>"` with optional suffix
+
+    Returns:
+        tuple: block name and day of month
+    """
+    match = _KEY.match(key)
+    if match is None:
+        raise KeyError(key)
+    prefix, year, month, day, suffix = match.groups()
+    return "{}{}/{}-{}".format(prefix, suffix, year, month), int(day)
+
+
+def _days_in_month(name):
+    return pd.Timestamp(name.rsplit('/', 1)[1] + '-01').days_in_month
+
+
+def _day_start(name, day):
+    return pd.Timestamp("{}-{:02d}".format(name.rsplit('/', 1)[1], day))
+
+
+class CandleCache(object):
+    """Cache of daily candle sticks in monthly blocks with a byte budget
+
+    New days are held back until their block is complete, more than
+    `max_pending` blocks are pending or the cache is flushed, so that each
+    block is written about once. Call `close` or use the cache as context
+    manager to write pending days and the index.
+
+    Args:
+        rootdir (str): directory of the cache
+        max_bytes (int): byte budget of all blocks (default unlimited)
+        max_pending (int): maximum number of blocks with days not written
+    """
+    def __init__(self, rootdir, max_bytes=None, max_pending=16):
+        self.rootdir = os.path.expanduser(rootdir)
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self._index = self._read_index()
+        self._tick = max([block['used'] for block in self._index.values()] +
+                         [0])
+        self._pending = OrderedDict()
+        self._mmaps = OrderedDict()
+        # days found by `__contains__` and not read since, by block name
+        self._pinned = dict()
+
+    def _read_index(self):
+        path = os.path.join(self.rootdir, INDEX_FILE)
+        index = dict()
+        if os.path.exists(path):
+            with open(path) as fh:
+                index = json.load(fh)
+        for name, block in list(index.items()):
+            block['days'] = set(block['days'])
+            # evicted before the index was written
+            if not os.path.exists(self._path(name)):
+                del index[name]
+            else:
+                block['size'] = os.path.getsize(self._path(name))
+        # written before the index was, their days are unknown
+        for dirpath, _, filenames in os.walk(self.rootdir):
+            for filename in filenames:
+                if not filename.endswith('.npy') or filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.rootdir)[:-len('.npy')]
+                if name.replace(os.sep, '/') not in index:
+                    _logger.debug("Removing unindexed block {}".format(name))
+                    os.remove(path)
+        return index
+
+    def _write_index(self):
+        index = {name: dict(block, days=sorted(block['days']))
+                 for name, block in self._index.items()}
+        if not os.path.isdir(self.rootdir):
+            os.makedirs(self.rootdir)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=self.rootdir)
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(index, fh)
+        os.rename(tmp_path, os.path.join(self.rootdir, INDEX_FILE))
+
+    def _path(self, name):
+        return os.path.join(self.rootdir, name + '.npy')
+
+    def _touch(self, name):
+        self._tick += 1
+        self._index[name]['used'] = self._tick
+
+    @property
+    def nbytes(self):
+        """Size of all written blocks in bytes
+        """
+        return sum(block['size'] for block in self._index.values())
+
+    def __contains__(self, key):
+        try:
+            name, day = _split_key(key)
+        except KeyError:
+            return False
+        if name in self._pending and day in self._pending[name]['days']:
+            return True
+        if name in self._index and day in self._index[name]['days']:
+            # keep the block until the day is read
+            self._pinned.setdefault(name, set()).add(day)
+            return True
+        return False
+
+    def __setitem__(self, key, candles):
+        name, day = _split_key(key)
+        nanos = candles.index.values.astype('datetime64[ns]').astype(np.int64)
+        offsets = nanos - _day_start(name, day).value
+        if (not offsets.size or offsets.min() < 0 or
+                offsets.max() >= MINUTES_PER_DAY * _NANOS_PER_MINUTE or
+                (offsets % _NANOS_PER_MINUTE).any()):
+            raise ValueError("Candle sticks of {} are no minute bars within "
+                             "its day".format(key))
+        fields = list(candles.columns)
+        _, arrays = day_arrays(candles, fields)
+        block = self._pending.get(name)
+        if block is None:
+            block = self._pending[name] = dict(fields=fields, days=dict())
+        block['days'][day] = arrays
+        if len(block['days']) == _days_in_month(name):
+            self._flush_block(name)
+        while len(self._pending) > self.max_pending:
+            self._flush_block(next(iter(self._pending)))
+
+    def __getitem__(self, key):
+        name, day = _split_key(key)
+        pending = self._pending.get(name)
+        if pending is not None and day in pending['days']:
+            fields = pending['fields']
+            arrays = pending['days'][day]
+            values = np.column_stack([arrays[field] for field in fields])
+        elif name in self._index and day in self._index[name]['days']:
+            fields = self._index[name]['fields']
+            lo = (day - 1) * MINUTES_PER_DAY
+            values = self._mmap(name)[:, lo:lo + MINUTES_PER_DAY].T.copy()
+            self._touch(name)
+            self._unpin(name, day)
+        else:
+            raise KeyError(key)
+        start = _day_start(name, day)
+        nanos = start.value + _MINUTE_OFFSETS
+        index = pd.DatetimeIndex(nanos.view('M8[ns]'), tz='UTC', name='date')
+        # one float32 block like the candle sticks, integer fields apart
+        candles = pd.DataFrame(values.astype(np.float32, copy=False),
+                               index=index, columns=fields)
+        dtypes = {field: FIELD_DTYPES[field] for field in fields
+                  if FIELD_DTYPES[field] != np.float32}
+        return candles.astype(dtypes) if dtypes else candles
+
+    def _unpin(self, name, day):
+        days = self._pinned.get(name)
+        if days is not None:
+            days.discard(day)
+            if not days:
+                del self._pinned[name]
+
+    def _mmap(self, name):
+        if name not in self._mmaps:
+            self._mmaps[name] = np.load(self._path(name), mmap_mode='r')
+            if len(self._mmaps) > self.max_pending:
+                self._mmaps.popitem(last=False)
+        return self._mmaps[name]
+
+    def _flush_block(self, name):
+        pending = self._pending.pop(name)
+        fields = pending['fields']
+        written = self._index.get(name)
+        if written is not None and written['fields'] == fields:
+            block = np.array(self._mmap(name))
+            days = written['days']
+        else:
+            n_minutes = _days_in_month(name) * MINUTES_PER_DAY
+            block = np.empty((len(fields), n_minutes), dtype=np.float32)
+            for row, field in enumerate(fields):
+                block[row] = empty_value(field)
+            days = set()
+        for day, arrays in pending['days'].items():
+            lo = (day - 1) * MINUTES_PER_DAY
+            for row, field in enumerate(fields):
+                block[row, lo:lo + MINUTES_PER_DAY] = arrays[field]
+        path = self._path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fh:
+            np.save(fh, block)
+        os.rename(tmp_path, path)
+        self._mmaps.pop(name, None)
+        self._index[name] = dict(fields=fields,
+                                 days=days | set(pending['days']),
+                                 size=os.path.getsize(path), used=0)
+        self._touch(name)
+        self._evict(keep=name)
+        self._write_index()
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        total = self.nbytes
+        by_use = sorted(self._index,
+                        key=lambda name: self._index[name]['used'])
+        for name in by_use:
+            if total <= self.max_bytes:
+                break
+            if name == keep or name in self._pinned:
+                continue
+            total -= self._index.pop(name)['size']
+            self._mmaps.pop(name, None)
+            os.remove(self._path(name))
+            _logger.debug("Evicted block {} from candle cache".format(name))
+
+    def flush(self):
+        """Write all pending days and the index
+        """
+        while self._pending:
+            self._flush_block(next(iter(self._pending)))
+        self._evict(keep=None)
+        self._write_index()
+
+    def close(self):
+        """Flush the cache and release memory-mapped blocks
+        """
+        self.flush()
+        self._mmaps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
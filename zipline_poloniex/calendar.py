@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Trading calendar of Poloniex exchange
+"""
+import os
+import tempfile
+from datetime import time
+
+import numpy as np
+import pandas as pd
+from pytz import timezone
+from pandas.tseries.offsets import Day
+from zipline.utils.calendars import TradingCalendar
+from zipline.utils.memoize import lazyval
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_NANOS_PER_MINUTE = 60 * 10**9
+_NANOS_PER_DAY = 24 * 60 * _NANOS_PER_MINUTE
+# offset of the last minute of a session from its midnight
+_CLOSE_OFFSET = _NANOS_PER_DAY - _NANOS_PER_MINUTE
+# minutes cached beyond the last session of a calendar
+_CACHE_SLACK = 365 * _NANOS_PER_DAY
+
+
+class PoloniexCalendar(TradingCalendar):
+    """Trading Calender of Poloniex Exchange
+
+    Trading is continuous, i.e. every day is a session from 00:00 to 23:59
+    UTC, so sessions and minutes are computed with plain arithmetic instead
+    of zipline's business day machinery and every minute maps to its
+    session in constant time.
+
+    If a cache directory is given, the minutes are stored there per first
+    and last session and memory-mapped by later instances, also of other
+    processes and with earlier last sessions. The files are never removed,
+    so prefer a cache directory for calendars with fixed bounds.
+
+    Args:
+        *args: arguments of zipline's `TradingCalendar`, i.e. start and end
+        cache_dir (str): directory caching the minutes of the calendar
+    """
+    def __init__(self, *args, **kwargs):
+        self.cache_dir = kwargs.pop('cache_dir', None)
+        super(PoloniexCalendar, self).__init__(*args, **kwargs)
+
+    @property
+    def name(self):
+        return "POLONIEX"
+
+    @property
+    def tz(self):
+        return timezone('UTC')
+
+    @property
+    def open_times(self):
+        return ((None, time(0, 0)),)
+
+    @property
+    def close_times(self):
+        return ((None, time(23, 59)),)
+
+    @lazyval
+    def day(self):
+        return Day()
+
+    @lazyval
+    def all_minutes(self):
+        first = _to_nanos(self.schedule['market_open'].values[0])
+        last = _to_nanos(self.schedule['market_close'].values[-1])
+        if self.cache_dir is None:
+            nanos = _minute_nanos(first, last)
+        else:
+            nanos = _cached_minute_nanos(self.cache_dir, first, last)
+        return pd.DatetimeIndex(nanos.view('datetime64[ns]'), tz='UTC')
+
+    def minute_to_session_label(self, dt, direction="next"):
+        nanos = pd.Timestamp(dt).value
+        session = nanos - nanos % _NANOS_PER_DAY
+        if (nanos - session > _CLOSE_OFFSET or
+                not self.first_trading_session.value <= session <=
+                self.last_trading_session.value):
+            return super(PoloniexCalendar, self).minute_to_session_label(
+                dt, direction)
+        return pd.Timestamp(session, tz='UTC')
+
+    def minute_index_to_session_labels(self, index):
+        nanos = _to_nanos(index.values)
+        if not nanos.size:
+            return pd.DatetimeIndex([], tz='UTC')
+        sessions = nanos - nanos % _NANOS_PER_DAY
+        if ((nanos - sessions > _CLOSE_OFFSET).any() or
+                sessions.min() < self.first_trading_session.value or
+                sessions.max() > self.last_trading_session.value):
+            base = super(PoloniexCalendar, self)
+            return base.minute_index_to_session_labels(index)
+        return pd.DatetimeIndex(sessions.view('datetime64[ns]'), tz='UTC')
+
+
+def _to_nanos(values):
+    return values.astype('datetime64[ns]').astype(np.int64)
+
+
+def _minute_nanos(first, last):
+    """All minutes from first to last as nanoseconds since epoch
+
+    Args:
+        first (int): first minute in nanoseconds
+        last (int): last minute in nanoseconds
+
+    Returns:
+        numpy.ndarray: int64 nanoseconds
+    """
+    # np.arange computes the length in floating point, which is off by one
+    # for nanoseconds since epoch
+    n_minutes = int(last - first) // _NANOS_PER_MINUTE + 1
+    return first + _NANOS_PER_MINUTE * np.arange(n_minutes, dtype=np.int64)
+
+
+def _cached_minute_nanos(cache_dir, first, last):
+    """Memory-mapped minutes of `_minute_nanos` written on first use
+
+    Minutes are cached in files named by their first and last minute and
+    sliced to the requested last one. Since zipline's default calendar ends
+    a year from today, a file is written for another year beyond the last
+    minute, so that it is not rewritten every day. Files of other ranges
+    are left to the calendars using them.
+
+    Args:
+        cache_dir (str): cache directory
+        first (int): first minute in nanoseconds
+        last (int): last minute in nanoseconds
+
+    Returns:
+        numpy.ndarray: int64 nanoseconds
+    """
+    n_minutes = int(last - first) // _NANOS_PER_MINUTE + 1
+    prefix = 'minutes_{}_'.format(first)
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if not (name.startswith(prefix) and name.endswith('.npy')):
+                continue
+            try:
+                cached_last = int(name[len(prefix):-len('.npy')])
+            except ValueError:
+                continue
+            if cached_last >= last:
+                return np.load(os.path.join(cache_dir, name),
+                               mmap_mode='r')[:n_minutes]
+    else:
+        try:
+            os.makedirs(cache_dir)
+        except OSError:  # created concurrently
+            pass
+    cached_last = last + _CACHE_SLACK
+    path = os.path.join(cache_dir, '{}{}.npy'.format(prefix, cached_last))
+    fd, tmp_path = tempfile.mkstemp(prefix='.', dir=cache_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        np.save(fh, _minute_nanos(first, cached_last))
+    os.rename(tmp_path, path)
+    return np.load(path, mmap_mode='r')[:n_minutes]
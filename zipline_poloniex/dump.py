@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk loading of trade dumps into the trade store
+
+Dumps are CSV files, optionally compressed like `trades.csv.gz`, with one
+trade per row and the columns of `returnTradeHistory`. They are parsed in
+chunks, so files may be larger than memory, split by asset pair and day and
+written to a :class:`~.store.TradeStore`. Bundles created with the same
+`trade_store` then read these days instead of requesting them from the API.
+"""
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .api import TRADE_COLUMNS, TRADE_TYPES
+from .store import STORE_DTYPES
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_dates(values, date_format=DATE_FORMAT):
+    """Convert dates of a dump to seconds since epoch
+
+    Args:
+        values (pandas.Series): dates as strings in UTC or as seconds or
+            milliseconds since epoch
+        date_format (str): format of date strings, None to infer it
+
+    Returns:
+        numpy.ndarray: int64 seconds since epoch
+    """
+    if values.dtype.kind in 'iuf':
+        seconds = values.values.astype(np.int64)
+        if seconds.size and seconds.max() > 10**11:  # milliseconds
+            seconds //= 1000
+        return seconds
+    dates = pd.to_datetime(values, format=date_format, utc=True)
+    return np.asarray(dates.values).astype('datetime64[s]').astype(np.int64)
+
+
+def chunk_to_columns(chunk, date_format=DATE_FORMAT):
+    """Convert a chunk of a dump into columns as stored on disk
+
+    Missing trade ids are set to -1 and a missing `total` is computed from
+    `rate` and `amount`. Types other than those of `api.TRADE_TYPES` raise
+    a ValueError.
+
+    Args:
+        chunk (pandas.DataFrame): rows of a dump
+        date_format (str): format of date strings
+
+    Returns:
+        dict: columns as returned by `store.trades_to_columns`
+    """
+    columns = dict()
+    for col in TRADE_COLUMNS:
+        if col == 'date':
+            values = parse_dates(chunk[col], date_format)
+        elif col == 'type':
+            values = pd.Categorical(chunk[col].values, TRADE_TYPES).codes
+            if (values < 0).any():
+                unknown = np.unique(chunk[col].values[values < 0].astype(str))
+                raise ValueError("Unknown trade types {}".format(
+                    ", ".join(unknown)))
+        elif col in chunk:
+            values = chunk[col].values
+        elif col == 'total':
+            values = columns['rate'] * columns['amount']
+        else:
+            values = np.full(len(chunk), -1)
+        columns[col] = values.astype(STORE_DTYPES[col])
+    return columns
+
+
+def split_days(columns, pairs):
+    """Split columns of trades by asset pair and day
+
+    Args:
+        columns (dict): columns as returned by `chunk_to_columns`
+        pairs (numpy.ndarray): asset pair name of each trade
+
+    Returns:
+        generator of asset pair name, day and columns tuples
+    """
+    pair_names, pair_codes = np.unique(pairs, return_inverse=True)
+    days = columns['date'] // _SECONDS_PER_DAY
+    order = np.lexsort((days, pair_codes))
+    pair_codes, days = pair_codes[order], days[order]
+    starts = np.flatnonzero(np.r_[True, (pair_codes[1:] != pair_codes[:-1]) |
+                                        (days[1:] != days[:-1])])
+    ends = np.r_[starts[1:], order.size]
+    for lo, hi in zip(starts, ends):
+        idx = order[lo:hi]
+        day = pd.Timestamp(int(days[lo]) * _SECONDS_PER_DAY, unit='s',
+                           tz='UTC')
+        yield (pair_names[pair_codes[lo]], day,
+               {col: values[idx] for col, values in columns.items()})
+
+
+def load_dump(path, store, pair=None, pair_column='pair', chunksize=10**6,
+              date_format=DATE_FORMAT):
+    """Stage the trades of a dump in a trade store
+
+    Call `commit` of the store or use `load_dumps` to make them visible.
+
+    Args:
+        path (str): path of the CSV file, compression is inferred from the
+            extension
+        store (:class:`~.store.TradeStore`): store of raw trades
+        pair (str): asset pair of all trades if the dump has no pair column
+        pair_column (str): name of the column holding the asset pair
+        chunksize (int): number of rows parsed at once
+        date_format (str): format of date strings, None to infer it
+
+    Returns:
+        dict: mapping from asset pair name to its first and last day
+    """
+    usecols = set(TRADE_COLUMNS) | set([pair_column])
+    reader = pd.read_csv(path, chunksize=chunksize,
+                         usecols=lambda col: col in usecols)
+    spans = dict()
+    n_rows = 0
+    start_time = time.time()
+    for chunk in reader:
+        columns = chunk_to_columns(chunk, date_format)
+        if pair is not None:
+            pairs = np.full(len(chunk), pair, dtype=object)
+        else:
+            pairs = chunk[pair_column].values
+        for day_pair, day, day_columns in split_days(columns, pairs):
+            store.append(day_pair, day, day_columns)
+            first, last = spans.get(day_pair, (day, day))
+            spans[day_pair] = (min(first, day), max(last, day))
+        n_rows += len(chunk)
+        _logger.debug("Parsed {} rows of {}".format(n_rows, path))
+    elapsed = time.time() - start_time
+    _logger.info("Loaded {} rows of {} in {:.1f}s ({:.0f} rows/s)".format(
+        n_rows, path, elapsed, n_rows / max(elapsed, 1e-9)))
+    return spans
+
+
+def load_dumps(paths, store, pair=None, pair_column='pair', chunksize=10**6,
+               date_format=DATE_FORMAT, fetched=None):
+    """Load trade dumps into a trade store
+
+    All days between the first and last trade of an asset pair are written,
+    days without trades as empty days, so that the first and last day of
+    each asset pair in the dumps are assumed to be complete. Like trades of
+    the API, days that were not over when the dumps were taken are skipped.
+
+    Args:
+        paths (list): paths of the CSV files
+        store (:class:`~.store.TradeStore`): store of raw trades
+        pair (str): asset pair of all trades if the dumps have no pair column
+        pair_column (str): name of the column holding the asset pair
+        chunksize (int): number of rows parsed at once
+        date_format (str): format of date strings, None to infer it
+        fetched (pandas.Timestamp): time the dumps were taken at, defaults
+            to now
+
+    Returns:
+        list: tuples of asset pair name and day written
+    """
+    if fetched is None:
+        fetched = pd.Timestamp.utcnow()
+    spans = dict()
+    for path in paths:
+        for day_pair, (first, last) in load_dump(
+                path, store, pair, pair_column, chunksize,
+                date_format).items():
+            if day_pair in spans:
+                first = min(first, spans[day_pair][0])
+                last = max(last, spans[day_pair][1])
+            spans[day_pair] = (first, last)
+    written = store.commit(fetched)
+    empty = {col: np.empty(0, dtype=dtype)
+             for col, dtype in STORE_DTYPES.items()}
+    for day_pair, (first, last) in spans.items():
+        for day in pd.date_range(first, last, freq='D'):
+            if (day + pd.Timedelta(days=1)).value > fetched.value:
+                continue
+            if (day_pair, day) not in store:
+                store.write_columns(day_pair, day, empty)
+                written.append((day_pair, day))
+    return written
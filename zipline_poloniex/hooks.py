@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight registration of the Poloniex calendar and test bundle
+
+Only factories are registered with zipline, so the calendar is built and
+the bundle machinery imported when a Poloniex calendar or bundle is actually
+used and not on every zipline command loading `~/.zipline/extension.py`.
+Registration itself waits until zipline's bundles are imported, so that
+importing this package neither imports zipline nor changes its calendars.
+"""
+import os
+import sys
+import importlib.util
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_registered = False
+_HOOKED_MODULE = 'zipline.data.bundles'
+
+
+def poloniex_calendar(*args, **kwargs):
+    """Factory of the Poloniex calendar
+
+    The minutes of the calendar are cached in the directory of the
+    environment variable `ZIPLINE_POLONIEX_CALENDAR_CACHE` if it is set and
+    no other `cache_dir` is given.
+
+    Args:
+        *args: arguments of :class:`~.calendar.PoloniexCalendar`
+        **kwargs: keyword arguments of :class:`~.calendar.PoloniexCalendar`
+
+    Returns:
+        :class:`~.calendar.PoloniexCalendar`: new calendar
+    """
+    from .calendar import PoloniexCalendar
+    if 'ZIPLINE_POLONIEX_CALENDAR_CACHE' in os.environ:
+        kwargs.setdefault('cache_dir',
+                          os.environ['ZIPLINE_POLONIEX_CALENDAR_CACHE'])
+    return PoloniexCalendar(*args, **kwargs)
+
+
+def lazy_bundle(*args, **kwargs):
+    """Ingest function creating the actual one of `create_bundle` when called
+
+    Args:
+        *args: arguments of `bundle.create_bundle`
+        **kwargs: keyword arguments of `bundle.create_bundle`
+
+    Returns:
+        ingest function needed by zipline's register.
+    """
+    def ingest(*ingest_args, **ingest_kwargs):
+        from .bundle import create_bundle
+        return create_bundle(*args, **kwargs)(*ingest_args, **ingest_kwargs)
+    return ingest
+
+
+def _test_bundle(*args, **kwargs):
+    import pandas as pd
+    from .bundle import Pairs, create_bundle
+    ingest = create_bundle(
+        [Pairs.usdt_eth],
+        pd.Timestamp('2016-01-01', tz='utc'),
+        pd.Timestamp('2016-01-31', tz='utc'),
+    )
+    return ingest(*args, **kwargs)
+
+
+class _RegisterOnImport(object):
+    """Finder of `sys.meta_path` registering the hooks once zipline's
+    bundles are imported
+    """
+    def find_spec(self, fullname, path, target=None):
+        if fullname != _HOOKED_MODULE:
+            return None
+        # find the module with all other finders
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        if spec is None or not hasattr(spec.loader, 'exec_module'):
+            sys.meta_path.insert(0, self)
+            return None
+        exec_module = spec.loader.exec_module
+
+        def exec_and_register(module):
+            exec_module(module)
+            _register()
+        spec.loader.exec_module = exec_and_register
+        return spec
+
+
+def register_hooks():
+    """Register the Poloniex calendar and the `.test_poloniex` bundle
+
+    If zipline's bundles are not imported yet, registration is deferred
+    until they are, e.g. by a zipline command or `run_algorithm`.
+    Registering more than once has no effect.
+    """
+    if _registered or any(isinstance(finder, _RegisterOnImport)
+                          for finder in sys.meta_path):
+        return
+    if _HOOKED_MODULE in sys.modules:
+        _register()
+    else:
+        sys.meta_path.insert(0, _RegisterOnImport())
+
+
+def _register():
+    global _registered
+    if _registered:
+        return
+    from zipline.data.bundles import register
+    from zipline.utils.calendars import (
+        deregister_calendar, register_calendar_alias, register_calendar_type)
+    register_calendar_type('POLONIEX', poloniex_calendar, force=True)
+    # The following is necessary because zipline's developer hard-coded NYSE
+    # everywhere in run_algo._run, *DOH*!!!
+    deregister_calendar('NYSE')
+    register_calendar_alias('NYSE', 'POLONIEX', force=False)
+    register(
+        '.test_poloniex',
+        _test_bundle,
+        calendar_name='POLONIEX',
+        minutes_per_day=24*60
+    )
+    _registered = True
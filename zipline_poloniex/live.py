@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Live minute bars of asset pairs built from polled trades
+
+Trades are polled incrementally from `returnTradeHistory` keeping track of
+the last `globalTradeID` of each asset pair. The bar of the current minute
+is updated in place with the new trades only and emitted as soon as the
+minute is closed. Responses capped at the maximum number of trades are
+followed by requests further back, e.g. after a long pause, so that no
+trades are missed. Use it to feed a paper trading loop::
+
+    feed = LiveBars(['USDT_BTC', 'USDT_ETH'])
+    for pair, minute, bar in feed.iter_bars(interval=1.):
+        ...
+"""
+import time
+import logging
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .api import MAX_TRADES, concat_trades, parse_trades, query_api
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+
+class _PairState(object):
+    """Running bar of the current minute of an asset pair
+    """
+    def __init__(self, minute):
+        self.last_id = -1
+        self.last_date = minute * 60
+        self.minute = minute
+        self.reset()
+
+    def reset(self):
+        self.open = self.high = self.low = self.close = np.nan
+        self.volume = 0.
+
+    def update(self, rate, amount):
+        if np.isnan(self.open):
+            self.open = rate[0]
+        self.high = np.fmax(self.high, rate.max())
+        self.low = np.fmin(self.low, rate.min())
+        self.close = rate[-1]
+        self.volume += amount.sum()
+
+    def bar(self):
+        return dict(open=self.open, high=self.high, low=self.low,
+                    close=self.close, volume=self.volume)
+
+
+class LiveBars(object):
+    """Feed of live minute bars of several asset pairs
+
+    Each call of `poll` requests the trades since the last known trade of
+    every asset pair and emits the bars of all minutes closed until then,
+    minutes without trades as bars with NaN prices and zero volume. Trades
+    arriving for an already emitted minute are dropped and counted in
+    `late_trades`. The latency of each emitted bar, i.e. the time between
+    the close of its minute and its emission, is kept in `latencies`.
+
+    Args:
+        pairs (list): asset pair names
+        delay (float): seconds to wait after the close of a minute for
+            late trades before emitting its bar
+        history (int): number of bars kept per asset pair
+        clock: function returning the current time in seconds since epoch
+    """
+    def __init__(self, pairs, delay=0., history=24*60, clock=time.time):
+        self.pairs = list(pairs)
+        self.delay = delay
+        self.clock = clock
+        self.bars = {pair: deque(maxlen=history) for pair in self.pairs}
+        self.latencies = deque(maxlen=history)
+        self.late_trades = 0
+        self._states = dict()
+
+    def _state(self, pair, now):
+        if pair not in self._states:
+            self._states[pair] = _PairState(int(now // 60))
+        return self._states[pair]
+
+    def poll(self):
+        """Request new trades of all asset pairs and emit closed minutes
+
+        Returns:
+            list: tuples of asset pair name, minute as pandas.Timestamp and
+            bar as dictionary of open, high, low, close and volume
+        """
+        emitted = []
+        for pair in self.pairs:
+            now = self.clock()
+            state = self._state(pair, now)
+            columns = self._fetch(pair, state.last_date, int(now))
+            emitted.extend(self.update(pair, columns))
+        emitted.extend(self.close())
+        return emitted
+
+    def _fetch(self, pair, start, end):
+        """Request the trades of a period, paging backwards past the cap"""
+        chunks = []
+        while True:
+            body = query_api('returnTradeHistory',
+                             raw=True,
+                             currencyPair=pair,
+                             start=start,
+                             end=end)
+            columns = parse_trades(body, np.float64)
+            chunks.append(columns)
+            if columns['date'].size < MAX_TRADES:
+                break
+            # the newest trades were returned, continue before the oldest
+            oldest = int(columns['date'].min())
+            if oldest <= start:
+                break
+            if oldest >= end:
+                _logger.warning("Missed trades of {} before {}, more than {} "
+                                "in one second".format(pair, end, MAX_TRADES))
+                break
+            end = oldest
+        if len(chunks) == 1:
+            return chunks[0]
+        # pages overlap in the second of their boundary
+        columns = concat_trades(chunks)
+        _, first = np.unique(columns['globalTradeID'], return_index=True)
+        return {col: values[first] for col, values in columns.items()}
+
+    def update(self, pair, columns):
+        """Fold trades into the bar of the current minute
+
+        Only trades newer than the last known trade are considered, so the
+        cost is proportional to the number of new trades.
+
+        Args:
+            pair (str): asset pair name
+            columns (dict): columns as returned by `api.decode_trades`
+
+        Returns:
+            list: bars of minutes closed by the new trades like `poll`
+        """
+        state = self._state(pair, self.clock())
+        ids = columns['globalTradeID']
+        new = np.flatnonzero(ids > state.last_id)
+        if not new.size:
+            return []
+        new = new[np.argsort(ids[new], kind='mergesort')]
+        date = columns['date'][new]
+        rate = columns['rate'][new]
+        amount = columns['amount'][new]
+        state.last_id = ids[new[-1]]
+        state.last_date = max(state.last_date, date.max())
+
+        minutes = date // 60
+        late = minutes < state.minute
+        if late.any():
+            self.late_trades += int(late.sum())
+            _logger.debug("Dropped {} late trades of {}".format(late.sum(),
+                                                                pair))
+            minutes, rate, amount = minutes[~late], rate[~late], amount[~late]
+        emitted = []
+        if not minutes.size:
+            return emitted
+        starts = np.flatnonzero(np.r_[True, minutes[1:] != minutes[:-1]])
+        ends = np.r_[starts[1:], minutes.size]
+        for lo, hi in zip(starts, ends):
+            if minutes[lo] > state.minute:
+                emitted.extend(self._emit(pair, state, minutes[lo]))
+            state.update(rate[lo:hi], amount[lo:hi])
+        return emitted
+
+    def close(self):
+        """Emit the bars of all minutes closed by now
+
+        Returns:
+            list: bars of closed minutes like `poll`
+        """
+        closed = int((self.clock() - self.delay) // 60)
+        emitted = []
+        for pair in self.pairs:
+            state = self._state(pair, self.clock())
+            if closed > state.minute:
+                emitted.extend(self._emit(pair, state, closed))
+        return emitted
+
+    def _emit(self, pair, state, until):
+        now = self.clock()
+        emitted = []
+        for minute in range(state.minute, until):
+            bar = state.bar()
+            state.reset()
+            stamp = pd.Timestamp(minute * 60, unit='s', tz='UTC')
+            self.bars[pair].append((stamp, bar))
+            self.latencies.append(now - (minute + 1) * 60)
+            emitted.append((pair, stamp, bar))
+        state.minute = until
+        return emitted
+
+    def current(self, pair):
+        """Bar of the current, not yet closed minute
+
+        Args:
+            pair (str): asset pair name
+
+        Returns:
+            dict: open, high, low, close and volume so far
+        """
+        return self._state(pair, self.clock()).bar()
+
+    def to_frame(self, pair):
+        """Emitted bars of an asset pair
+
+        Args:
+            pair (str): asset pair name
+
+        Returns:
+            pandas.DataFrame: minute bars indexed by minute
+        """
+        bars = list(self.bars[pair])
+        index = pd.DatetimeIndex([minute for minute, _ in bars], name='date')
+        return pd.DataFrame([bar for _, bar in bars], index=index,
+                            columns=['open', 'high', 'low', 'close', 'volume'])
+
+    def iter_bars(self, interval=1., max_polls=None):
+        """Poll periodically and yield bars as soon as they are emitted
+
+        Args:
+            interval (float): seconds between the start of two polls
+            max_polls (int): stop after this number of polls (default never)
+
+        Returns:
+            generator of bars like `poll`
+        """
+        n_polls = 0
+        while max_polls is None or n_polls < max_polls:
+            started = time.time()
+            for item in self.poll():
+                yield item
+            n_polls += 1
+            time.sleep(max(0., interval - (time.time() - started)))
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the ingest
+
+Time spent in each stage, e.g. HTTP requests, throttling, decoding or
+writing bars, is recorded per asset pair and day together with counters
+like the number of API calls. Use it to tell whether an ingest is bound by
+the network, the rate limit or the CPU. With several workers, the times of
+all threads add up and may exceed the elapsed time.
+"""
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+STAGES = ('http', 'throttle', 'json_decode', 'column_decode', 'date_parse',
+          'aggregate', 'store_lock', 'store_read', 'store_write', 'cache_read',
+          'cache_write', 'bar_write', 'pyramid_write')
+COUNTERS = ('api_calls', 'window_splits', 'http_retries', 'cache_hits',
+            'inactive_days')
+PROMETHEUS_PREFIX = 'zipline_poloniex'
+
+
+class Metrics(object):
+    """Thread-safe recorder of stage timings and counters
+
+    Asset pair and day are taken from the labels set with `labels` in the
+    current thread unless they are passed explicitly.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded timings and counters
+        """
+        with self._lock:
+            self._timings = dict()
+            self._counters = dict()
+            self._started = time.time()
+
+    def _labels(self, pair, day):
+        if pair is None:
+            pair = getattr(self._local, 'pair', None)
+        if day is None:
+            day = getattr(self._local, 'day', None)
+        if day is not None and not isinstance(day, str):
+            day = day.strftime("%Y-%m-%d")
+        return pair, day
+
+    @contextmanager
+    def labels(self, pair=None, day=None):
+        """Context manager setting asset pair and day of the current thread
+
+        Args:
+            pair (str): asset pair name
+            day (pandas.Timestamp): day being ingested
+        """
+        last = (getattr(self._local, 'pair', None),
+                getattr(self._local, 'day', None))
+        self._local.pair, self._local.day = pair, day
+        try:
+            yield
+        finally:
+            self._local.pair, self._local.day = last
+
+    def add_time(self, stage, seconds, pair=None, day=None):
+        """Record time spent in a stage
+
+        Args:
+            stage (str): name of the stage
+            seconds (float): time spent
+            pair (str): asset pair name
+            day (pandas.Timestamp): day being ingested
+        """
+        key = (stage,) + self._labels(pair, day)
+        with self._lock:
+            count, total = self._timings.get(key, (0, 0.))
+            self._timings[key] = (count + 1, total + seconds)
+
+    @contextmanager
+    def timer(self, stage, pair=None, day=None):
+        """Context manager recording the time spent in its block
+
+        Args:
+            stage (str): name of the stage
+            pair (str): asset pair name
+            day (pandas.Timestamp): day being ingested
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.time() - start, pair, day)
+
+    def time_consumer(self, iterable, stage, pair=None):
+        """Pass items through recording the time the consumer spends on them
+
+        The time between handing out an item and the request of the next one
+        is recorded, e.g. the time a bar writer needs to write a frame.
+
+        Args:
+            iterable: items to pass through
+            stage (str): name of the stage
+            pair (str): asset pair name
+
+        Returns:
+            generator of the items of `iterable`
+        """
+        for item in iterable:
+            start = time.time()
+            yield item
+            self.add_time(stage, time.time() - start, pair)
+
+    def incr(self, counter, value=1, pair=None):
+        """Increment a counter
+
+        Args:
+            counter (str): name of the counter
+            value (int): increment
+            pair (str): asset pair name
+        """
+        key = (counter, self._labels(pair, None)[0])
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def summary(self):
+        """Summary of all recorded timings and counters
+
+        Returns:
+            dict: total seconds and count of each stage, the same per asset
+            pair and day, counters and the elapsed time since the last reset
+        """
+        with self._lock:
+            timings = dict(self._timings)
+            counters = dict(self._counters)
+            elapsed = time.time() - self._started
+        stages = dict()
+        pairs = dict()
+        for (stage, pair, day), (count, total) in sorted(
+                timings.items(), key=lambda item: tuple(map(str, item[0]))):
+            entry = stages.setdefault(stage, dict(seconds=0., count=0))
+            entry['seconds'] += total
+            entry['count'] += count
+            days = pairs.setdefault(str(pair), dict())
+            days.setdefault(str(day), dict())[stage] = total
+        totals = dict()
+        for (counter, pair), value in counters.items():
+            totals[counter] = totals.get(counter, 0) + value
+        return dict(elapsed=elapsed, stages=stages, counters=totals,
+                    pairs=pairs)
+
+    def to_json(self):
+        """Summary in JSON format
+
+        Returns:
+            str: JSON document of `summary`
+        """
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Timings and counters per asset pair in Prometheus text format
+
+        Returns:
+            str: metrics in Prometheus exposition format
+        """
+        with self._lock:
+            timings = dict(self._timings)
+            counters = dict(self._counters)
+        seconds = dict()
+        calls = dict()
+        for (stage, pair, _), (count, total) in timings.items():
+            seconds[(stage, pair)] = seconds.get((stage, pair), 0.) + total
+            calls[(stage, pair)] = calls.get((stage, pair), 0) + count
+
+        def labels(**kwargs):
+            return ','.join('{}="{}"'.format(k, v) for k, v in
+                            sorted(kwargs.items()) if v is not None)
+
+        lines = []
+        for name, description, samples in (
+                ('stage_seconds_total', "Time spent in each stage of the "
+                 "ingest", seconds),
+                ('stage_calls_total', "Number of times each stage of the "
+                 "ingest was entered", calls)):
+            name = '{}_{}'.format(PROMETHEUS_PREFIX, name)
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} counter'.format(name))
+            for (stage, pair), value in sorted(samples.items(), key=str):
+                lines.append('{}{{{}}} {!r}'.format(
+                    name, labels(stage=stage, pair=pair), value))
+        for counter in sorted(set(counter for counter, _ in counters)):
+            name = '{}_{}_total'.format(PROMETHEUS_PREFIX, counter)
+            lines.append('# TYPE {} counter'.format(name))
+            for (_, pair), value in sorted(
+                    ((k, v) for k, v in counters.items() if k[0] == counter),
+                    key=str):
+                lines.append('{}{{{}}} {}'.format(name, labels(pair=pair),
+                                                  value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file
+
+        Files ending with `.prom` are written in Prometheus text format, all
+        others as JSON summary.
+
+        Args:
+            path (str): path of the file
+        """
+        if path.endswith('.prom'):
+            text = self.to_prometheus()
+        else:
+            text = self.to_json()
+        with open(path, 'w') as fh:
+            fh.write(text)
+
+    def log_summary(self, logger=_logger):
+        """Log the time spent in each stage, largest first
+
+        Args:
+            logger: logger to use
+        """
+        summary = self.summary()
+        stages = sorted(summary['stages'].items(),
+                        key=lambda item: -item[1]['seconds'])
+        logger.info("Ingest took {:.1f}s: {}".format(
+            summary['elapsed'],
+            ', '.join('{} {:.1f}s'.format(stage, entry['seconds'])
+                      for stage, entry in stages)))
+        logger.info("Counters: {}".format(
+            ', '.join('{} {}'.format(counter, value) for counter, value in
+                      sorted(summary['counters'].items()))))
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Get the metrics recorded by all modules of this package
+
+    Returns:
+        :class:`Metrics`: shared metrics
+    """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """Set the metrics recorded by all modules of this package
+
+    Args:
+        metrics (:class:`Metrics`): new shared metrics
+    """
+    global _metrics
+    _metrics = metrics
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent store of raw trades partitioned by asset pair and day
+
+A store can be shared by all ingests on a machine, e.g. the one in
+`default_root`. Fetches of the same days are then serialized with file
+locks, so concurrent ingests wait for a fetch in flight and read its
+result instead of fetching the days again.
+"""
+import os
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .api import TRADE_COLUMNS, TRADE_TYPES, trades_to_frame
+from .utils import file_lock
+
+__author__ = "Florian Wilhelm"
+__copyright__ = "Florian Wilhelm"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+STORE_DTYPES = dict(globalTradeID=np.int64, tradeID=np.int64, date=np.int64,
+                    type=np.int8, rate=np.float32, amount=np.float32,
+                    total=np.float32)
+
+
+def default_root(environ=None):
+    """Directory of the trade store shared by all bundles of a machine
+
+    Taken from `ZIPLINE_POLONIEX_STORE` if set, otherwise
+    `poloniex_trades` in zipline's root directory.
+
+    Args:
+        environ (mapping): environment (default `os.environ`)
+
+    Returns:
+        str: directory of the store
+    """
+    if environ is None:
+        environ = os.environ
+    if 'ZIPLINE_POLONIEX_STORE' in environ:
+        return environ['ZIPLINE_POLONIEX_STORE']
+    from zipline.utils.paths import zipline_root
+    return os.path.join(zipline_root(environ), 'poloniex_trades')
+
+
+def trades_to_columns(trades):
+    """Convert a dataframe of trades into columns as stored on disk
+
+    Args:
+        trades (pandas.DataFrame): trades with `date` as column
+
+    Returns:
+        dict: column name to numpy.ndarray with `date` as int64 seconds
+        since epoch and `type` as int8 codes of `api.TRADE_TYPES`
+    """
+    columns = dict()
+    for col in TRADE_COLUMNS:
+        values = trades[col]
+        if col == 'date':
+            values = values.values.astype('datetime64[s]').astype(np.int64)
+        elif col == 'type':
+            values = pd.Categorical(values, TRADE_TYPES).codes
+        else:
+            values = values.values
+        columns[col] = values
+    return columns
+
+
+class TradeStore(object):
+    """Store of raw trades as one NumPy file per column, asset pair and day
+
+    Files are laid out as `<root>/<pair>/<YYYY-MM-DD>/<column>.npy` and are
+    read memory-mapped, so that reading a range of days or a subset of
+    columns only touches the required files. Trades of a day are sorted by
+    date. A day is only visible once all of its columns were written.
+
+    Args:
+        root (str): root directory of the store
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, pair, day):
+        return os.path.join(self.root, pair, day.strftime("%Y-%m-%d"))
+
+    def __contains__(self, key):
+        pair, day = key
+        return os.path.isdir(self._path(pair, day))
+
+    def days(self, pair):
+        """Days of an asset pair available in the store
+
+        Args:
+            pair (str): asset pair name
+
+        Returns:
+            pandas.DatetimeIndex: available days
+        """
+        path = os.path.join(self.root, pair)
+        names = os.listdir(path) if os.path.isdir(path) else []
+        return pd.DatetimeIndex(
+            sorted(name for name in names if not name.startswith('.')),
+            tz='UTC')
+
+    def covers(self, pair, start, end):
+        """Check if all days of a period are available
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period
+
+        Returns:
+            bool: True if all days are available
+        """
+        return all((pair, day) in self for day in _days(start, end))
+
+    def spans(self, pair, start, end):
+        """Split a period into runs of days that are available or missing
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+
+        Returns:
+            list: tuples of start, inclusive end and True if available for
+            each run of days, clipped to the period
+        """
+        spans = []
+        for day in _days(start, end):
+            available = (pair, day) in self
+            day_end = day + pd.Timedelta(days=1, seconds=-1)
+            if spans and spans[-1][2] == available:
+                spans[-1] = (spans[-1][0], min(day_end, end), available)
+            else:
+                spans.append((max(day, start), min(day_end, end), available))
+        return spans
+
+    @contextmanager
+    def lock(self, pair, start, end):
+        """Context manager locking all days of a period across processes
+
+        Days are locked in chronological order, so overlapping periods
+        cannot deadlock. Hold the lock while checking for and fetching
+        missing days to fetch them only once. Lock files are removed on
+        release.
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+        """
+        path = os.path.join(self.root, '.locks', pair)
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:  # created concurrently
+                pass
+        locks = []
+        try:
+            for day in _days(start, end):
+                lock = file_lock(os.path.join(
+                    path, day.strftime("%Y-%m-%d") + '.lock'), remove=True)
+                lock.__enter__()
+                locks.append(lock)
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.__exit__(None, None, None)
+
+    def write(self, pair, day, trades):
+        """Write the trades of a single day
+
+        Args:
+            pair (str): asset pair name
+            day (pandas.Timestamp): day of the trades
+            trades (pandas.DataFrame): trades with `date` as column
+        """
+        self.write_columns(pair, day, trades_to_columns(trades))
+
+    def write_columns(self, pair, day, columns):
+        """Write the trades of a single day given as columns
+
+        Args:
+            pair (str): asset pair name
+            day (pandas.Timestamp): day of the trades
+            columns (dict): columns as returned by `trades_to_columns`
+        """
+        path = self._path(pair, day)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            try:
+                os.makedirs(parent)
+            except OSError:  # created concurrently
+                pass
+        order = np.argsort(columns['date'], kind='mergesort')
+        tmp_path = tempfile.mkdtemp(prefix='.', dir=parent)
+        for col, values in columns.items():
+            np.save(os.path.join(tmp_path, col + '.npy'), values[order])
+        try:
+            os.rename(tmp_path, path)
+        except OSError:  # written concurrently
+            shutil.rmtree(tmp_path)
+
+    def write_range(self, pair, start, end, trades, fetched=None):
+        """Write trades of a period, split into days
+
+        Only days completely contained in the period and over by the time
+        the trades were fetched are written.
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period
+            trades (pandas.DataFrame): trades with `date` as column
+            fetched (pandas.Timestamp): time the trades were fetched at,
+                defaults to now
+        """
+        self.write_columns_range(pair, start, end, trades_to_columns(trades),
+                                 fetched)
+
+    def write_columns_range(self, pair, start, end, columns, fetched=None):
+        """Write trades of a period given as columns, split into days
+
+        Only days completely contained in the period and over by the time
+        the trades were fetched are written, since trades of a day still
+        going on would be served as all trades of the day later on.
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period
+            columns (dict): columns as returned by `trades_to_columns` or
+                `api.decode_trades`
+            fetched (pandas.Timestamp): time the trades were fetched at,
+                defaults to now
+        """
+        if fetched is None:
+            fetched = pd.Timestamp.utcnow()
+        if isinstance(columns['type'], pd.Categorical):
+            columns = dict(columns, type=columns['type'].codes)
+        order = np.argsort(columns['date'], kind='mergesort')
+        columns = {col: values[order] for col, values in columns.items()}
+        for day in _days(start, end):
+            day_end = day + pd.Timedelta(days=1)
+            if day < start or day_end - pd.Timedelta(seconds=1) > end:
+                continue
+            if day_end.value > fetched.value:
+                continue
+            if (pair, day) in self:
+                continue
+            lo, hi = np.searchsorted(
+                columns['date'],
+                [day.value // 10**9, day_end.value // 10**9])
+            self.write_columns(pair, day, {col: values[lo:hi]
+                                           for col, values in columns.items()})
+
+    def _staging_path(self, pair, day):
+        return os.path.join(self.root, '.staging', pair,
+                            day.strftime("%Y-%m-%d"))
+
+    def append(self, pair, day, columns):
+        """Stage a chunk of trades of a single day
+
+        Chunks of a day may be appended in any order, also concurrently,
+        and only become visible with `commit`, so days can be assembled
+        from sources larger than memory.
+
+        Args:
+            pair (str): asset pair name
+            day (pandas.Timestamp): day of the trades
+            columns (dict): columns as returned by `trades_to_columns` or
+                `api.decode_trades`
+        """
+        if isinstance(columns['type'], pd.Categorical):
+            columns = dict(columns, type=columns['type'].codes)
+        path = self._staging_path(pair, day)
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:  # created concurrently
+                pass
+        fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.npz', dir=path)
+        with os.fdopen(fd, 'wb') as fh:
+            np.savez(fh, **columns)
+        # hidden while written, the name is unique already
+        os.rename(tmp_path, os.path.join(path, os.path.basename(tmp_path)[1:]))
+
+    def staged(self):
+        """Days with staged chunks of trades
+
+        Returns:
+            list: tuples of asset pair name and day
+        """
+        path = os.path.join(self.root, '.staging')
+        if not os.path.isdir(path):
+            return []
+        return [(pair, pd.Timestamp(day, tz='UTC'))
+                for pair in sorted(os.listdir(path))
+                for day in sorted(os.listdir(os.path.join(path, pair)))]
+
+    def commit(self, fetched=None):
+        """Write all staged days to the store
+
+        Days already in the store are kept and their staged chunks dropped.
+        Staged chunks of days not over by the time the trades were fetched
+        are dropped as well, like in `write_columns_range`.
+
+        Args:
+            fetched (pandas.Timestamp): time the staged trades were fetched
+                at, defaults to now
+
+        Returns:
+            list: tuples of asset pair name and day written
+        """
+        if fetched is None:
+            fetched = pd.Timestamp.utcnow()
+        written = []
+        for pair, day in self.staged():
+            path = self._staging_path(pair, day)
+            over = (day + pd.Timedelta(days=1)).value <= fetched.value
+            if over and (pair, day) not in self:
+                chunks = _load_chunks(path)
+                if chunks:
+                    self.write_columns(pair, day, {
+                        col: np.concatenate([chunk[col] for chunk in chunks])
+                        for col in chunks[0]})
+                    written.append((pair, day))
+            # also days without chunks, e.g. left by a crashed append, and
+            # days removed meanwhile by a concurrent commit
+            shutil.rmtree(path, ignore_errors=True)
+        return written
+
+    def read_columns(self, pair, start, end, columns=None):
+        """Read the trades of a period as columns
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+            columns (list): columns to read (default all)
+
+        Returns:
+            dict: column name to numpy.ndarray
+        """
+        if columns is None:
+            columns = TRADE_COLUMNS
+        start_secs, end_secs = start.value // 10**9, end.value // 10**9
+        parts = {col: [] for col in columns}
+        for day in _days(start, end):
+            path = self._path(pair, day)
+            if not os.path.isdir(path):
+                continue
+            dates = np.load(os.path.join(path, 'date.npy'), mmap_mode='r')
+            lo, hi = np.searchsorted(dates, [start_secs, end_secs + 1])
+            for col in columns:
+                values = np.load(os.path.join(path, col + '.npy'),
+                                 mmap_mode='r')
+                parts[col].append(values[lo:hi])
+        return {col: np.concatenate(parts[col]) if parts[col]
+                else np.empty(0, dtype=STORE_DTYPES[col])
+                for col in columns}
+
+    def read(self, pair, start, end, columns=None):
+        """Read the trades of a period
+
+        Args:
+            pair (str): asset pair name
+            start (pandas.Timestamp): start of period
+            end (pandas.Timestamp): end of period, inclusive
+            columns (list): columns to read (default all)
+
+        Returns:
+            pandas.DataFrame: dataframe containing period's trades
+        """
+        data = self.read_columns(pair, start, end, columns)
+        if 'type' in data:
+            data['type'] = pd.Categorical.from_codes(data['type'], TRADE_TYPES)
+        return trades_to_frame(data)
+
+
+def _days(start, end):
+    return pd.date_range(start.normalize(), end.normalize(), freq='D')
+
+
+def _load_chunks(path):
+    """Load the chunks staged in a directory
+
+    Hidden files of appends still writing or crashed are skipped.
+
+    Args:
+        path (str): staging directory of a day
+
+    Returns:
+        list: dictionaries of columns, empty if the directory has no chunks
+        or was removed meanwhile
+    """
+    chunks = []
+    try:
+        for name in sorted(os.listdir(path)):
+            if name.startswith('.'):
+                continue
+            with np.load(os.path.join(path, name)) as chunk:
+                chunks.append({col: chunk[col] for col in chunk.files})
+    except (IOError, OSError):  # committed concurrently
+        return []
+    return chunks
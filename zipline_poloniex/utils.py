@@ -2,15 +2,26 @@
 """
 Additional utilities
 """
+import os
 import sys
 import time
 import logging
 import functools
-from math import fabs
+import threading
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 from pytz import timezone
 
+from .metrics import get_metrics
+
 __author__ = "Florian Wilhelm"
 __copyright__ = "Florian Wilhelm"
 __license__ = "mit"
@@ -32,12 +43,157 @@ def unix_time(dt):
     return (dt - epoch).total_seconds()
 
 
-def throttle(calls, seconds=1):
+@contextmanager
+def file_lock(path, remove=False):
+    """Context manager holding an exclusive lock on a file across processes
+
+    The file is created if it does not exist. If it is removed on release,
+    waiting processes notice that they locked a removed file and lock the
+    file created anew instead. Only POSIX systems are supported.
+
+    Args:
+        path (str): path of the lock file
+        remove (bool): remove the file when the lock is released, e.g. for
+            locks of many keys that would otherwise pile up
+
+    Returns:
+        file object opened for reading and writing
+    """
+    if fcntl is None:
+        raise RuntimeError("File locks are not supported on this platform")
+    while True:
+        fh = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+')
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            current = os.stat(path).st_ino == os.fstat(fh.fileno()).st_ino
+        except OSError:  # removed while waiting
+            current = False
+        if current:
+            break
+        fh.close()
+    with fh:
+        try:
+            yield fh
+        finally:
+            # written data must be visible before others get the lock
+            fh.flush()
+            if remove:
+                os.remove(path)
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket rate limiter
+
+    The bucket is refilled with `rate` tokens per second up to `capacity`.
+    Each acquire takes constant time and holds a lock only for the
+    arithmetic, never while sleeping. Reservations may drive the bucket
+    into debt, which queues concurrent callers fairly.
+
+    With the default capacity of one token, calls are spaced evenly. A
+    larger capacity allows bursts, so up to `capacity + rate` calls may
+    happen within one second.
+
+    Args:
+        rate (float): number of tokens per second
+        capacity (float): maximum burst of tokens (default 1)
+    """
+    def __init__(self, rate, capacity=1):
+        assert rate > 0, 'rate must be positive'
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last = self._now()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _now():
+        return time.time()
+
+    def _update(self, tokens, max_wait):
+        now = self._now()
+        elapsed = max(0., now - self._last)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last = now
+        wait = max(0., (tokens - self._tokens) / self.rate)
+        if max_wait is not None and wait > max_wait:
+            return None
+        self._tokens -= tokens
+        return wait
+
+    def _take(self, tokens, max_wait):
+        with self._lock:
+            return self._update(tokens, max_wait)
+
+    def reserve(self, tokens=1):
+        """Reserve tokens without blocking
+
+        Args:
+            tokens (float): number of tokens
+
+        Returns:
+            float: seconds to wait before the tokens may be used
+        """
+        return self._take(tokens, None)
+
+    def acquire(self, tokens=1, blocking=True, timeout=None):
+        """Acquire tokens
+
+        Args:
+            tokens (float): number of tokens
+            blocking (bool): wait until the tokens are available
+            timeout (float): maximum number of seconds to wait
+
+        Returns:
+            bool: True if the tokens were acquired
+        """
+        wait = self._take(tokens, timeout if blocking else 0.)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class FileTokenBucket(TokenBucket):
+    """Token bucket rate limiter shared by all processes using the same file
+
+    The state of the bucket is kept in `path` and updated under an exclusive
+    file lock, so concurrent ingests on one host share a single budget.
+
+    Args:
+        path (str): path of the state file
+        rate (float): number of tokens per second
+        capacity (float): maximum burst of tokens (default 1)
+    """
+    def __init__(self, path, rate, capacity=1):
+        super(FileTokenBucket, self).__init__(rate, capacity)
+        self.path = path
+
+    def _take(self, tokens, max_wait):
+        with self._lock, file_lock(self.path) as fh:
+            state = fh.read().split()
+            if len(state) == 2:
+                self._tokens, self._last = float(state[0]), float(state[1])
+            wait = self._update(tokens, max_wait)
+            fh.seek(0)
+            fh.truncate()
+            fh.write("{!r} {!r}".format(self._tokens, self._last))
+            return wait
+
+
+def throttle(calls, seconds=1, bucket=None):
     """Decorator for throttling a function to number of calls per seconds
 
+    Calls are spaced evenly by `seconds / calls`, so that no interval of
+    `seconds` holds more than `calls` calls. The limiter is available as
+    attribute `bucket` of the wrapped function and can be replaced, e.g. by
+    a :class:`FileTokenBucket` to share the budget with other processes.
+
     Args:
         calls (int): number of calls per interval
         seconds (int): number of seconds in interval
+        bucket (:class:`TokenBucket`): limiter to use instead of a new one
 
     Returns:
         wrapped function
@@ -46,32 +202,63 @@ def throttle(calls, seconds=1):
     assert isinstance(seconds, int), 'number of seconds must be integer'
 
     def wraps(func):
-        # keeps track of the last calls
-        last_calls = list()
+        logger = logging.getLogger(func.__module__)
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            curr_time = time.time()
-            if last_calls:
-                # remove calls from last_calls list older then interval in seconds
-                idx_old_calls = [i for i, t in enumerate(last_calls) if t < curr_time - seconds]
-                if idx_old_calls:
-                    del last_calls[:idx_old_calls[-1]]
-            if len(last_calls) >= calls:
-                idx = len(last_calls) - calls
-                delta = fabs(1 - curr_time + last_calls[idx])
-                logger = logging.getLogger(func.__module__)
-                logger.debug("Stalling call to {} for {}s".format(func.__name__, delta))
+            delta = wrapper.bucket.reserve()
+            if delta > 0:
+                logger.debug("Stalling call to {} for {}s".format(
+                    func.__name__, delta))
+                get_metrics().add_time('throttle', delta)
                 time.sleep(delta)
-            resp = func(*args, **kwargs)
-            last_calls.append(time.time())
-            return resp
+            return func(*args, **kwargs)
 
+        if bucket is None:
+            wrapper.bucket = TokenBucket(float(calls) / seconds)
+        else:
+            wrapper.bucket = bucket
         return wrapper
 
     return wraps
 
 
+def ordered_map(func, iterable, workers=1, lookahead=None, processes=False):
+    """Map a function over an iterable using a pool of threads or processes
+
+    Results are yielded in the order of `iterable` and at most `lookahead`
+    items are in flight at any time to bound memory.
+
+    Args:
+        func: function to apply to each item, a module-level function if
+            `processes` is set
+        iterable: items to process
+        workers (int): number of threads or processes, 1 runs everything
+            in the caller
+        lookahead (int): maximum number of pending items (default twice the
+            number of workers)
+        processes (bool): use a pool of processes instead of threads
+
+    Returns:
+        generator of results
+    """
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+    if lookahead is None:
+        lookahead = 2 * workers
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= lookahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 def activate_live_debugging():
     """Activates live debugging with IPython's pdb
     """